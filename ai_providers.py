@@ -5,10 +5,25 @@ Handles real API calls to OpenAI, Anthropic, and Google AI
 
 import os
 import json
+import time
+import threading
 import requests
-from typing import Dict, Any, Optional, List
-from dataclasses import dataclass
+from contextlib import ExitStack
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Optional, List, Iterator, Callable
+from dataclasses import dataclass, asdict
 from config import Config
+from ollama_pool import OllamaBackendPool, BackendNotContacted, get_backend_pool
+from concurrency import ConcurrencyLimiter, ConcurrencyLimitTimeout, get_concurrency_limiter
+from prompt_budget import PromptBudget, PromptSection
+from resilience import CircuitBreaker, backoff_delay, get_circuit_breaker, get_latency_tracker
+
+# Heading for the shared project context that precedes every agent's own prompt
+PROJECT_CONTEXT_HEADER = "Project context (shared by every agent working on this project):"
+
+def project_task_prompt(task_title: str) -> str:
+    """Agent-specific instruction sent after the shared project context"""
+    return f"Task: {task_title}\n\nUsing the project context above, complete this task in your role."
 
 @dataclass
 class AIResponse:
@@ -19,6 +34,34 @@ class AIResponse:
     success: bool
     error_message: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    
+    # Accounting reported by the model server
+    input_tokens: int = 0
+    output_tokens: int = 0
+    load_duration_ms: int = 0
+    prefill_duration_ms: int = 0
+    decode_duration_ms: int = 0
+    total_duration_ms: int = 0
+    decode_tokens_per_sec: Optional[float] = None
+
+@dataclass
+class StreamChunk:
+    """A single incremental piece of a streamed response"""
+    content: str
+    done: bool
+    elapsed_ms: int
+    data: Dict[str, Any]
+    backend: Optional[str] = None
+
+@dataclass
+class AgentRequest:
+    """One agent call in a batch submitted to execute_agents_batch"""
+    agent: Any
+    prompt: str
+    project_id: Optional[int] = None
+    task_id: Optional[int] = None
+    shared_context: Optional[str] = None
+    use_cache: Optional[bool] = None
 
 class AIProvider:
     """Base class for AI providers"""
@@ -30,6 +73,171 @@ class AIProvider:
                 temperature: float = 0.7, max_tokens: int = 4000) -> AIResponse:
         """Generate a response from the AI provider"""
         raise NotImplementedError
+    
+    def generate_many(self, calls: List[Dict[str, Any]],
+                      max_workers: int = 4) -> List[tuple]:
+        """
+        Run several generate() calls concurrently.
+        
+        Each item of calls holds the keyword arguments for one generate()
+        call. Returns (AIResponse, duration_ms) tuples in the same order;
+        an exception in one call becomes a failed AIResponse for that call.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        def run(kwargs: Dict[str, Any]) -> tuple:
+            start_time = time.time()
+            try:
+                response = self.generate(**kwargs)
+            except Exception as e:
+                response = AIResponse(
+                    content="",
+                    tokens_used=0,
+                    cost=0.0,
+                    success=False,
+                    error_message=f"Error: {str(e)}"
+                )
+            return response, int((time.time() - start_time) * 1000)
+        
+        if not calls:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(calls))),
+                                thread_name_prefix='generate-many') as executor:
+            return list(executor.map(run, calls))
+
+class OllamaAPIError(Exception):
+    """Error status or in-stream error returned by an Ollama server"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+    
+    @property
+    def transient(self) -> bool:
+        """Server-side and overload errors may succeed on retry; 4xx will not"""
+        return self.status_code is None or self.status_code >= 500 or self.status_code == 429
+
+class OllamaSessionPool:
+    """
+    Process-wide pooled keep-alive HTTP session shared by every Ollama provider.
+    
+    The session is rebuilt after a fork so Celery prefork children never share
+    sockets with their parent. With pool_block enabled, callers wait for a free
+    connection instead of opening extra ones, which gives back-pressure.
+    """
+    
+    _session = None
+    _pid = None
+    _lock = threading.Lock()
+    
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """Get or create the shared session for this process"""
+        pid = os.getpid()
+        if cls._session is None or cls._pid != pid:
+            with cls._lock:
+                if cls._session is None or cls._pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=Config.OLLAMA_POOL_CONNECTIONS,
+                        pool_maxsize=Config.OLLAMA_POOL_MAXSIZE,
+                        pool_block=Config.OLLAMA_POOL_BLOCK
+                    )
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers['Connection'] = 'keep-alive'
+                    cls._session = session
+                    cls._pid = pid
+        return cls._session
+    
+    @classmethod
+    def reset(cls):
+        """Close the shared session; the next call builds a fresh one"""
+        with cls._lock:
+            if cls._session is not None and cls._pid == os.getpid():
+                cls._session.close()
+            cls._session = None
+            cls._pid = None
+
+def parse_ollama_timings(response_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert Ollama's final-response counters into AIResponse accounting fields.
+    
+    Ollama reports durations in nanoseconds. prompt_eval_count is omitted when
+    the whole prompt was served from the model's prompt cache.
+    """
+    ns_per_ms = 1_000_000
+    eval_count = response_data.get("eval_count") or 0
+    eval_duration = response_data.get("eval_duration") or 0
+    
+    return {
+        "input_tokens": response_data.get("prompt_eval_count") or 0,
+        "output_tokens": eval_count,
+        "load_duration_ms": (response_data.get("load_duration") or 0) // ns_per_ms,
+        "prefill_duration_ms": (response_data.get("prompt_eval_duration") or 0) // ns_per_ms,
+        "decode_duration_ms": eval_duration // ns_per_ms,
+        "total_duration_ms": (response_data.get("total_duration") or 0) // ns_per_ms,
+        "decode_tokens_per_sec": round(eval_count / (eval_duration / 1e9), 2) if eval_duration else None
+    }
+
+class HedgeCancelled(BackendNotContacted):
+    """Raised in the losing call of a hedged pair once the other call has answered"""
+    pass
+
+class _HedgeAttempt:
+    """
+    Slots, backend lease and response of one call of a hedged pair.
+    
+    The call's thread hands over what it holds; whichever comes first of the
+    call ending and cancel() releases it, exactly once. Cancelling also
+    closes the response so the backend sees the client go away.
+    """
+    
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.backend_url = None
+        self._lock = threading.Lock()
+        self._held = None
+        self._response = None
+    
+    def hold(self, backend_url: str, held: ExitStack):
+        """Take over the call's slots and lease (released at once if already cancelled)"""
+        with self._lock:
+            self.backend_url = backend_url
+            if not self.cancelled.is_set():
+                self._held = held
+                return
+        error = HedgeCancelled("Another backend answered first")
+        held.__exit__(HedgeCancelled, error, None)
+        raise error
+    
+    def track(self, response: requests.Response):
+        """Remember the open response so cancel() can close it"""
+        with self._lock:
+            self._response = response
+            if not self.cancelled.is_set():
+                return
+        response.close()
+    
+    def release(self, error: Optional[BaseException] = None):
+        """Give back the slots and lease; error tells the backend pool how the call went"""
+        with self._lock:
+            held, self._held = self._held, None
+        if held is None:
+            return
+        if error is None:
+            held.close()
+        else:
+            held.__exit__(type(error), error, error.__traceback__)
+    
+    def cancel(self):
+        """Stop the call: release what it holds now and close its connection"""
+        with self._lock:
+            self.cancelled.set()
+            response = self._response
+        self.release(HedgeCancelled("Another backend answered first"))
+        if response is not None:
+            response.close()
 
 class OllamaProvider(AIProvider):
     """Ollama Local AI Integration"""
@@ -38,93 +246,516 @@ class OllamaProvider(AIProvider):
     INPUT_PRICE = 0.0
     OUTPUT_PRICE = 0.0
     
-    def __init__(self):
+    def __init__(self, backend_pool: Optional[OllamaBackendPool] = None,
+                 limiter: Optional[ConcurrencyLimiter] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         super().__init__()
-        self.base_url = "http://localhost:11434"
+        self.backend_pool = backend_pool or get_backend_pool()
+        self.limiter = limiter or get_concurrency_limiter()
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker()
+        self.latency_tracker = get_latency_tracker()
         self.is_configured = True  # Always configured for local use
-        self.timeout = 600  # 10 minutes for local model processing
+        # (connect, read) - fail fast on a dead host, allow long generations
+        self.timeout = (Config.OLLAMA_CONNECT_TIMEOUT, Config.OLLAMA_READ_TIMEOUT)
     
-    def generate(self, prompt: str, system_prompt: Optional[str] = None,
-                temperature: float = 0.7, max_tokens: int = 4000,
-                model: str = "gpt-oss:20b") -> AIResponse:
-        """Generate response using Ollama"""
+    @property
+    def session(self) -> requests.Session:
+        """Shared pooled session (looked up per call so it survives forks)"""
+        return OllamaSessionPool.get_session()
+    
+    def _build_payload(self, prompt: str, system_prompt: Optional[str],
+                       temperature: float, max_tokens: int, model: str,
+                       stream: bool, context_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build the /api/chat request body.
         
-        try:
-            # Prepare the chat payload
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
-            
-            payload = {
-                "model": model,
-                "messages": messages,
-                "stream": False,  # Disable streaming for simpler response handling
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": max_tokens
-                }
+        A context_prefix shared by several agents (the project idea) is sent
+        as the first message when Config.OLLAMA_SHARED_PREFIX is enabled, so
+        every agent's prompt starts with identical tokens and Ollama can reuse
+        the cached prefill instead of re-evaluating it.
+        """
+        messages = []
+        if context_prefix and Config.OLLAMA_SHARED_PREFIX:
+            messages.append({"role": "system", "content": f"{PROJECT_CONTEXT_HEADER}\n\n{context_prefix}"})
+        elif context_prefix:
+            prompt = f"{context_prefix}\n\n{prompt}"
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        return {
+            "model": model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": Config.OLLAMA_KEEP_ALIVE,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+                "num_ctx": Config.OLLAMA_NUM_CTX
             }
+        }
+    
+    def _timeout(self, deadline: Optional[float]) -> tuple:
+        """(connect, read) timeout, capped by the time left before deadline"""
+        if deadline is None:
+            return self.timeout
+        remaining = max(deadline - time.time(), 0.1)
+        return (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+    
+    def _slot_wait(self, deadline: Optional[float]) -> Optional[float]:
+        """Concurrency slot wait, capped by the time left before deadline"""
+        if deadline is None:
+            return None
+        return max(0.0, min(self.limiter.wait_timeout, deadline - time.time()))
+    
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """
+        Whether a failed call is worth retrying (and, if the backend was
+        contacted, counts against the breaker). Running out of time waiting
+        for a model slot is retried: the slots free up as other calls finish.
+        """
+        if isinstance(error, ConcurrencyLimitTimeout):
+            return True
+        if isinstance(error, (requests.exceptions.Timeout,
+                              requests.exceptions.ConnectionError,
+                              requests.exceptions.ChunkedEncodingError)):
+            return True
+        return isinstance(error, OllamaAPIError) and error.transient
+    
+    def generate_stream(self, prompt: str, system_prompt: Optional[str] = None,
+                        temperature: float = 0.7, max_tokens: int = 4000,
+                        model: str = "gpt-oss:20b",
+                        context_prefix: Optional[str] = None,
+                        affinity_key: Optional[str] = None,
+                        deadline: Optional[float] = None) -> Iterator[StreamChunk]:
+        """
+        Stream a response from Ollama, yielding one StreamChunk per NDJSON line.
+        
+        Connection and HTTP errors are raised to the caller; use generate()
+        with on_chunk for the standard AIResponse error handling. deadline is
+        an absolute time.time() after which the stream is abandoned.
+        """
+        payload = self._build_payload(prompt, system_prompt, temperature,
+                                      max_tokens, model, stream=True,
+                                      context_prefix=context_prefix)
+        start_time = time.time()
+        
+        with self.limiter.slot('model', model, self._slot_wait(deadline)), \
+                self.backend_pool.lease(model, affinity_key) as backend, \
+                self.limiter.slot('backend', backend.url, self._slot_wait(deadline)):
+            response = self.session.post(
+                f"{backend.url}/api/chat",
+                json=payload,
+                timeout=self._timeout(deadline),
+                stream=True
+            )
             
-            # Make request to Ollama API
-            response = requests.post(
-                f"{self.base_url}/api/chat",
+            with response:
+                if response.status_code != 200:
+                    raise OllamaAPIError(
+                        f"Ollama API returned status {response.status_code}: {response.text}",
+                        response.status_code
+                    )
+                
+                for line in response.iter_lines():
+                    if deadline is not None and time.time() > deadline:
+                        raise requests.exceptions.Timeout("Deadline exceeded while streaming")
+                    if not line:
+                        continue
+                    
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise OllamaAPIError(f"Ollama stream error: {data['error']}")
+                    
+                    yield StreamChunk(
+                        content=data.get("message", {}).get("content", ""),
+                        done=data.get("done", False),
+                        elapsed_ms=int((time.time() - start_time) * 1000),
+                        data=data,
+                        backend=backend.url
+                    )
+    
+    def _post_chat(self, payload: Dict[str, Any], model: str,
+                   affinity_key: Optional[str], deadline: Optional[float],
+                   exclude: Optional[str] = None, slot_wait: Optional[float] = None) -> tuple:
+        """One non-streaming /api/chat call; returns (response JSON, backend URL)"""
+        if slot_wait is None:
+            slot_wait = self._slot_wait(deadline)
+        
+        # Make request to the least busy Ollama backend
+        with self.limiter.slot('model', model, slot_wait), \
+                self.backend_pool.lease(model, affinity_key, exclude) as backend, \
+                self.limiter.slot('backend', backend.url, slot_wait):
+            response = self.session.post(
+                f"{backend.url}/api/chat",
                 json=payload,
-                timeout=self.timeout
+                timeout=self._timeout(deadline)
             )
             
             if response.status_code != 200:
-                raise Exception(f"Ollama API returned status {response.status_code}: {response.text}")
+                raise OllamaAPIError(
+                    f"Ollama API returned status {response.status_code}: {response.text}",
+                    response.status_code
+                )
             
-            response_data = response.json()
-            content = response_data.get("message", {}).get("content", "")
+            return response.json(), backend.url
+    
+    def _post_chat_attempt(self, payload: Dict[str, Any], model: str,
+                           affinity_key: Optional[str], deadline: Optional[float],
+                           attempt: '_HedgeAttempt', exclude: Optional[str] = None,
+                           slot_wait: Optional[float] = None) -> tuple:
+        """
+        One side of a hedged call. The request is streamed so it can be cut
+        off, and its slots and backend lease are handed to attempt, which
+        releases them when the call ends or as soon as it is cancelled.
+        Returns the same (response JSON, backend URL) as _post_chat.
+        """
+        if slot_wait is None:
+            slot_wait = self._slot_wait(deadline)
+        
+        with ExitStack() as stack:
+            stack.enter_context(self.limiter.slot('model', model, slot_wait))
+            backend = stack.enter_context(self.backend_pool.lease(model, affinity_key, exclude))
+            stack.enter_context(self.limiter.slot('backend', backend.url, slot_wait))
+            attempt.hold(backend.url, stack.pop_all())
+        
+        try:
+            response = self.session.post(
+                f"{backend.url}/api/chat",
+                json=dict(payload, stream=True),
+                timeout=self._timeout(deadline),
+                stream=True
+            )
+            attempt.track(response)
             
-            # Estimate tokens (rough approximation: 1 token ≈ 4 characters)
-            full_prompt = (system_prompt or "") + prompt
-            input_tokens = len(full_prompt) // 4
-            output_tokens = len(content) // 4
-            total_tokens = input_tokens + output_tokens
+            with response:
+                if response.status_code != 200:
+                    raise OllamaAPIError(
+                        f"Ollama API returned status {response.status_code}: {response.text}",
+                        response.status_code
+                    )
+                
+                parts = []
+                response_data = {}
+                for line in response.iter_lines():
+                    if attempt.cancelled.is_set():
+                        raise HedgeCancelled("Another backend answered first")
+                    if deadline is not None and time.time() > deadline:
+                        raise requests.exceptions.Timeout("Deadline exceeded while streaming")
+                    if not line:
+                        continue
+                    
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise OllamaAPIError(f"Ollama stream error: {data['error']}")
+                    parts.append(data.get("message", {}).get("content", ""))
+                    if data.get("done"):
+                        response_data = data
+        except Exception as e:
+            if attempt.cancelled.is_set():
+                raise HedgeCancelled("Another backend answered first") from e
+            attempt.release(e)
+            raise
+        
+        attempt.release()
+        message = dict(response_data.get("message") or {}, content="".join(parts))
+        return dict(response_data, message=message), backend.url
+    
+    def _post_chat_hedged(self, payload: Dict[str, Any], model: str,
+                          affinity_key: Optional[str], deadline: Optional[float],
+                          hedge_after_ms: float) -> tuple:
+        """
+        Send the call, and if it is still running after hedge_after_ms send a
+        copy to another backend; the first successful answer wins. The copy
+        only runs if it can get concurrency slots immediately. The losing
+        call is cancelled: its slots and backend lease are released at once
+        and its connection is closed so the backend stops generating.
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        
+        primary_attempt = _HedgeAttempt()
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ollama-hedge')
+        try:
+            primary = executor.submit(self._post_chat_attempt, payload, model, affinity_key,
+                                      deadline, primary_attempt)
+            done, _ = wait([primary], timeout=hedge_after_ms / 1000)
+            if done:
+                return primary.result()
             
-            return AIResponse(
-                content=content,
-                tokens_used=total_tokens,
-                cost=0.0,  # Free for local models
-                success=True,
-                metadata={
-                    "model": model,
-                    "estimated_input_tokens": input_tokens,
-                    "estimated_output_tokens": output_tokens,
-                    "ollama_response": response_data
-                }
-            )
+            self.latency_tracker.count('hedges_launched')
+            backup_attempt = _HedgeAttempt()
+            backup = executor.submit(self._post_chat_attempt, payload, model, None, deadline,
+                                     backup_attempt, primary_attempt.backend_url, 0)
+            attempts = {primary: primary_attempt, backup: backup_attempt}
+            pending = {primary, backup}
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if error is None or future is primary:
+                            error = e
+                        continue
+                    for loser in pending:
+                        attempts[loser].cancel()
+                    if future is backup:
+                        self.latency_tracker.count('hedges_won')
+                    return result
+            raise error
+        finally:
+            executor.shutdown(wait=False)
+    
+    def _generate_once(self, prompt: str, system_prompt: Optional[str],
+                       temperature: float, max_tokens: int, model: str,
+                       on_chunk: Optional[Callable[[str], None]],
+                       context_prefix: Optional[str], affinity_key: Optional[str],
+                       deadline: Optional[float]) -> AIResponse:
+        """A single attempt of generate(); errors are raised, not wrapped"""
+        time_to_first_token_ms = None
+        backend_url = None
+        
+        if on_chunk is not None:
+            parts = []
+            response_data = {}
+            for chunk in self.generate_stream(prompt, system_prompt, temperature,
+                                              max_tokens, model, context_prefix,
+                                              affinity_key, deadline):
+                backend_url = chunk.backend
+                if chunk.content:
+                    if time_to_first_token_ms is None:
+                        time_to_first_token_ms = chunk.elapsed_ms
+                    parts.append(chunk.content)
+                    on_chunk(chunk.content)
+                if chunk.done:
+                    response_data = chunk.data
+            content = "".join(parts)
+        else:
+            payload = self._build_payload(prompt, system_prompt, temperature,
+                                          max_tokens, model, stream=False,
+                                          context_prefix=context_prefix)
             
-        except requests.exceptions.Timeout:
+            # Hedge slow calls once enough latency history exists for this model
+            hedge_after_ms = None
+            if Config.OLLAMA_HEDGE_ENABLED and len(self.backend_pool.backends) > 1:
+                hedge_after_ms = self.latency_tracker.percentile(
+                    model, Config.OLLAMA_HEDGE_PERCENTILE, Config.OLLAMA_HEDGE_MIN_SAMPLES)
+            
+            start_time = time.time()
+            if hedge_after_ms is not None:
+                response_data, backend_url = self._post_chat_hedged(
+                    payload, model, affinity_key, deadline, hedge_after_ms)
+            else:
+                response_data, backend_url = self._post_chat(
+                    payload, model, affinity_key, deadline)
+            self.latency_tracker.record(model, (time.time() - start_time) * 1000)
+            content = response_data.get("message", {}).get("content", "")
+        
+        timings = parse_ollama_timings(response_data)
+        
+        metadata = {
+            "model": model,
+            "backend": backend_url,
+            "streamed": on_chunk is not None,
+            "done_reason": response_data.get("done_reason")
+        }
+        if time_to_first_token_ms is not None:
+            metadata["time_to_first_token_ms"] = time_to_first_token_ms
+        
+        return AIResponse(
+            content=content,
+            tokens_used=timings["input_tokens"] + timings["output_tokens"],
+            cost=0.0,  # Free for local models
+            success=True,
+            metadata=metadata,
+            **timings
+        )
+    
+    def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                temperature: float = 0.7, max_tokens: int = 4000,
+                model: str = "gpt-oss:20b",
+                on_chunk: Optional[Callable[[str], None]] = None,
+                context_prefix: Optional[str] = None,
+                affinity_key: Optional[str] = None,
+                retry_attempts: Optional[int] = None,
+                timeout_seconds: Optional[float] = None) -> AIResponse:
+        """
+        Generate response using Ollama.
+        
+        When on_chunk is given the response is streamed and on_chunk is called
+        with each content delta as it arrives. Calls sharing an affinity_key
+        (e.g. one project) are routed to the same backend where possible so
+        its prompt cache for the shared context_prefix can be reused.
+        
+        Timeouts, connection errors and 5xx responses are retried up to
+        retry_attempts times (Config.OLLAMA_RETRY_ATTEMPTS by default) with
+        exponential backoff, all within timeout_seconds. A stream is not
+        retried once content has reached on_chunk. While the circuit breaker
+        is open the call fails immediately without taking a model slot.
+        
+        Concurrent identical requests (same model, prompts and sampling
+        settings) are coalesced: one of them calls the model and the others
+        share its successful response, marked single_flight='shared'.
+        """
+        from response_cache import make_cache_key
+        from single_flight import get_single_flight
+        
+        request_key = make_cache_key(model=model, system_prompt=system_prompt, prompt=prompt,
+                                     temperature=temperature, max_tokens=max_tokens,
+                                     context_prefix=context_prefix)
+        response, shared = get_single_flight().do(
+            f"request:{request_key}",
+            lambda: self._generate_with_retries(prompt, system_prompt, temperature, max_tokens,
+                                                model, on_chunk, context_prefix, affinity_key,
+                                                retry_attempts, timeout_seconds),
+            shareable=lambda response: response.success,
+            encode=asdict,
+            decode=lambda payload: AIResponse(**payload)
+        )
+        if shared:
+            response.metadata = {**(response.metadata or {}), 'single_flight': 'shared'}
+            if on_chunk is not None:
+                on_chunk(response.content)
+        return response
+    
+    def _generate_with_retries(self, prompt: str, system_prompt: Optional[str],
+                               temperature: float, max_tokens: int, model: str,
+                               on_chunk: Optional[Callable[[str], None]],
+                               context_prefix: Optional[str], affinity_key: Optional[str],
+                               retry_attempts: Optional[int],
+                               timeout_seconds: Optional[float]) -> AIResponse:
+        """generate() without coalescing: retries, deadline and circuit breaker"""
+        if retry_attempts is None:
+            retry_attempts = Config.OLLAMA_RETRY_ATTEMPTS
+        deadline = time.time() + timeout_seconds if timeout_seconds else None
+        
+        streamed = False
+        
+        def forward(delta: str):
+            nonlocal streamed
+            streamed = True
+            on_chunk(delta)
+        
+        attempt = 0
+        while True:
+            try:
+                self.circuit_breaker.allow()
+                try:
+                    response = self._generate_once(prompt, system_prompt, temperature,
+                                                   max_tokens, model,
+                                                   forward if on_chunk is not None else None,
+                                                   context_prefix, affinity_key, deadline)
+                except BackendNotContacted:
+                    self.circuit_breaker.release_trial()
+                    raise
+                except Exception as e:
+                    if self._is_transient(e):
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()  # The server answered
+                    raise
+                
+                self.circuit_breaker.record_success()
+                response.metadata["attempts"] = attempt + 1
+                return response
+            
+            except Exception as e:
+                delay = backoff_delay(attempt, Config.OLLAMA_RETRY_BACKOFF_SECONDS,
+                                      Config.OLLAMA_RETRY_BACKOFF_MAX_SECONDS)
+                if self._is_transient(e) and not streamed and attempt < retry_attempts \
+                        and (deadline is None or time.time() + delay < deadline):
+                    attempt += 1
+                    self.latency_tracker.count('retries')
+                    print(f"🔁 Retrying Ollama call ({attempt}/{retry_attempts}) in {delay:.1f}s: {e}")
+                    time.sleep(delay)
+                    continue
+                return self._error_response(e, attempt + 1)
+    
+    def _error_response(self, error: Exception, attempts: int) -> AIResponse:
+        """Turn the final error of a call into a failed AIResponse"""
+        metadata = {"attempts": attempts}
+        
+        if isinstance(error, requests.exceptions.Timeout):
             return AIResponse(
                 content="Ollama request timed out. The model may be processing a complex request.",
                 tokens_used=0,
                 cost=0,
                 success=False,
-                error_message="Request timeout"
+                error_message="Request timeout",
+                metadata=metadata
             )
-        except requests.exceptions.ConnectionError:
+        if isinstance(error, requests.exceptions.ConnectionError):
             return AIResponse(
-                content="Unable to connect to Ollama. Please ensure Ollama is running on localhost:11434.",
+                content=f"Unable to connect to Ollama. Please ensure Ollama is running at {', '.join(Config.OLLAMA_BACKENDS)}.",
                 tokens_used=0,
                 cost=0,
                 success=False,
-                error_message="Connection error"
-            )
-        except Exception as e:
-            return AIResponse(
-                content=f"Error calling Ollama API: {str(e)}",
-                tokens_used=0,
-                cost=0,
-                success=False,
-                error_message=str(e)
+                error_message="Connection error",
+                metadata=metadata
             )
+        return AIResponse(
+            content=f"Error calling Ollama API: {str(error)}",
+            tokens_used=0,
+            cost=0,
+            success=False,
+            error_message=str(error),
+            metadata=metadata
+        )
 
 
 
+class SystemPromptCatalog:
+    """
+    Active system prompt text per agent, cached in the process.
+    
+    Loaded in one query (at worker start, or on first use) and reloaded
+    after Config.PROMPT_CATALOG_TTL_SECONDS; 0 disables the cache.
+    """
+    
+    _prompts: Dict[int, Optional[str]] = {}
+    _loaded_at = 0.0
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def _text(system_prompt) -> Optional[str]:
+        if system_prompt is None:
+            return None
+        return f"{system_prompt.role}\n\n{system_prompt.instructions}"
+    
+    @classmethod
+    def load(cls) -> int:
+        """(Re)load every active prompt; returns how many agents have one"""
+        from database import SystemPrompt
+        
+        prompts = {}
+        for system_prompt in SystemPrompt.query.filter_by(is_active=True).order_by(SystemPrompt.id):
+            prompts.setdefault(system_prompt.agent_id, cls._text(system_prompt))
+        with cls._lock:
+            cls._prompts = prompts
+            cls._loaded_at = time.time()
+        return len(prompts)
+    
+    @classmethod
+    def get(cls, agent_id: int) -> Optional[str]:
+        from database import SystemPrompt
+        
+        if Config.PROMPT_CATALOG_TTL_SECONDS <= 0:
+            return cls._text(SystemPrompt.query.filter_by(agent_id=agent_id, is_active=True).first())
+        
+        if time.time() - cls._loaded_at > Config.PROMPT_CATALOG_TTL_SECONDS:
+            cls.load()
+        with cls._lock:
+            if agent_id in cls._prompts:
+                return cls._prompts[agent_id]
+        
+        # Agent added after the last load
+        text = cls._text(SystemPrompt.query.filter_by(agent_id=agent_id, is_active=True).first())
+        with cls._lock:
+            cls._prompts[agent_id] = text
+        return text
+
 class AIProviderFactory:
     """Factory class to get the Ollama AI provider"""
     
@@ -135,58 +766,252 @@ class AIProviderFactory:
         """Get or create the Ollama AI provider instance"""
         
         if cls._ollama_instance is None:
-            cls._ollama_instance = OllamaProvider()
+            if Config.OLLAMA_CASSETTE_MODE:
+                from cassette import create_cassette_provider
+                cls._ollama_instance = create_cassette_provider(Config.OLLAMA_CASSETTE_MODE)
+            else:
+                cls._ollama_instance = OllamaProvider()
         
         return cls._ollama_instance
     
     @classmethod
-    def execute_agent(cls, agent, prompt: str, project_id: Optional[int] = None,
-                     task_id: Optional[int] = None) -> Dict[str, Any]:
-        """Execute an agent with the appropriate AI provider"""
-        
-        provider = cls.get_provider(agent.ai_provider)
+    def _prepare_call(cls, agent, prompt: str, project_id: Optional[int],
+                      shared_context: Optional[str],
+                      use_cache: Optional[bool]) -> Dict[str, Any]:
+        """Resolve the system prompt, generate kwargs and any cached response"""
         
         # Get active system prompt for the agent
-        from database import SystemPrompt
-        system_prompt = SystemPrompt.query.filter_by(
-            agent_id=agent.id,
-            is_active=True
-        ).first()
+        system_content = SystemPromptCatalog.get(agent.id)
         
-        system_content = None
-        if system_prompt:
-            system_content = f"{system_prompt.role}\n\n{system_prompt.instructions}"
+        # Keep the prompt inside the model's context window
+        sections = [
+            PromptSection('system_prompt', system_content, priority=3, trimmable=False),
+            PromptSection('task_prompt', prompt, priority=2),
+            PromptSection('shared_context', shared_context, priority=1)
+        ]
+        budget = PromptBudget(
+            num_ctx=Config.OLLAMA_NUM_CTX,
+            overhead_tokens=Config.PROMPT_OVERHEAD_TOKENS,
+            strategy=Config.PROMPT_TRUNCATION_STRATEGY,
+            summarize=cls._summarize_for_budget
+        )
+        budget_report = budget.fit(sections, agent.max_tokens)
+        if budget_report['cuts']:
+            prompt, shared_context = sections[1].text, sections[2].text
+            print(f"✂️ Trimmed prompt for {agent.name} from {budget_report['estimated_tokens']} "
+                  f"to {budget_report['final_tokens']} estimated tokens")
         
         # Call the AI provider with correct parameters
         generate_kwargs = {
             'prompt': prompt,
             'system_prompt': system_content,
             'temperature': agent.temperature,
-            'max_tokens': agent.max_tokens
+            'max_tokens': agent.max_tokens,
+            'context_prefix': shared_context
         }
         
         # Always use gpt-oss:20b model for Ollama
         generate_kwargs['model'] = 'gpt-oss:20b'
         
-        response = provider.generate(**generate_kwargs)
+        if project_id is not None:
+            generate_kwargs['affinity_key'] = f"project:{project_id}"
         
-        # Create execution record
-        from database import db, AgentExecution
-        from datetime import datetime
+        # Per-agent resilience settings
+        generate_kwargs['retry_attempts'] = agent.retry_attempts
+        generate_kwargs['timeout_seconds'] = agent.timeout_seconds
         
-        execution = AgentExecution(
-            agent_id=agent.id,
-            project_id=project_id,
-            task_id=task_id,
-            input_prompt=prompt,
-            output_response=response.content,
-            tokens_used=response.tokens_used,
-            cost=response.cost,
-            duration_ms=0,  # Will be calculated by Celery task
-            success=response.success,
-            error_message=response.error_message,
-            execution_metadata=response.metadata
+        # Look up identical earlier requests in the response cache
+        from response_cache import get_response_cache, make_cache_key
+        response_cache = get_response_cache()
+        if use_cache is None:
+            use_cache = agent.use_response_cache is not False
+        
+        cache_key = None
+        cached_response = None
+        if response_cache is not None:
+            if use_cache:
+                cache_key = make_cache_key(
+                    model=generate_kwargs['model'],
+                    system_prompt=system_content,
+                    prompt=prompt,
+                    temperature=agent.temperature,
+                    max_tokens=agent.max_tokens,
+                    context_prefix=shared_context
+                )
+                cached_response = response_cache.get(cache_key)
+            else:
+                response_cache.record_bypass()
+        
+        response = None
+        if cached_response is not None:
+            response = AIResponse(
+                content=cached_response['content'],
+                tokens_used=cached_response['tokens_used'],
+                cost=0.0,
+                success=True,
+                metadata={**(cached_response.get('metadata') or {}),
+                          'cached': True, 'cache_key': cache_key},
+                input_tokens=cached_response.get('input_tokens', 0),
+                output_tokens=cached_response.get('output_tokens', 0)
+            )
+        
+        input_prompt = f"{shared_context}\n\n{prompt}" if shared_context else prompt
+        
+        # Near-duplicate requests (e.g. reworded ideas) via the semantic cache
+        semantic = None
+        if response is None and use_cache:
+            semantic = cls._semantic_lookup(agent, system_content, input_prompt,
+                                            generate_kwargs['model'])
+            if semantic is not None and semantic['response'] is not None:
+                response = semantic['response']
+        
+        return {
+            'generate_kwargs': generate_kwargs,
+            'cache_key': cache_key,
+            'cached_response': response,
+            'semantic': semantic,
+            'prompt_budget': budget_report if budget_report['cuts'] else None,
+            'input_prompt': input_prompt
+        }
+    
+    @classmethod
+    def _semantic_lookup(cls, agent, system_content: Optional[str], input_prompt: str,
+                         model: str) -> Optional[Dict[str, Any]]:
+        """Embed the request and look for a near-duplicate earlier response"""
+        from response_cache import make_cache_key
+        from semantic_cache import get_semantic_cache, semantic_cache_stages
+        
+        semantic_cache = get_semantic_cache()
+        if semantic_cache is None or agent.stage not in semantic_cache_stages():
+            return None
+        
+        vector = semantic_cache.embed(input_prompt)
+        if vector is None:
+            return None
+        
+        # Only requests that differ in nothing but the prompt text are comparable
+        scope = make_cache_key(model, system_content, '', agent.temperature, agent.max_tokens)
+        lookup = {'vector': vector, 'scope': scope, 'match': None, 'response': None}
+        
+        match = semantic_cache.lookup(agent.id, scope, vector)
+        if match is not None:
+            similarity, entry = match
+            lookup['match'] = {
+                'similarity': round(similarity, 4),
+                'execution_id': entry['execution_id'],
+                'mode': semantic_cache.mode
+            }
+            if semantic_cache.mode == 'serve':
+                lookup['response'] = AIResponse(
+                    content=entry['content'],
+                    tokens_used=entry['tokens_used'],
+                    cost=0.0,
+                    success=True,
+                    metadata={**(entry.get('metadata') or {}),
+                              'cached': True, 'semantic_match': lookup['match']},
+                    input_tokens=entry.get('input_tokens', 0),
+                    output_tokens=entry.get('output_tokens', 0)
+                )
+        return lookup
+    
+    @classmethod
+    def _store_semantic(cls, call: Dict[str, Any], agent, execution, response: AIResponse):
+        """Index a freshly generated response for future near-duplicate lookups"""
+        semantic = call['semantic']
+        if semantic is None or call['cached_response'] is not None or not response.success:
+            return
+        
+        from semantic_cache import get_semantic_cache
+        semantic_cache = get_semantic_cache()
+        if semantic_cache is not None:
+            semantic_cache.store(agent.id, semantic['scope'], semantic['vector'], {
+                'execution_id': execution.id,
+                'content': response.content,
+                'tokens_used': response.tokens_used,
+                'input_tokens': response.input_tokens,
+                'output_tokens': response.output_tokens,
+                'metadata': response.metadata
+            })
+    
+    @classmethod
+    def _summarize_for_budget(cls, text: str, target_tokens: int) -> Optional[str]:
+        """Condense text to about target_tokens; summaries are cached like responses"""
+        from response_cache import get_response_cache, make_cache_key
+        
+        system_content = ("You condense project documents. Keep every requirement, name, "
+                          "number and constraint; drop repetition and filler.")
+        prompt = f"Summarize the following in at most {int(target_tokens * 0.75)} words:\n\n{text}"
+        model = 'gpt-oss:20b'
+        
+        response_cache = get_response_cache()
+        cache_key = make_cache_key(model, system_content, prompt, 0.0, target_tokens)
+        cached = response_cache.get(cache_key) if response_cache else None
+        if cached is not None:
+            return cached['content']
+        
+        response = cls.get_provider().generate(
+            prompt=prompt,
+            system_prompt=system_content,
+            temperature=0.0,
+            max_tokens=target_tokens,
+            model=model
         )
+        if not response.success:
+            return None
+        
+        if response_cache is not None:
+            response_cache.set(cache_key, {
+                'content': response.content,
+                'tokens_used': response.tokens_used,
+                'input_tokens': response.input_tokens,
+                'output_tokens': response.output_tokens,
+                'metadata': response.metadata
+            })
+        return response.content
+    
+    @classmethod
+    def _store_in_cache(cls, call: Dict[str, Any], response: AIResponse):
+        """Cache a fresh successful response under the call's cache key"""
+        if call['semantic'] is not None and call['semantic']['match'] is not None:
+            # 'offer' mode: report the near-duplicate alongside the new response
+            response.metadata = {**(response.metadata or {}),
+                                 'semantic_match': call['semantic']['match']}
+        
+        if not response.success or call['cache_key'] is None:
+            return
+        
+        from response_cache import get_response_cache
+        response_cache = get_response_cache()
+        if response_cache is not None:
+            response_cache.set(call['cache_key'], {
+                'content': response.content,
+                'tokens_used': response.tokens_used,
+                'input_tokens': response.input_tokens,
+                'output_tokens': response.output_tokens,
+                'metadata': response.metadata
+            })
+    
+    @classmethod
+    def _record_execution(cls, execution, agent, response: AIResponse, duration_ms: int,
+                          prompt_budget: Optional[Dict[str, Any]] = None):
+        """Fill in an AgentExecution and update agent statistics (no commit)"""
+        from database import db
+        from datetime import datetime
+        
+        execution.output_response = response.content
+        execution.tokens_used = response.tokens_used
+        execution.input_tokens = response.input_tokens
+        execution.output_tokens = response.output_tokens
+        execution.load_duration_ms = response.load_duration_ms
+        execution.prefill_duration_ms = response.prefill_duration_ms
+        execution.decode_tokens_per_sec = response.decode_tokens_per_sec
+        execution.cost = response.cost
+        execution.duration_ms = duration_ms
+        execution.success = response.success
+        execution.error_message = response.error_message
+        execution.execution_metadata = response.metadata
+        if prompt_budget:
+            execution.execution_metadata = {**(response.metadata or {}), 'prompt_budget': prompt_budget}
         db.session.add(execution)
         
         # Update agent statistics
@@ -196,15 +1021,218 @@ class AIProviderFactory:
             agent.success_rate = ((agent.success_rate * (agent.total_executions - 1)) + 100) / agent.total_executions
         else:
             agent.success_rate = (agent.success_rate * (agent.total_executions - 1)) / agent.total_executions
-        
-        db.session.commit()
-        
+    
+    @classmethod
+    def _result(cls, execution, response: AIResponse) -> Dict[str, Any]:
         return {
             'success': response.success,
             'execution_id': execution.id,
             'response': response.content,
             'tokens_used': response.tokens_used,
+            'input_tokens': response.input_tokens,
+            'output_tokens': response.output_tokens,
+            'load_duration_ms': response.load_duration_ms,
+            'prefill_duration_ms': response.prefill_duration_ms,
+            'decode_tokens_per_sec': response.decode_tokens_per_sec,
             'cost': response.cost,
             'error': response.error_message,
             'metadata': response.metadata or {}
-        }
\ No newline at end of file
+        }
+    
+    @classmethod
+    def execute_agent(cls, agent, prompt: str, project_id: Optional[int] = None,
+                     task_id: Optional[int] = None, stream: Optional[bool] = None,
+                     on_chunk: Optional[Callable[[str], None]] = None,
+                     use_cache: Optional[bool] = None,
+                     shared_context: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Execute an agent with the appropriate AI provider.
+        
+        shared_context is text common to every agent of a project (the idea).
+        It is sent ahead of the agent's own system prompt and calls for the
+        same project prefer the same backend, so the model's prompt cache
+        covers the shared prefill.
+        
+        With stream enabled (Config.OLLAMA_STREAMING by default) the
+        AgentExecution row is created up front and the partial output is
+        flushed to it every Config.OLLAMA_STREAM_FLUSH_SECONDS.
+        
+        Identical requests are served from the response cache unless
+        use_cache is False or the agent has use_response_cache disabled;
+        cache hits are still recorded as (cached) AgentExecution rows.
+        """
+        
+        provider = cls.get_provider(agent.ai_provider)
+        if stream is None:
+            stream = Config.OLLAMA_STREAMING
+        
+        call = cls._prepare_call(agent, prompt, project_id, shared_context, use_cache)
+        generate_kwargs = call['generate_kwargs']
+        response = call['cached_response']
+        
+        from database import db, AgentExecution
+        
+        execution = AgentExecution(
+            agent_id=agent.id,
+            project_id=project_id,
+            task_id=task_id,
+            input_prompt=call['input_prompt'],
+            cached=response is not None
+        )
+        
+        if response is not None:
+            if on_chunk:
+                on_chunk(response.content)
+        elif stream:
+            # Persist the row first so partial output is visible while generating
+            execution.output_response = ''
+            db.session.add(execution)
+            db.session.commit()
+            
+            parts = []
+            last_flush = time.time()
+            
+            def handle_chunk(delta: str):
+                nonlocal last_flush
+                parts.append(delta)
+                if on_chunk:
+                    on_chunk(delta)
+                if time.time() - last_flush >= Config.OLLAMA_STREAM_FLUSH_SECONDS:
+                    execution.output_response = ''.join(parts)
+                    db.session.commit()
+                    last_flush = time.time()
+            
+            generate_kwargs['on_chunk'] = handle_chunk
+        
+        call_started = time.time()
+        if response is None:
+            response = provider.generate(**generate_kwargs)
+            cls._store_in_cache(call, response)
+        
+        cls._record_execution(execution, agent, response,
+                              int((time.time() - call_started) * 1000),
+                              call['prompt_budget'])
+        db.session.commit()
+        cls._store_semantic(call, agent, execution, response)
+        
+        return cls._result(execution, response)
+    
+    @classmethod
+    def execute_agents_batch(cls, batch: List[AgentRequest],
+                             max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Execute several agents concurrently and return results in request order.
+        
+        Prompt lookup and cache checks run on the calling thread; model calls
+        run on a thread pool of up to max_workers (Config.AGENT_BATCH_CONCURRENCY
+        by default) and never touch the database. All AgentExecution rows and
+        agent statistics are then written in a single transaction. A failed
+        call only fails its own result.
+        
+        Requests linked to a task run under the task's lease (task_leases.py),
+        renewed while the batch generates, and settle the task afterwards. A
+        task leased by another worker is skipped, and one whose model call
+        already succeeded returns its stored output (marked reused), so no
+        task is ever executed twice.
+        """
+        if not batch:
+            return []
+        
+        from contextlib import ExitStack
+        from datetime import datetime
+        from database import db, AgentExecution, Task
+        from task_leases import (new_lease_owner, acquire_lease, finish_lease,
+                                 successful_execution, LeaseHeartbeat)
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(batch)
+        owners = {}
+        for i, req in enumerate(batch):
+            if not req.task_id or db.session.get(Task, req.task_id) is None:
+                continue
+            owner = new_lease_owner()
+            leased = acquire_lease(req.task_id, owner, claimed=False)
+            execution = successful_execution(req.task_id)
+            if execution is not None:
+                if leased:
+                    finish_lease(req.task_id, owner, {
+                        'status': 'completed',
+                        'completed_at': execution.created_at or datetime.utcnow(),
+                        'error_message': None,
+                        'output_data': {'response': execution.output_response}
+                    })
+                results[i] = {
+                    'success': True,
+                    'execution_id': execution.id,
+                    'response': execution.output_response,
+                    'tokens_used': execution.tokens_used,
+                    'input_tokens': execution.input_tokens,
+                    'output_tokens': execution.output_tokens,
+                    'error': None,
+                    'reused': True
+                }
+            elif not leased:
+                results[i] = {
+                    'success': False,
+                    'skipped': True,
+                    'execution_id': None,
+                    'response': None,
+                    'error': 'Task is leased by another worker'
+                }
+            else:
+                owners[i] = owner
+        
+        runnable = [i for i in range(len(batch)) if results[i] is None]
+        calls = {i: cls._prepare_call(batch[i].agent, batch[i].prompt, batch[i].project_id,
+                                      batch[i].shared_context, batch[i].use_cache)
+                 for i in runnable}
+        
+        pending = [i for i in runnable if calls[i]['cached_response'] is None]
+        responses = {i: calls[i]['cached_response'] for i in runnable
+                     if calls[i]['cached_response'] is not None}
+        durations = {i: 0 for i in responses}
+        
+        if pending:
+            provider = cls.get_provider()
+            with ExitStack() as heartbeats:
+                for i in pending:
+                    if i in owners:
+                        heartbeats.enter_context(LeaseHeartbeat(db.engine, batch[i].task_id, owners[i]))
+                generated = provider.generate_many(
+                    [calls[i]['generate_kwargs'] for i in pending],
+                    max_workers=max_workers or Config.AGENT_BATCH_CONCURRENCY
+                )
+            for i, (response, duration_ms) in zip(pending, generated):
+                cls._store_in_cache(calls[i], response)
+                responses[i] = response
+                durations[i] = duration_ms
+        
+        executions = {}
+        for i in runnable:
+            req = batch[i]
+            execution = AgentExecution(
+                agent_id=req.agent.id,
+                project_id=req.project_id,
+                task_id=req.task_id,
+                input_prompt=calls[i]['input_prompt'],
+                cached=calls[i]['cached_response'] is not None
+            )
+            cls._record_execution(execution, req.agent, responses[i], durations[i],
+                                  calls[i]['prompt_budget'])
+            executions[i] = execution
+        db.session.commit()
+        for i, execution in executions.items():
+            cls._store_semantic(calls[i], batch[i].agent, execution, responses[i])
+            results[i] = cls._result(execution, responses[i])
+        
+        # Settle the leased tasks so none stays 'processing'
+        for i, owner in owners.items():
+            response = responses[i]
+            if response.success:
+                values = {'status': 'completed', 'completed_at': datetime.utcnow(),
+                          'error_message': None, 'output_data': {'response': response.content}}
+            else:
+                values = {'status': 'failed',
+                          'error_message': str(response.error_message or 'Unknown error')[:500]}
+            finish_lease(batch[i].task_id, owner, values)
+        
+        return results
@@ -4,10 +4,12 @@ from flask_migrate import Migrate
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from functools import wraps
 import os
 
 from config import Config
-from database import db, User, Project, Agent, Task, SystemPrompt, AgentExecution, ProjectArtifact
+from database import db, upgrade_schema, User, Project, Agent, Task, SystemPrompt, AgentExecution, ProjectArtifact
+from progress_broadcaster import broadcast
 
 # Initialize Socket.IO
 # Try eventlet first, fall back to threading if not available
@@ -24,7 +26,11 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
     migrate = Migrate(app, db)
-    socketio.init_app(app)
+    
+    # With a Redis message queue, workers and every web process can reach every client
+    from realtime import message_queue_url, register_local_server
+    socketio.init_app(app, message_queue=message_queue_url())
+    register_local_server(socketio)
     
     # Login manager
     login_manager = LoginManager()
@@ -43,6 +49,7 @@ app = create_app()
 def init_database():
     with app.app_context():
         db.create_all()
+        upgrade_schema()
         
         # Check if we need to seed initial agents
         if Agent.query.count() == 0:
@@ -62,7 +69,8 @@ def seed_initial_agents():
             'description': 'Processes and structures initial project ideas',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['idea analysis', 'requirement extraction', 'initial structuring', 'feasibility assessment']
+            'capabilities': ['idea analysis', 'requirement extraction', 'initial structuring', 'feasibility assessment'],
+            'depends_on': []
         },
         {
             'name': 'Context Builder',
@@ -73,7 +81,8 @@ def seed_initial_agents():
             'description': 'Builds comprehensive context and project scope',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['context gathering', 'scope definition', 'requirement documentation', 'initial planning']
+            'capabilities': ['context gathering', 'scope definition', 'requirement documentation', 'initial planning'],
+            'depends_on': []
         },
         
         # Stage 2: Validation & Strategy
@@ -86,7 +95,8 @@ def seed_initial_agents():
             'description': 'Analyzes market size, competitors, and product-market fit',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['market analysis', 'competitor research', 'TAM calculation', 'trend analysis']
+            'capabilities': ['market analysis', 'competitor research', 'TAM calculation', 'trend analysis'],
+            'depends_on': ['Idea Processor', 'Context Builder']
         },
         {
             'name': 'Technical Architect',
@@ -97,7 +107,8 @@ def seed_initial_agents():
             'description': 'Designs system architecture and selects tech stack',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['architecture design', 'tech stack selection', 'scalability planning', 'cost estimation']
+            'capabilities': ['architecture design', 'tech stack selection', 'scalability planning', 'cost estimation'],
+            'depends_on': ['Idea Processor', 'Context Builder']
         },
         
         # Stage 3: Development
@@ -110,7 +121,8 @@ def seed_initial_agents():
             'description': 'Creates user interfaces and experiences',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['wireframing', 'UI design', 'UX flows', 'responsive design', 'accessibility']
+            'capabilities': ['wireframing', 'UI design', 'UX flows', 'responsive design', 'accessibility'],
+            'depends_on': ['Market Research', 'Technical Architect']
         },
         {
             'name': 'Full-Stack Dev',
@@ -121,7 +133,8 @@ def seed_initial_agents():
             'description': 'Writes frontend and backend code',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['React/Vue/Angular', 'Node.js/Python', 'API development', 'database design']
+            'capabilities': ['React/Vue/Angular', 'Node.js/Python', 'API development', 'database design'],
+            'depends_on': ['Technical Architect']
         },
         {
             'name': 'QA & Security',
@@ -132,7 +145,8 @@ def seed_initial_agents():
             'description': 'Automated testing and security scanning',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['unit testing', 'integration testing', 'security audits', 'penetration testing']
+            'capabilities': ['unit testing', 'integration testing', 'security audits', 'penetration testing'],
+            'depends_on': ['Technical Architect']
         },
         {
             'name': 'DevOps Pipeline',
@@ -143,7 +157,8 @@ def seed_initial_agents():
             'description': 'CI/CD automation and deployment',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['CI/CD setup', 'containerization', 'auto-scaling', 'monitoring']
+            'capabilities': ['CI/CD setup', 'containerization', 'auto-scaling', 'monitoring'],
+            'depends_on': ['Technical Architect']
         },
         
         # Stage 4: Go-to-Market
@@ -156,7 +171,8 @@ def seed_initial_agents():
             'description': 'Handles business formation and compliance',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['company formation', 'legal compliance', 'trademark filing', 'terms of service']
+            'capabilities': ['company formation', 'legal compliance', 'trademark filing', 'terms of service'],
+            'depends_on': ['Market Research']
         },
         {
             'name': 'Content Marketing',
@@ -167,7 +183,8 @@ def seed_initial_agents():
             'description': 'Creates and distributes content',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['blog writing', 'SEO optimization', 'social media', 'email campaigns']
+            'capabilities': ['blog writing', 'SEO optimization', 'social media', 'email campaigns'],
+            'depends_on': ['Market Research', 'UI/UX Designer']
         },
         {
             'name': 'Sales Automation',
@@ -178,7 +195,8 @@ def seed_initial_agents():
             'description': 'Automates sales outreach and conversion',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['lead generation', 'email outreach', 'demo scheduling', 'proposal creation']
+            'capabilities': ['lead generation', 'email outreach', 'demo scheduling', 'proposal creation'],
+            'depends_on': ['Market Research']
         },
         
         # Stage 5: Business Operations
@@ -191,7 +209,8 @@ def seed_initial_agents():
             'description': '24/7 intelligent customer service',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['ticket handling', 'live chat', 'knowledge base', 'escalation management']
+            'capabilities': ['ticket handling', 'live chat', 'knowledge base', 'escalation management'],
+            'depends_on': ['Business Setup', 'Full-Stack Dev']
         },
         {
             'name': 'Analytics Engine',
@@ -202,7 +221,8 @@ def seed_initial_agents():
             'description': 'Real-time business intelligence',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['KPI tracking', 'predictive analytics', 'reporting', 'anomaly detection']
+            'capabilities': ['KPI tracking', 'predictive analytics', 'reporting', 'anomaly detection'],
+            'depends_on': ['DevOps Pipeline', 'Sales Automation']
         },
         {
             'name': 'Finance Manager',
@@ -213,7 +233,8 @@ def seed_initial_agents():
             'description': 'Automated accounting and finance',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['bookkeeping', 'invoicing', 'expense tracking', 'financial forecasting']
+            'capabilities': ['bookkeeping', 'invoicing', 'expense tracking', 'financial forecasting'],
+            'depends_on': ['Business Setup', 'Sales Automation']
         },
         
         # Stage 6: Self-Improvement
@@ -226,7 +247,8 @@ def seed_initial_agents():
             'description': 'Continuously optimizes all systems',
             'ai_provider': 'ollama',
             'model_name': 'gpt-oss:20b',
-            'capabilities': ['performance tuning', 'cost optimization', 'workflow improvement', 'A/B testing']
+            'capabilities': ['performance tuning', 'cost optimization', 'workflow improvement', 'A/B testing'],
+            'depends_on': ['Customer Support', 'Analytics Engine', 'Finance Manager']
         }
     ]
     
@@ -246,6 +268,29 @@ def seed_initial_agents():
     
     db.session.commit()
 
+def single_flight_view(key_func):
+    """
+    Coalesce concurrent identical requests of a JSON view (double-clicks,
+    retries): the first runs the view and the others get its response
+    instead of starting the same work again. key_func receives the view's
+    arguments; the key is also scoped to the current user.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response
+            from single_flight import get_single_flight
+            
+            def run_view():
+                response = make_response(view(*args, **kwargs))
+                return {'body': response.get_json(), 'status': response.status_code}
+            
+            shared, _ = get_single_flight().do(
+                f"view:{view.__name__}:{current_user.id}:{key_func(*args, **kwargs)}", run_view)
+            return jsonify(shared['body']), shared['status']
+        return wrapper
+    return decorator
+
 # Routes
 @app.route('/')
 def index():
@@ -344,10 +389,11 @@ def new_project():
                 print(f"✅ Redis connection successful for project {project.id}")
                 
                 # Just start Stage 1 processing
-                from celery_tasks import process_project_pipeline
+                from celery_tasks import process_project_pipeline, task_route
                 print(f"⚙️ Starting process_project_pipeline for project {project.id}, stage 1")
                 task = process_project_pipeline.apply_async(
-                    args=[project.id, 1, current_user.id]
+                    args=[project.id, 1, current_user.id],
+                    **task_route('project_create')
                 )
                 print(f"📋 Stage 1 task created: {task.id}")
                 flash('Project created successfully! AI agents are now processing your idea...', 'success')
@@ -360,118 +406,25 @@ def new_project():
         if auto_run or not celery_available:
             print(f"📝 Using synchronous processing for project {project.id} (auto_run={auto_run})")
             try:
-                from ai_providers import AIProviderFactory
+                from pipeline import run_pipeline, local_backend_name
                 
                 if auto_run:
                     flash('Auto-run enabled! Processing all stages synchronously...', 'info')
                     
-                    # Execute all stages synchronously for auto-run
-                    for current_stage in range(1, 7):  # Stages 1-6
-                        print(f"🔄 Auto-running Stage {current_stage}")
-                        
-                        # Get agents for current stage
-                        stage_agents = Agent.query.filter_by(stage=current_stage, is_active=True).all()
-                        if not stage_agents:
-                            print(f"⚠️ No agents found for stage {current_stage}")
-                            continue
-                        
-                        # Create tasks if they don't exist
-                        for agent in stage_agents:
-                            existing_task = Task.query.filter_by(
-                                project_id=project.id,
-                                agent_id=agent.id,
-                                stage=current_stage
-                            ).first()
-                            
-                            if not existing_task:
-                                task = Task(
-                                    project_id=project.id,
-                                    agent_id=agent.id,
-                                    title=f"{agent.name} - Stage {current_stage}",
-                                    description=f"Auto-generated task for {agent.name}",
-                                    stage=current_stage,
-                                    status='pending'
-                                )
-                                db.session.add(task)
-                        db.session.commit()
-                        
-                        # Execute all tasks for this stage
-                        tasks = Task.query.filter_by(
-                            project_id=project.id,
-                            stage=current_stage
-                        ).all()
-                        
-                        for task in tasks:
-                            if task.assigned_agent:
-                                print(f"🔥 Auto-executing {task.assigned_agent.name} for Stage {current_stage}")
-                                task.status = 'processing'
-                                db.session.commit()
-                                
-                                result = AIProviderFactory.execute_agent(
-                                    agent=task.assigned_agent,
-                                    prompt=project.idea_source,
-                                    project_id=project.id,
-                                    task_id=task.id
-                                )
-                                
-                                if result['success']:
-                                    task.status = 'completed'
-                                    print(f"✅ {task.assigned_agent.name} completed")
-                                else:
-                                    task.status = 'failed'
-                                    task.error_message = result.get('error', 'Unknown error')
-                                    print(f"❌ {task.assigned_agent.name} failed")
-                                
-                                db.session.commit()
-                        
-                        # Update project stage
-                        project.stage = current_stage
-                        db.session.commit()
-                    
-                    # Update project completion percentage
-                    total_tasks = Task.query.filter_by(project_id=project.id).count()
-                    completed_tasks = Task.query.filter_by(project_id=project.id, status='completed').count()
-                    if total_tasks > 0:
-                        project.completion_percentage = round((completed_tasks / total_tasks) * 100, 2)
-                        db.session.commit()
-                    
+                    # All six stages in one run, so agents start as soon as their inputs are ready
+                    run_pipeline(project, stages=range(1, 7), user_id=current_user.id,
+                                 backend=local_backend_name())
                     flash('🎉 Auto-run complete! All 6 stages have been processed.', 'success')
                     
                 else:
                     # Just run Stage 1 for non-auto-run
-                    stage1_agents = Agent.query.filter_by(stage=1, is_active=True).all()
-                    print(f"🔍 Found {len(stage1_agents)} Stage 1 agents: {[a.name for a in stage1_agents]}")
-                    
-                    for agent in stage1_agents:
-                        task = Task.query.filter_by(project_id=project.id, agent_id=agent.id).first()
-                        if task:
-                            print(f"🔥 Processing task {task.id} with agent {agent.name}")
-                            task.status = 'processing'
-                            db.session.commit()
-                            
-                            result = AIProviderFactory.execute_agent(
-                                agent=agent,
-                                prompt=project.idea_source,
-                                project_id=project.id,
-                                task_id=task.id
-                            )
-                            
-                            if result['success']:
-                                task.status = 'completed'
-                                flash(f'✅ {agent.name} completed successfully!', 'success')
-                            else:
-                                task.status = 'failed'
-                                task.error_message = result.get('error', 'Unknown error')
-                                flash(f'❌ {agent.name} failed: {result.get("error", "Unknown error")}', 'error')
-                            
-                            db.session.commit()
-                    
-                    # Update project completion percentage
-                    total_tasks = Task.query.filter_by(project_id=project.id).count()
-                    completed_tasks = Task.query.filter_by(project_id=project.id, status='completed').count()
-                    if total_tasks > 0:
-                        project.completion_percentage = round((completed_tasks / total_tasks) * 100, 2)
-                        db.session.commit()
+                    report = run_pipeline(project, stages=[1], user_id=current_user.id,
+                                          backend=local_backend_name())
+                    for result in report['results']:
+                        if result['status'] == 'completed':
+                            flash(f'✅ {result["agent"]} completed successfully!', 'success')
+                        else:
+                            flash(f'❌ {result["agent"]} failed: {result.get("error", "Unknown error")}', 'error')
                     
                     flash('Project created! Stage 1 processing completed.', 'success')
                 
@@ -535,14 +488,16 @@ def execute_agent(agent_id):
     
     if use_async:
         # Use Celery for async execution
-        from celery_tasks import execute_agent_async
+        from celery_tasks import execute_agent_async, task_route
         
+        linked_task = db.session.get(Task, task_id) if task_id else None
         task = execute_agent_async.apply_async(
-            args=[agent_id, input_prompt, project_id, task_id, current_user.id]
+            args=[agent_id, input_prompt, project_id, task_id, current_user.id],
+            **task_route('agent_execute', linked_task.priority if linked_task else None)
         )
         
         # Emit Socket.IO event for task started
-        socketio.emit('agent_started', {
+        broadcast('agent_started', {
             'agent_id': agent_id,
             'agent_name': agent.name,
             'task_id': task.id,
@@ -564,14 +519,16 @@ def execute_agent(agent_id):
                 agent=agent,
                 prompt=input_prompt,
                 project_id=project_id,
-                task_id=task_id
+                task_id=task_id,
+                use_cache=data.get('use_cache')
             )
             
-            # Emit Socket.IO event for completion
-            socketio.emit('agent_completed', {
+            # Emit Socket.IO event for completion (a reference; the response stays in the DB)
+            from task_results import agent_result_ref
+            broadcast('agent_completed', {
                 'agent_id': agent_id,
                 'agent_name': agent.name,
-                'result': result
+                'result': agent_result_ref(result)
             }, room=f'user_{current_user.id}')
             
             return jsonify(result)
@@ -632,6 +589,7 @@ def logout():
 # API Routes
 @app.route('/api/projects/<int:project_id>/advance', methods=['POST'])
 @login_required
+@single_flight_view(lambda project_id: f"{project_id}:{db.session.query(Project.stage).filter_by(id=project_id).scalar()}")
 def advance_project_stage(project_id):
     project = db.get_or_404(Project, project_id)
     
@@ -648,19 +606,20 @@ def advance_project_stage(project_id):
             r.ping()
             
             # Use Celery to process the pipeline for this stage
-            from celery_tasks import process_project_pipeline
+            from celery_tasks import process_project_pipeline, task_route
             
             task = process_project_pipeline.apply_async(
-                args=[project_id, next_stage, current_user.id]
+                args=[project_id, next_stage, current_user.id],
+                **task_route('stage_advance')
             )
             
             # Emit Socket.IO event
-            socketio.emit('project_advancing', {
+            broadcast('project_advancing', {
                 'project_id': project_id,
                 'from_stage': project.stage,
                 'to_stage': next_stage,
                 'task_id': task.id
-            }, room=f'user_{current_user.id}')
+            }, room=f'user_{current_user.id}', key=f"project:{project_id}")
             
             return jsonify({
                 'success': True,
@@ -669,97 +628,25 @@ def advance_project_stage(project_id):
                 'async': True
             })
         except Exception as e:
-            # Redis/Celery not available, advance stage and execute synchronously
+            # Redis/Celery not available, execute the stage synchronously
             print(f"❌ Celery error for stage advance: {str(e)}")
             
-            project.stage = next_stage
-            project.updated_at = datetime.utcnow()
-            
-            # Update status based on stage
-            stage_status_map = {
-                2: 'validating',
-                3: 'developing',
-                4: 'marketing',
-                5: 'operating',
-                6: 'scaling'
-            }
-            project.status = stage_status_map.get(project.stage, project.status)
-            db.session.commit()
-            
-            # Create and execute tasks for this stage synchronously
-            from ai_providers import AIProviderFactory
-            agents = Agent.query.filter_by(stage=next_stage, is_active=True).all()
-            
-            success_count = 0
-            fail_count = 0
-            
-            for agent in agents:
-                # Create the task
-                task = Task(
-                    project_id=project_id,
-                    agent_id=agent.id,
-                    title=f"{agent.name} - Stage {next_stage}",
-                    description=f"Task for {agent.name}",
-                    stage=next_stage,
-                    status='processing'  # Start as processing
-                )
-                db.session.add(task)
-                db.session.commit()
-                
-                # Execute the task immediately
-                try:
-                    print(f"🔥 Executing {agent.name} for Stage {next_stage}")
-                    result = AIProviderFactory.execute_agent(
-                        agent=agent,
-                        prompt=project.idea_source or f"Process stage {next_stage} for project: {project.name}",
-                        project_id=project_id,
-                        task_id=task.id
-                    )
-                    
-                    if result['success']:
-                        task.status = 'completed'
-                        success_count += 1
-                        print(f"✅ {agent.name} completed")
-                    else:
-                        task.status = 'failed'
-                        task.error_message = result.get('error', 'Unknown error')
-                        fail_count += 1
-                        print(f"❌ {agent.name} failed: {result.get('error')}")
-                        
-                except Exception as exec_error:
-                    task.status = 'failed'
-                    task.error_message = str(exec_error)[:500]  # Limit error message length
-                    fail_count += 1
-                    print(f"❌ {agent.name} execution error: {str(exec_error)}")
-                
-                db.session.commit()
-                
-                # Emit progress update
-                socketio.emit('task_completed', {
-                    'task_id': task.id,
-                    'task_title': task.title,
-                    'agent_name': agent.name,
-                    'status': task.status
-                }, room=f'user_{current_user.id}')
-            
-            # Update project completion percentage
-            total_tasks = Task.query.filter_by(project_id=project_id).count()
-            completed_tasks = Task.query.filter_by(project_id=project_id, status='completed').count()
-            if total_tasks > 0:
-                project.completion_percentage = round((completed_tasks / total_tasks) * 100, 2)
-                db.session.commit()
+            from pipeline import run_pipeline, local_backend_name
+            from_stage = project.stage
+            report = run_pipeline(project, stages=[next_stage], user_id=current_user.id,
+                                  backend=local_backend_name())
             
             # Emit completion event
-            socketio.emit('project_advancing', {
+            broadcast('project_advancing', {
                 'project_id': project_id,
-                'from_stage': project.stage - 1,
+                'from_stage': from_stage,
                 'to_stage': next_stage,
                 'task_id': None
-            }, room=f'user_{current_user.id}')
+            }, room=f'user_{current_user.id}', key=f"project:{project_id}")
             
             return jsonify({
                 'success': True,
-                'message': f'Advanced to stage {next_stage}. {success_count} tasks completed, {fail_count} failed.',
+                'message': f'Advanced to stage {next_stage}. {report["completed"]} tasks completed, {report["failed"]} failed.',
                 'async': False
             })
     
@@ -767,6 +654,7 @@ def advance_project_stage(project_id):
 
 @app.route('/api/projects/<int:project_id>/start-tasks', methods=['POST'])
 @login_required
+@single_flight_view(lambda project_id: f"{project_id}:{(request.get_json(silent=True) or {}).get('stage')}")
 def start_pending_tasks(project_id):
     """Manually start pending tasks for a project"""
     project = db.get_or_404(Project, project_id)
@@ -777,6 +665,11 @@ def start_pending_tasks(project_id):
     data = request.get_json() or {}
     stage = data.get('stage')
     
+    # Tasks left 'processing' by a dead worker go back to pending (or completed
+    # if their model call already succeeded) once their lease has expired
+    from task_leases import reap_expired_leases
+    reap_expired_leases(project_id=project_id)
+    
     # Get pending tasks - if no stage specified, get ALL pending tasks for the project
     if stage is not None:
         pending_tasks = Task.query.filter_by(
@@ -798,61 +691,30 @@ def start_pending_tasks(project_id):
             status='processing'
         ).all()
         if processing_tasks:
-            return jsonify({'error': f'{len(processing_tasks)} task(s) are already processing'}), 400
+            lease_ends = [task.lease_expires_at for task in processing_tasks if task.lease_expires_at]
+            retry_after = max(0, int((min(lease_ends) - datetime.utcnow()).total_seconds())) if lease_ends else None
+            return jsonify({
+                'error': f'{len(processing_tasks)} task(s) are already processing',
+                'retry_after_seconds': retry_after  # Earliest lease expiry, if the worker is gone
+            }), 400
         return jsonify({'error': 'No pending tasks found'}), 400
     
-    # Try to execute tasks using AI provider directly (synchronous)
-    from ai_providers import AIProviderFactory
+    # Execute the tasks directly (synchronous); they still wait for their dependencies
+    from pipeline import run_pipeline, local_backend_name
     
-    executed_count = 0
-    for task in pending_tasks:
-        if task.assigned_agent:
-            try:
-                print(f"🔥 Manually starting task {task.id} with agent {task.assigned_agent.name}")
-                task.status = 'processing'
-                db.session.commit()
-                
-                # Execute directly
-                result = AIProviderFactory.execute_agent(
-                    agent=task.assigned_agent,
-                    prompt=project.idea_source or f"Process {task.title} for project: {project.name}",
-                    project_id=project_id,
-                    task_id=task.id
-                )
-                
-                if result['success']:
-                    task.status = 'completed'
-                    executed_count += 1
-                    
-                    # Emit success notification
-                    socketio.emit('task_completed', {
-                        'task_id': task.id,
-                        'task_title': task.title,
-                        'agent_name': task.assigned_agent.name
-                    }, room=f'user_{current_user.id}')
-                else:
-                    task.status = 'failed'
-                    task.error_message = result.get('error', 'Unknown error')
-                    
-                db.session.commit()
-                
-            except Exception as e:
-                print(f"❌ Error executing task {task.id}: {str(e)}")
-                task.status = 'failed'
-                task.error_message = str(e)
-                db.session.commit()
+    report = run_pipeline(
+        project,
+        task_ids=[task.id for task in pending_tasks],
+        user_id=current_user.id,
+        backend=local_backend_name(),
+        retry_failed=False,
+        advance_stage=False
+    )
     
-    if executed_count > 0:
-        # Update project completion percentage
-        total_tasks = Task.query.filter_by(project_id=project_id).count()
-        completed_tasks = Task.query.filter_by(project_id=project_id, status='completed').count()
-        if total_tasks > 0:
-            project.completion_percentage = round((completed_tasks / total_tasks) * 100, 2)
-            db.session.commit()
-        
+    if report['completed'] > 0:
         return jsonify({
             'success': True,
-            'message': f'Started {executed_count} task(s) successfully'
+            'message': f'Started {report["completed"]} task(s) successfully'
         })
     else:
         return jsonify({
@@ -869,12 +731,66 @@ def system_metrics():
     success_rate = db.session.query(
         db.func.avg(db.case((AgentExecution.success == True, 1), else_=0))
     ).scalar() or 0
+    cached_executions = AgentExecution.query.filter_by(cached=True).count()
+    
+    # Token and latency figures count only calls the model actually served;
+    # cache hits and single-flight shares copy another call's numbers
+    reused = db.or_(
+        AgentExecution.cached.is_(True),
+        db.func.coalesce(AgentExecution.execution_metadata['single_flight'].as_string(), '') == 'shared'
+    )
+    generated = db.and_(AgentExecution.success == True, db.not_(reused))
+    input_tokens, output_tokens, avg_decode_tps, avg_prefill_ms = db.session.query(
+        db.func.sum(AgentExecution.input_tokens),
+        db.func.sum(AgentExecution.output_tokens),
+        db.func.avg(AgentExecution.decode_tokens_per_sec),
+        db.func.avg(AgentExecution.prefill_duration_ms)
+    ).filter(generated).one()
+    saved_input_tokens, saved_output_tokens = db.session.query(
+        db.func.sum(AgentExecution.input_tokens),
+        db.func.sum(AgentExecution.output_tokens)
+    ).filter(AgentExecution.success == True, reused).one()
+    cold_loads = AgentExecution.query.filter(generated, AgentExecution.load_duration_ms >= 1000).count()
+    
+    from response_cache import get_response_cache
+    from ollama_pool import get_backend_pool
+    from concurrency import get_concurrency_limiter
+    from resilience import get_circuit_breaker, get_latency_tracker
+    from semantic_cache import get_semantic_cache
+    from worker_bootstrap import get_task_setup_stats
+    from task_results import result_memory_report
+    from single_flight import get_single_flight
+    from progress_broadcaster import get_broadcaster
+    response_cache = get_response_cache()
+    semantic_cache = get_semantic_cache()
     
     return jsonify({
         'total_executions': total_executions,
         'total_cost': round(total_cost, 2),
         'avg_duration_ms': round(avg_duration),
-        'success_rate': round(success_rate * 100, 2)
+        'success_rate': round(success_rate * 100, 2),
+        'cached_executions': cached_executions,
+        'input_tokens': input_tokens or 0,
+        'output_tokens': output_tokens or 0,
+        'saved_tokens': {
+            'input_tokens': saved_input_tokens or 0,
+            'output_tokens': saved_output_tokens or 0
+        },
+        'avg_decode_tokens_per_sec': round(avg_decode_tps or 0, 2),
+        'avg_prefill_ms': round(avg_prefill_ms or 0),
+        'model_cold_loads': cold_loads,
+        'response_cache': response_cache.stats() if response_cache else None,
+        'ollama_backends': get_backend_pool().stats(),
+        'model_concurrency': get_concurrency_limiter().stats(),
+        'semantic_cache': semantic_cache.stats() if semantic_cache else None,
+        'ollama_resilience': {
+            'circuit_breaker': get_circuit_breaker().stats(),
+            **get_latency_tracker().stats()
+        },
+        'worker_task_setup': get_task_setup_stats().stats(),
+        'celery_results': result_memory_report(),
+        'single_flight': get_single_flight().stats(),
+        'realtime': get_broadcaster().stats()
     })
 
 # Socket.IO Event Handlers
@@ -918,12 +834,22 @@ def check_task_status(task_id):
         from celery_tasks import celery_app
         
         result = AsyncResult(task_id, app=celery_app)
+        task_result = result.result if result.ready() else None
+        error = str(task_result) if result.failed() else None
+        if error:
+            task_result = None
+        
+        # Results only reference their output; ?include=response loads the text
+        if request.args.get('include') == 'response' and result.successful():
+            from task_results import expand_result
+            task_result = expand_result(task_result, user_id=current_user.id)
         
         return jsonify({
             'task_id': task_id,
             'state': result.state,
-            'result': result.result if result.ready() else None,
-            'info': result.info
+            'result': task_result,
+            'error': error,
+            'info': None if result.ready() else result.info  # Progress meta while running
         })
     except redis.ConnectionError:
         # Redis not available, return a mock completed status
@@ -961,10 +887,11 @@ def generate_artifact(project_id):
         r = redis.from_url(Config.REDIS_URL)
         r.ping()
         
-        from celery_tasks import generate_project_artifacts
+        from celery_tasks import generate_project_artifacts, task_route
         
         task = generate_project_artifacts.apply_async(
-            args=[project_id, artifact_type]
+            args=[project_id, artifact_type],
+            **task_route('artifacts')
         )
         
         return jsonify({
@@ -975,6 +902,7 @@ def generate_artifact(project_id):
     except:
         # Redis not available, generate synchronously
         from ai_providers import AIProviderFactory
+        from stage_summaries import project_context
         
         # Select appropriate agent based on artifact type
         agent_map = {
@@ -998,15 +926,16 @@ def generate_artifact(project_id):
         Generate {artifact_type} for the following project:
         Name: {project.name}
         Description: {project.description}
-        Idea: {project.idea_source}
         
         Please provide a complete and production-ready {artifact_type}.
         """
         
+        # The idea goes in the shared context so the prompt budget can trim it
         result = AIProviderFactory.execute_agent(
             agent=agent,
             prompt=prompt,
-            project_id=project_id
+            project_id=project_id,
+            shared_context=project_context(project)
         )
         
         if result['success']:
@@ -1401,4 +1330,6 @@ if __name__ == '__main__':
     init_database()
     # Use Socket.IO run instead of app.run for WebSocket support
     # Note: allow_unsafe_werkzeug is needed for development mode
-    socketio.run(app, debug=True, port=5001, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    # PORT / FLASK_DEBUG let run_web.sh start several processes side by side
+    socketio.run(app, debug=os.environ.get('FLASK_DEBUG', 'true').lower() == 'true',
+                 port=int(os.environ.get('PORT', 5001)), allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+Fake Ollama Server
+Deterministic stand-in for an Ollama host with a configurable latency model,
+for benchmarks and load tests without a GPU
+
+Usage:
+    python benchmarks/fake_ollama.py --port 11435 --ttft-ms 150 --tokens-per-sec 40
+    OLLAMA_BACKENDS=http://localhost:11435 python app.py
+
+Implements /api/chat (streaming and non-streaming), /api/embeddings,
+/api/embed, /api/tags, /api/ps and /api/version, plus /fake/stats and
+/fake/reset for harnesses. Output text, embeddings and injected errors are
+deterministic for a given request and --seed.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, List
+
+VOCABULARY = (
+    "market customer revenue product launch growth pricing platform users team "
+    "analysis strategy design feature roadmap metric channel brand support scale "
+    "build test deploy data model service mobile web partner funding risk plan"
+).split()
+
+@dataclass
+class LatencyModel:
+    """Timing behaviour of the fake server (all durations before --speed scaling)"""
+    load_ms: float = 2000.0            # First request per model (cold load)
+    ttft_ms: float = 100.0             # Fixed time to first token
+    prefill_tokens_per_sec: float = 2000.0
+    tokens_per_sec: float = 50.0       # Decode speed of a single request
+    parallel_slowdown: float = 0.15    # Per extra active request, decode slows by this fraction
+    max_parallel: int = 4              # Requests decoded at once (OLLAMA_NUM_PARALLEL)
+    max_queue: int = 64                # Waiting requests beyond this get 503 (OLLAMA_MAX_QUEUE)
+    max_output_tokens: int = 256       # Cap on generated tokens (num_predict also applies)
+    error_rate: float = 0.0            # Fraction of chat requests answered with HTTP 500
+    prompt_cache_entries: int = 16     # Recent prompts whose shared prefix skips prefill
+    embedding_dim: int = 768
+    speed: float = 1.0                 # Multiplier on every sleep; 0 = instant
+    seed: int = 0
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def request_seed(payload: Dict[str, Any], seed: int) -> int:
+    canonical = json.dumps({
+        'model': payload.get('model'),
+        'messages': payload.get('messages'),
+        'options': payload.get('options'),
+        'seed': seed
+    }, sort_keys=True)
+    return int(hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16], 16)
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Hashed bag of words: texts sharing words get similar vectors"""
+    vector = [0.0] * dim
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode('utf-8')).digest()
+        index = int.from_bytes(digest[:4], 'big') % dim
+        vector[index] += 1.0 if digest[4] % 2 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [round(v / norm, 6) for v in vector]
+
+class FakeOllamaState:
+    """Shared state: loaded models, prompt cache, queue and counters"""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.slots = threading.Semaphore(max(1, latency.max_parallel))
+        self.error_rng = random.Random(latency.seed)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.loaded_models = set()
+            self.prompt_cache = []
+            self.active = 0
+            self.waiting = 0
+            self.stats = {
+                'chat_requests': 0,
+                'stream_requests': 0,
+                'embedding_requests': 0,
+                'injected_errors': 0,
+                'rejected_busy': 0,
+                'prompt_tokens': 0,
+                'prefill_tokens': 0,
+                'output_tokens': 0,
+                'peak_active': 0,
+                'peak_waiting': 0
+            }
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {**self.stats, 'active': self.active, 'waiting': self.waiting,
+                    'loaded_models': sorted(self.loaded_models),
+                    'latency_model': asdict(self.latency)}
+
+    def sleep(self, ms: float):
+        if ms > 0 and self.latency.speed > 0:
+            time.sleep(ms * self.latency.speed / 1000)
+
+    def uncached_prompt_tokens(self, prompt: str) -> int:
+        """Tokens after the longest prefix shared with a recent prompt"""
+        with self.lock:
+            shared = 0
+            for cached in self.prompt_cache:
+                limit = min(len(cached), len(prompt))
+                length = 0
+                while length < limit and cached[length] == prompt[length]:
+                    length += 1
+                shared = max(shared, length)
+            self.prompt_cache.append(prompt)
+            del self.prompt_cache[:-max(1, self.latency.prompt_cache_entries)]
+        return max(1, estimate_tokens(prompt) - shared // 4)
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: FakeOllamaState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, body: Dict[str, Any]):
+        data = (json.dumps(body) + '\n').encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        state = self.state
+        if self.path == '/api/tags':
+            models = sorted(state.loaded_models) or ['gpt-oss:20b']
+            self._send_json(200, {'models': [{'name': m, 'model': m} for m in models]})
+        elif self.path == '/api/ps':
+            self._send_json(200, {'models': [{'name': m, 'model': m} for m in sorted(state.loaded_models)]})
+        elif self.path == '/api/version':
+            self._send_json(200, {'version': '0.0.0-fake'})
+        elif self.path == '/fake/stats':
+            self._send_json(200, state.snapshot())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'invalid JSON'})
+            return
+
+        if self.path == '/api/chat':
+            self._chat(payload)
+        elif self.path in ('/api/embeddings', '/api/embed'):
+            self._embeddings(payload)
+        elif self.path == '/fake/reset':
+            self.state.reset()
+            self._send_json(200, {'ok': True})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _embeddings(self, payload: Dict[str, Any]):
+        state = self.state
+        state.count('embedding_requests')
+        dim = state.latency.embedding_dim
+        if self.path == '/api/embeddings':
+            self._send_json(200, {'embedding': fake_embedding(payload.get('prompt', ''), dim)})
+        else:
+            inputs = payload.get('input', '')
+            inputs = inputs if isinstance(inputs, list) else [inputs]
+            self._send_json(200, {'model': payload.get('model'),
+                                  'embeddings': [fake_embedding(text, dim) for text in inputs]})
+
+    def _chat(self, payload: Dict[str, Any]):
+        state = self.state
+        latency = state.latency
+        model = payload.get('model', 'gpt-oss:20b')
+        stream = payload.get('stream', True)
+        state.count('chat_requests')
+        if stream:
+            state.count('stream_requests')
+
+        with state.lock:
+            inject_error = state.error_rng.random() < latency.error_rate
+            if state.waiting >= latency.max_queue:
+                state.stats['rejected_busy'] += 1
+                busy = True
+            else:
+                busy = False
+                state.waiting += 1
+                state.stats['peak_waiting'] = max(state.stats['peak_waiting'], state.waiting)
+        if busy:
+            self._send_json(503, {'error': 'server busy, please try again. maximum pending requests exceeded'})
+            return
+
+        state.slots.acquire()
+        try:
+            with state.lock:
+                state.waiting -= 1
+                state.active += 1
+                state.stats['peak_active'] = max(state.stats['peak_active'], state.active)
+                cold = model not in state.loaded_models
+                state.loaded_models.add(model)
+
+            if inject_error:
+                state.count('injected_errors')
+                self._send_json(500, {'error': 'fake injected failure'})
+                return
+
+            self._generate(payload, model, stream, cold)
+        finally:
+            with state.lock:
+                state.active -= 1
+            state.slots.release()
+
+    def _generate(self, payload: Dict[str, Any], model: str, stream: bool, cold: bool):
+        state = self.state
+        latency = state.latency
+        started = time.time()
+
+        prompt = "\n".join(m.get('content', '') for m in payload.get('messages', []))
+        prompt_tokens = estimate_tokens(prompt)
+        prefill_tokens = state.uncached_prompt_tokens(prompt)
+        options = payload.get('options') or {}
+        num_predict = options.get('num_predict') or latency.max_output_tokens
+        rng = random.Random(request_seed(payload, latency.seed))
+        output_tokens = max(1, min(num_predict, latency.max_output_tokens,
+                                   rng.randint(latency.max_output_tokens // 2, latency.max_output_tokens)))
+        words = [rng.choice(VOCABULARY) for _ in range(output_tokens)]
+
+        load_ms = latency.load_ms if cold else 0.0
+        prefill_ms = latency.ttft_ms + prefill_tokens / latency.prefill_tokens_per_sec * 1000
+        state.sleep(load_ms + prefill_ms)
+
+        decode_started = time.time()
+        done = {
+            'model': model,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'done': True,
+            'done_reason': 'length' if output_tokens >= num_predict else 'stop',
+            'prompt_eval_count': prefill_tokens,
+            'eval_count': output_tokens
+        }
+
+        if stream:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                for i, word in enumerate(words):
+                    state.sleep(self._token_ms())
+                    self._write_chunk({'model': model, 'done': False,
+                                       'message': {'role': 'assistant', 'content': word + ' '}})
+                done['message'] = {'role': 'assistant', 'content': ''}
+                self._finish(done, started, decode_started, load_ms, prefill_ms)
+                self._write_chunk(done)
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                return  # Client went away mid-stream
+        else:
+            for _ in words:
+                state.sleep(self._token_ms())
+            done['message'] = {'role': 'assistant', 'content': ' '.join(words)}
+            self._finish(done, started, decode_started, load_ms, prefill_ms)
+            self._send_json(200, done)
+
+        state.count('prompt_tokens', prompt_tokens)
+        state.count('prefill_tokens', prefill_tokens)
+        state.count('output_tokens', output_tokens)
+
+    def _token_ms(self) -> float:
+        latency = self.state.latency
+        slowdown = 1 + latency.parallel_slowdown * max(0, self.state.active - 1)
+        return 1000 / latency.tokens_per_sec * slowdown
+
+    @staticmethod
+    def _finish(done: Dict[str, Any], started: float, decode_started: float,
+                load_ms: float, prefill_ms: float):
+        """Fill Ollama's nanosecond timing fields (modelled, not wall clock, at speed 0)"""
+        now = time.time()
+        decode_ns = max(int((now - decode_started) * 1e9), 1)
+        done['load_duration'] = int(load_ms * 1e6)
+        done['prompt_eval_duration'] = int(prefill_ms * 1e6)
+        done['eval_duration'] = decode_ns
+        done['total_duration'] = max(int((now - started) * 1e9),
+                                     done['load_duration'] + done['prompt_eval_duration'] + decode_ns)
+
+class FakeOllamaServer:
+    """Runs the fake server on a background thread (for harnesses and tests)"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: Optional[LatencyModel] = None):
+        self.state = FakeOllamaState(latency or LatencyModel())
+        handler = type('BoundFakeOllamaHandler', (FakeOllamaHandler,), {'state': self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeOllamaServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       name='fake-ollama', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.state.snapshot()
+
+def main():
+    defaults = LatencyModel()
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('FAKE_OLLAMA_PORT', 11435)))
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    latency = LatencyModel(**{field: getattr(args, field) for field in asdict(defaults)})
+    server = FakeOllamaServer(args.host, args.port, latency)
+    print(f"🧪 Fake Ollama listening on {server.url} "
+          f"(ttft {latency.ttft_ms:g}ms, {latency.tokens_per_sec:g} tok/s, "
+          f"parallel {latency.max_parallel}, errors {latency.error_rate:.0%})")
+    print(f"   Point the app at it with OLLAMA_BACKENDS={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Fake Ollama stopped")
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+Pipeline Throughput Benchmark
+Drives concurrent projects through the six-stage pipeline against a scratch
+database and a fake (or replayed) model backend, and reports JSON metrics
+
+Usage:
+    python benchmarks/pipeline_throughput.py --mode pipeline --projects 8 --concurrency 4
+    python benchmarks/pipeline_throughput.py --mode http --speed 0 --output before.json
+    python benchmarks/pipeline_throughput.py --mode auto_run --compare before.json
+
+Modes:
+    pipeline  process_project_pipeline for stages 1-6 (Celery tasks run in-process)
+    auto_run  auto_run_project per project, then poll until it reaches stage 6
+              (each finished stage queues the next one)
+    http      /login, /projects/new, /api/projects/<id>/advance and
+              /api/tasks/<id>/status through the Flask test client
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def percentile(values, pct: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50),
+        'p95_ms': percentile(values, 95),
+        'p99_ms': percentile(values, 99),
+        'mean_ms': round(statistics.mean(values), 1) if values else None
+    }
+
+class DatabaseTimer:
+    """Accumulates time spent executing SQL statements, across all engines"""
+
+    def __init__(self):
+        self.total_ms = 0.0
+        self.statements = 0
+        self._lock = threading.Lock()
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('bench_start', []).append(time.perf_counter())
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = (time.perf_counter() - conn.info['bench_start'].pop()) * 1000
+            with self._lock:
+                self.total_ms += elapsed
+                self.statements += 1
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+def make_users(app, db, count: int):
+    from werkzeug.security import generate_password_hash
+    from database import User
+
+    with app.app_context():
+        users = []
+        for i in range(count):
+            user = User(username=f"bench{i}", email=f"bench{i}@example.com",
+                        password_hash=generate_password_hash('bench'))
+            db.session.add(user)
+            users.append(user)
+        db.session.commit()
+        return [user.id for user in users]
+
+def idea_for(index: int, words: int) -> str:
+    topics = ['dog walking', 'meal planning', 'tutoring', 'bike repair', 'plant care',
+              'event tickets', 'home cleaning', 'language exchange']
+    topic = topics[index % len(topics)]
+    text = (f"A marketplace app for {topic} that matches customers with vetted local "
+            f"providers, with scheduling, payments, reviews and a subscription tier. ")
+    return (text * (words // len(text.split()) + 1))[:words * 7]
+
+def create_project(app, db, user_id: int, index: int, idea_words: int) -> int:
+    from database import Project
+
+    with app.app_context():
+        project = Project(name=f"Bench Project {index}", description="Benchmark project",
+                          idea_source=idea_for(index, idea_words), user_id=user_id,
+                          status='idea', stage=0)
+        db.session.add(project)
+        db.session.commit()
+        return project.id
+
+def run_pipeline_project(app, db, user_id, index, args, stage_times):
+    from celery_tasks import process_project_pipeline
+
+    project_id = create_project(app, db, user_id, index, args.idea_words)
+    for stage in range(1, 7):
+        start = time.perf_counter()
+        process_project_pipeline.apply(args=[project_id, stage, user_id]).get(disable_sync_subtasks=False)
+        stage_times[stage].append((time.perf_counter() - start) * 1000)
+    return project_id
+
+def wait_for_project(app, db, project_id: int, timeout: float):
+    """Poll until the project reaches stage 6; raise once one of its tasks fails or time runs out"""
+    from database import Project, Task
+
+    deadline = time.time() + timeout
+    while True:
+        with app.app_context():
+            stage = db.session.get(Project, project_id).stage or 0
+            failed = Task.query.filter_by(project_id=project_id, status='failed').count()
+        if stage >= 6:
+            return
+        if failed:
+            raise RuntimeError(f"{failed} task(s) failed, project stopped at stage {stage}")
+        if time.time() > deadline:
+            raise RuntimeError(f"timed out after {timeout:g}s at stage {stage}")
+        time.sleep(0.2)
+
+def run_auto_project(app, db, user_id, index, args, stage_times):
+    from celery_tasks import auto_run_project
+    from database import Task
+
+    project_id = create_project(app, db, user_id, index, args.idea_words)
+    result = auto_run_project.apply(args=[project_id, user_id]).get(disable_sync_subtasks=False)
+    if not result.get('success'):
+        raise RuntimeError(result.get('error'))
+
+    # This call only runs stage 1; each finished stage queues the next one
+    # (in-process here, on workers otherwise), so wait for the project
+    wait_for_project(app, db, project_id, args.timeout)
+
+    # Stages run inside other tasks; use the task timestamps
+    with app.app_context():
+        spans = defaultdict(list)
+        for task in Task.query.filter_by(project_id=project_id).all():
+            if task.started_at and task.completed_at:
+                spans[task.stage].append((task.started_at, task.completed_at))
+        for stage, times in spans.items():
+            elapsed = max(end for _, end in times) - min(start for start, _ in times)
+            stage_times[stage].append(elapsed.total_seconds() * 1000)
+    return project_id
+
+def run_http_project(app, db, user_id, index, args, stage_times):
+    from database import Project
+
+    client = app.test_client()
+    client.post('/login', data={'email': f"bench{index % args.users}@example.com", 'password': 'bench'})
+
+    start = time.perf_counter()
+    response = client.post('/projects/new', json={
+        'name': f"Bench Project {index}",
+        'description': 'Benchmark project',
+        'idea_source': idea_for(index, args.idea_words)
+    })
+    if response.status_code not in (200, 302):
+        raise RuntimeError(f"/projects/new returned {response.status_code}")
+    stage_times[1].append((time.perf_counter() - start) * 1000)
+
+    with app.app_context():
+        project_id = Project.query.filter_by(name=f"Bench Project {index}").first().id
+
+    for stage in range(2, 7):
+        start = time.perf_counter()
+        response = client.post(f'/api/projects/{project_id}/advance')
+        data = response.get_json() or {}
+        if not data.get('success'):
+            raise RuntimeError(f"advance to stage {stage} failed: {data}")
+        # Queued on Celery: poll until a worker finishes it
+        while data.get('task_id'):
+            status = client.get(f"/api/tasks/{data['task_id']}/status").get_json()
+            if status['state'] in ('SUCCESS', 'FAILURE'):
+                break
+            time.sleep(0.2)
+        stage_times[stage].append((time.perf_counter() - start) * 1000)
+    return project_id
+
+RUNNERS = {
+    'pipeline': run_pipeline_project,
+    'auto_run': run_auto_project,
+    'http': run_http_project
+}
+
+def compare(report, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline.get('git_commit')}):")
+    for key in ('projects_per_hour', 'wall_seconds', 'db_time_ms', 'model_time_ms', 'peak_rss_mb'):
+        before, after = baseline.get(key), report.get(key)
+        if before:
+            print(f"  {key:<20}{before:>12}{after:>12}  ({(after - before) / before * 100:+.1f}%)")
+    for stage, stats in report['stages'].items():
+        before = baseline.get('stages', {}).get(stage, {}).get('p95_ms')
+        if before:
+            print(f"  stage {stage} p95{'':<10}{before:>12}{stats['p95_ms']:>12}  "
+                  f"({(stats['p95_ms'] - before) / before * 100:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--mode', choices=sorted(RUNNERS), default='pipeline')
+    parser.add_argument('--projects', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--idea-words', type=int, default=200)
+    parser.add_argument('--database-url', help='Defaults to a scratch SQLite file')
+    parser.add_argument('--backend', help='Use this Ollama URL instead of the built-in fake server')
+    parser.add_argument('--cassette', help='Replay this cassette instead of calling a backend')
+    parser.add_argument('--speed', type=float, default=0.05, help='Fake server latency multiplier (0 = instant)')
+    parser.add_argument('--ttft-ms', type=float, default=100)
+    parser.add_argument('--tokens-per-sec', type=float, default=50)
+    parser.add_argument('--max-output-tokens', type=int, default=128)
+    parser.add_argument('--max-parallel', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds to wait for an auto_run project')
+    parser.add_argument('--output', help='Write the JSON report to this path')
+    parser.add_argument('--compare', help='Print deltas against an earlier JSON report')
+    args = parser.parse_args()
+
+    # Everything below must be configured before the app modules are imported
+    os.environ['DATABASE_URL'] = args.database_url or \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['AUTO_RUN_MIN_STAGE_GAP_SECONDS'] = '0'
+
+    fake_server = None
+    if args.cassette:
+        os.environ['OLLAMA_CASSETTE_MODE'] = 'replay'
+        os.environ['OLLAMA_CASSETTE_PATH'] = args.cassette
+    elif args.backend:
+        os.environ['OLLAMA_BACKENDS'] = args.backend
+    else:
+        from benchmarks.fake_ollama import FakeOllamaServer, LatencyModel
+        fake_server = FakeOllamaServer(latency=LatencyModel(
+            speed=args.speed, ttft_ms=args.ttft_ms, tokens_per_sec=args.tokens_per_sec,
+            max_output_tokens=args.max_output_tokens, max_parallel=args.max_parallel
+        )).start()
+        os.environ['OLLAMA_BACKENDS'] = fake_server.url
+
+    db_timer = DatabaseTimer()
+    db_timer.install()
+
+    from app import app, db, init_database
+    from celery_tasks import celery_app
+    from database import AgentExecution
+
+    # Run Celery tasks in this process; results stay in memory
+    celery_app.conf.update(task_always_eager=True, task_eager_propagates=True,
+                           result_backend='cache+memory://')
+    app.config['TESTING'] = True
+
+    init_database()
+    make_users(app, db, args.users)
+    with app.app_context():
+        user_ids = [u.id for u in db.session.execute(db.text('SELECT id FROM users')).fetchall()]
+
+    runner = RUNNERS[args.mode]
+    stage_times = defaultdict(list)
+    failures = []
+
+    def run(index):
+        try:
+            return runner(app, db, user_ids[index % len(user_ids)], index, args, stage_times)
+        except Exception as e:
+            failures.append({'project': index, 'error': str(e)})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run, range(args.projects)))
+    wall_seconds = time.perf_counter() - start
+
+    with app.app_context():
+        executions = AgentExecution.query.all()
+        model_time_ms = sum(e.duration_ms or 0 for e in executions)
+        failed_executions = sum(1 for e in executions if not e.success)
+
+    completed = args.projects - len(failures)
+    report = {
+        'git_commit': git_commit(),
+        'mode': args.mode,
+        'projects': args.projects,
+        'completed_projects': completed,
+        'concurrency': args.concurrency,
+        'wall_seconds': round(wall_seconds, 2),
+        'projects_per_hour': round(completed / wall_seconds * 3600, 1) if wall_seconds else None,
+        'stages': {str(stage): summarize(times) for stage, times in sorted(stage_times.items())},
+        'agent_executions': len(executions),
+        'failed_executions': failed_executions,
+        'model_time_ms': round(model_time_ms),
+        'db_time_ms': round(db_timer.total_ms),
+        'db_statements': db_timer.statements,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'failures': failures,
+        'backend': 'cassette' if args.cassette else (args.backend or 'fake'),
+        'fake_ollama': fake_server.stats() if fake_server else None
+    }
+
+    print(f"{'Stage':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in report['stages'].items():
+        print(f"{stage:<8}{stats['p50_ms']!s:>10}{stats['p95_ms']!s:>10}{stats['p99_ms']!s:>10}")
+    print(f"Projects/hour: {report['projects_per_hour']}  wall: {report['wall_seconds']}s  "
+          f"model: {report['model_time_ms']}ms  db: {report['db_time_ms']}ms  "
+          f"rss: {report['peak_rss_mb']}MB  failures: {len(failures)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+    if fake_server:
+        fake_server.stop()
+
+if __name__ == '__main__':
+    main()
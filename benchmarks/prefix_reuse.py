@@ -0,0 +1,124 @@
+"""
+Prefix Reuse Benchmark
+Measures per-agent prefill time with and without the shared project-context
+prefix (Config.OLLAMA_SHARED_PREFIX)
+
+Usage:
+    python benchmarks/prefix_reuse.py --backend http://localhost:11434 --idea-words 1500
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Use a scratch database so the benchmark never touches application data
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from config import Config
+
+def synthetic_idea(words: int) -> str:
+    """Deterministic long project idea of roughly the given word count"""
+    sentence = ("The platform connects independent dog walkers with busy pet owners, "
+                "handles scheduling, payments, GPS tracked walks and reviews, ")
+    parts = []
+    while len(" ".join(parts).split()) < words:
+        parts.append(f"Requirement {len(parts) + 1}: {sentence}")
+    return " ".join(parts)
+
+def run_mode(provider, agents, idea: str, shared_prefix: bool, max_tokens: int):
+    """Run every agent once against the idea and collect prefill timings"""
+    Config.OLLAMA_SHARED_PREFIX = shared_prefix
+    mode = 'shared_prefix' if shared_prefix else 'isolated'
+    results = []
+
+    for agent_name, system_content in agents:
+        response = provider.generate(
+            prompt=f"Task: {agent_name} benchmark\n\nUsing the project context above, "
+                   f"complete this task in your role.",
+            system_prompt=system_content,
+            temperature=0,
+            max_tokens=max_tokens,
+            context_prefix=idea,
+            affinity_key=f"benchmark:{mode}"
+        )
+        results.append({
+            'agent': agent_name,
+            'success': response.success,
+            'error': response.error_message,
+            'input_tokens': response.input_tokens,
+            'prefill_ms': response.prefill_duration_ms,
+            'load_ms': response.load_duration_ms,
+            'total_ms': response.total_duration_ms
+        })
+
+    prefill = [r['prefill_ms'] for r in results if r['success']]
+    return {
+        'mode': mode,
+        'agents': results,
+        'mean_prefill_ms': round(statistics.mean(prefill), 1) if prefill else None,
+        'total_prefill_ms': sum(prefill),
+        'evaluated_input_tokens': sum(r['input_tokens'] for r in results)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--backend', default=Config.OLLAMA_BACKENDS[0])
+    parser.add_argument('--idea-words', type=int, default=1500)
+    parser.add_argument('--idea-file', help='Use the contents of this file as the project idea')
+    parser.add_argument('--max-tokens', type=int, default=16)
+    parser.add_argument('--output', help='Write the JSON report to this path')
+    args = parser.parse_args()
+
+    Config.OLLAMA_BACKENDS = [args.backend]
+    Config.RESPONSE_CACHE_ENABLED = False
+
+    from app import app, db, seed_initial_agents
+    from database import Agent, SystemPrompt
+    from ai_providers import OllamaProvider
+
+    with app.app_context():
+        db.create_all()
+        seed_initial_agents()
+        agents = []
+        for agent in Agent.query.order_by(Agent.stage, Agent.id).all():
+            prompt = SystemPrompt.query.filter_by(agent_id=agent.id, is_active=True).first()
+            agents.append((agent.name, f"{prompt.role}\n\n{prompt.instructions}"))
+
+    if args.idea_file:
+        with open(args.idea_file) as f:
+            idea = f.read()
+    else:
+        idea = synthetic_idea(args.idea_words)
+
+    provider = OllamaProvider()
+    # Warm the model so the first measured agent does not pay the load time
+    provider.generate("ping", max_tokens=1)
+
+    report = {
+        'backend': args.backend,
+        'idea_words': len(idea.split()),
+        'agents': len(agents),
+        'runs': [run_mode(provider, agents, idea, shared, args.max_tokens)
+                 for shared in (False, True)]
+    }
+    isolated, shared = report['runs']
+    if isolated['total_prefill_ms'] and shared['total_prefill_ms']:
+        report['prefill_speedup'] = round(isolated['total_prefill_ms'] / shared['total_prefill_ms'], 2)
+
+    print(f"{'Agent':<22}{'isolated ms':>14}{'shared ms':>12}")
+    for before, after in zip(isolated['agents'], shared['agents']):
+        print(f"{before['agent']:<22}{before['prefill_ms']:>14}{after['prefill_ms']:>12}")
+    print(f"{'Mean':<22}{isolated['mean_prefill_ms']!s:>14}{shared['mean_prefill_ms']!s:>12}")
+    print(f"Prefill speedup: {report.get('prefill_speedup')}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
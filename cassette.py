@@ -0,0 +1,225 @@
+"""
+Cassette Module
+Records Ollama request/response pairs with their timings to a JSONL cassette
+and replays them offline, at recorded speed or as fast as possible
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator
+
+from config import Config
+from ai_providers import OllamaProvider, StreamChunk
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when the cassette has no entry for a request"""
+    pass
+
+def request_hash(payload: Dict[str, Any]) -> str:
+    """Hash of what determines the answer; stream and keep_alive are ignored"""
+    canonical = json.dumps({
+        'model': payload.get('model'),
+        'messages': payload.get('messages'),
+        'options': payload.get('options')
+    }, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class Cassette:
+    """
+    JSONL file of recorded calls, one compact line per call.
+
+    Each line holds the request hash, the final Ollama response (with the
+    full message content and timing fields), the time to first token and
+    the total duration. Requests recorded more than once are replayed in
+    recorded order, cycling when exhausted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        self.counters = {'recorded': 0, 'replayed': 0, 'misses': 0}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with self._lock:
+            self._entries = {}
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry['hash'], []).append(entry)
+
+    def record(self, payload: Dict[str, Any], response_data: Dict[str, Any],
+               duration_ms: float, ttft_ms: Optional[float] = None):
+        entry = {
+            'hash': request_hash(payload),
+            'model': payload.get('model'),
+            'stream': bool(payload.get('stream')),
+            'recorded_at': datetime.utcnow().isoformat(),
+            'ttft_ms': round(ttft_ms) if ttft_ms is not None else None,
+            'duration_ms': round(duration_ms),
+            'response': response_data
+        }
+        line = json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n'
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # One append per call keeps lines whole when several workers record
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._entries.setdefault(entry['hash'], []).append(entry)
+            self.counters['recorded'] += 1
+
+    def lookup(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        key = request_hash(payload)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.counters['misses'] += 1
+                raise CassetteMiss(f"No cassette entry for request {key[:12]} "
+                                   f"(model {payload.get('model')}) in {self.path}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            self.counters['replayed'] += 1
+            return entries[position % len(entries)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                'path': self.path,
+                'requests': len(self._entries),
+                'entries': sum(len(entries) for entries in self._entries.values())
+            }
+
+class RecordingOllamaProvider(OllamaProvider):
+    """OllamaProvider that appends every completed call to a cassette"""
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def generate_stream(self, prompt: str, system_prompt: Optional[str] = None,
+                        temperature: float = 0.7, max_tokens: int = 4000,
+                        model: str = "gpt-oss:20b",
+                        context_prefix: Optional[str] = None,
+                        affinity_key: Optional[str] = None,
+                        deadline: Optional[float] = None) -> Iterator[StreamChunk]:
+        payload = self._build_payload(prompt, system_prompt, temperature,
+                                      max_tokens, model, stream=True,
+                                      context_prefix=context_prefix)
+        parts = []
+        ttft_ms = None
+        for chunk in super().generate_stream(prompt, system_prompt, temperature,
+                                             max_tokens, model, context_prefix,
+                                             affinity_key, deadline):
+            if chunk.content:
+                parts.append(chunk.content)
+                if ttft_ms is None:
+                    ttft_ms = chunk.elapsed_ms
+            if chunk.done:
+                final = dict(chunk.data)
+                final['message'] = {'role': 'assistant', 'content': ''.join(parts)}
+                self.cassette.record(payload, final, chunk.elapsed_ms, ttft_ms)
+            yield chunk
+
+    def _post_chat(self, payload: Dict[str, Any], model: str,
+                   affinity_key: Optional[str], deadline: Optional[float],
+                   exclude: Optional[str] = None, slot_wait: Optional[float] = None,
+                   chosen: Optional[Dict[str, str]] = None) -> tuple:
+        start_time = time.time()
+        response_data, backend_url = super()._post_chat(payload, model, affinity_key, deadline,
+                                                        exclude, slot_wait, chosen)
+        self.cassette.record(payload, response_data, (time.time() - start_time) * 1000)
+        return response_data, backend_url
+
+class ReplayOllamaProvider(OllamaProvider):
+    """
+    OllamaProvider that answers from a cassette without any network call.
+
+    speed scales the recorded timings: 1.0 replays at recorded speed, 0
+    answers immediately. Retries, budgeting and bookkeeping above the
+    transport still run, so replay time is the application's own overhead
+    plus the (scaled) model time.
+    """
+
+    def __init__(self, cassette: Cassette, speed: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+        self.speed = speed
+        self.backend_url = f"cassette://{cassette.path}"
+
+    def _sleep(self, ms: Optional[float]):
+        if ms and self.speed > 0:
+            time.sleep(ms * self.speed / 1000)
+
+    def generate_stream(self, prompt: str, system_prompt: Optional[str] = None,
+                        temperature: float = 0.7, max_tokens: int = 4000,
+                        model: str = "gpt-oss:20b",
+                        context_prefix: Optional[str] = None,
+                        affinity_key: Optional[str] = None,
+                        deadline: Optional[float] = None) -> Iterator[StreamChunk]:
+        payload = self._build_payload(prompt, system_prompt, temperature,
+                                      max_tokens, model, stream=True,
+                                      context_prefix=context_prefix)
+        entry = self.cassette.lookup(payload)
+        response_data = entry['response']
+        content = response_data.get('message', {}).get('content', '')
+        start_time = time.time()
+
+        # Re-stream the content word by word, spread over the recorded decode time
+        ttft_ms = entry.get('ttft_ms') or 0
+        words = content.split(' ')
+        pieces = [word + ' ' for word in words[:-1]] + [words[-1]] if content else []
+        per_piece_ms = max(0, entry['duration_ms'] - ttft_ms) / max(1, len(pieces))
+        self._sleep(ttft_ms)
+
+        for i, piece in enumerate(pieces):
+            if i:
+                self._sleep(per_piece_ms)
+            yield StreamChunk(
+                content=piece,
+                done=False,
+                elapsed_ms=int((time.time() - start_time) * 1000),
+                data={'model': model, 'done': False,
+                      'message': {'role': 'assistant', 'content': piece}},
+                backend=self.backend_url
+            )
+
+        final = dict(response_data)
+        final['message'] = {'role': 'assistant', 'content': ''}
+        yield StreamChunk(
+            content='',
+            done=True,
+            elapsed_ms=int((time.time() - start_time) * 1000),
+            data=final,
+            backend=self.backend_url
+        )
+
+    def _post_chat(self, payload: Dict[str, Any], model: str,
+                   affinity_key: Optional[str], deadline: Optional[float],
+                   exclude: Optional[str] = None, slot_wait: Optional[float] = None,
+                   chosen: Optional[Dict[str, str]] = None) -> tuple:
+        entry = self.cassette.lookup(payload)
+        self._sleep(entry['duration_ms'])
+        return dict(entry['response']), self.backend_url
+
+def create_cassette_provider(mode: str) -> OllamaProvider:
+    """Provider for Config.OLLAMA_CASSETTE_MODE ('record' or 'replay')"""
+    cassette = Cassette(Config.OLLAMA_CASSETTE_PATH)
+    if mode == 'record':
+        print(f"📼 Recording Ollama calls to {cassette.path}")
+        return RecordingOllamaProvider(cassette)
+    if mode == 'replay':
+        print(f"📼 Replaying Ollama calls from {cassette.path} "
+              f"({cassette.stats()['entries']} entries, speed {Config.OLLAMA_CASSETTE_REPLAY_SPEED:g})")
+        return ReplayOllamaProvider(cassette, speed=Config.OLLAMA_CASSETTE_REPLAY_SPEED)
+    raise ValueError(f"Unknown cassette mode: {mode}")
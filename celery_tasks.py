@@ -5,51 +5,133 @@ Handles background AI execution and project pipeline processing
 
 import time
 from celery import Celery, Task
+from celery.signals import worker_process_init
 from celery.result import AsyncResult
+from kombu import Queue
+from contextlib import nullcontext
 from datetime import datetime
 from typing import Dict, Any, Optional
 import json
 
 from config import Config
+from worker_bootstrap import task_app_context, warm_worker_process
+from task_results import typed_result, agent_result_ref, message_compression
+
+# Queues, most latency-sensitive first; run_worker.sh starts a pool per queue
+TASK_QUEUES = ('interactive', 'pipeline', 'bulk')
+
+# Which queue work lands on, by where it was started
+ENTRY_POINT_QUEUES = {
+    'agent_execute': 'interactive',    # /agents/<id>/execute
+    'project_create': 'pipeline',      # Stage 1 of a new project
+    'stage_advance': 'pipeline',       # /api/projects/<id>/advance
+    'pipeline_node': 'pipeline',       # One agent of a pipeline run
+    'auto_run': 'bulk',                # Auto-run stages and their agents
+    'artifacts': 'bulk'                # Artifact generation
+}
+
+class AppTask(Task):
+    """Base class of every task: compresses messages with large arguments"""
+    
+    def apply_async(self, args=None, kwargs=None, **options):
+        if 'compression' not in options:
+            compression = message_compression(args, kwargs)
+            if compression:
+                options['compression'] = compression
+        return super().apply_async(args, kwargs, **options)
 
 # Initialize Celery
-celery_app = Celery('billion_dollar_tasks')
+celery_app = Celery('billion_dollar_tasks', task_cls=AppTask)
 celery_app.config_from_object({
     'broker_url': Config.CELERY_BROKER_URL,
     'result_backend': Config.CELERY_RESULT_BACKEND,
     'task_serializer': 'json',
     'accept_content': ['json'],
     'result_serializer': 'json',
+    'result_expires': Config.CELERY_RESULT_EXPIRES_SECONDS,  # Results are references; status polling only needs minutes
     'timezone': 'UTC',
     'enable_utc': True,
     'task_track_started': True,
     'task_time_limit': 600,  # 10 minutes max per task for local models
     'task_soft_time_limit': 570,  # Soft limit at 9.5 minutes
+    'task_queues': [Queue(name) for name in TASK_QUEUES],
+    'task_default_queue': 'pipeline',
+    'task_routes': {
+        'celery_tasks.execute_agent_async': {'queue': 'interactive'},
+        'celery_tasks.generate_project_artifacts': {'queue': 'bulk'},
+        'celery_tasks.auto_run_project': {'queue': 'bulk'},
+    },
+    'task_default_priority': 5,
+    # Take one task at a time so a waiting high-priority task is picked next
+    'worker_prefetch_multiplier': 1,
+    # Redis emulates priorities with one list per level; 0 is served first
+    'broker_transport_options': {
+        'priority_steps': list(range(10)),
+        'sep': ':',
+        'queue_order_strategy': 'priority',
+    },
+    # Return tasks of dead workers to the pipeline (run beat with -B or `celery beat`)
+    'beat_schedule': {
+        'reap-task-leases': {
+            'task': 'celery_tasks.reap_task_leases',
+            'schedule': Config.TASK_LEASE_REAP_INTERVAL_SECONDS,
+            'options': {'queue': 'pipeline', 'expires': Config.TASK_LEASE_REAP_INTERVAL_SECONDS},
+        },
+    },
 })
 
-class CallbackTask(Task):
-    """Task with Socket.IO callback support"""
-    
-    def on_success(self, retval, task_id, args, kwargs):
-        """Called on successful task completion"""
-        # Emit Socket.IO event if socketio is available
-        emit_task_update(task_id, 'completed', retval)
+def broker_priority(task_priority: Optional[int]) -> int:
+    """Map Task.priority (1-10, higher is more important) to a broker priority (0 first)"""
+    if task_priority is None:
+        return celery_app.conf.task_default_priority
+    return max(0, min(9, 10 - task_priority))
+
+def task_route(entry_point: str, task_priority: Optional[int] = None) -> Dict[str, Any]:
+    """
+    apply_async options for work started from an entry point: its queue and
+    broker priority. Tasks at or above Config.QUEUE_PROMOTE_PRIORITY move one
+    queue closer to interactive.
+    """
+    queue = ENTRY_POINT_QUEUES.get(entry_point, celery_app.conf.task_default_queue)
+    if task_priority is not None and task_priority >= Config.QUEUE_PROMOTE_PRIORITY:
+        queue = TASK_QUEUES[max(0, TASK_QUEUES.index(queue) - 1)]
+    return {'queue': queue, 'priority': broker_priority(task_priority)}
+
+@worker_process_init.connect
+def bootstrap_worker_process(**kwargs):
+    """Build the app, DB pool and prompt catalog once per worker process"""
+    try:
+        warm_worker_process()
+    except Exception as e:
+        print(f"⚠️ Worker warm-up failed, tasks will set up lazily: {e}")
+
+class CallbackTask(AppTask):
+    """Task with Socket.IO callback support (successes are emitted by the task itself)"""
     
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         """Called on task failure"""
-        emit_task_update(task_id, 'failed', {'error': str(exc)})
+        user_id = kwargs.get('user_id', args[4] if len(args) > 4 else None)
+        project_id = kwargs.get('project_id', args[2] if len(args) > 2 else None)
+        emit_task_update(task_id, 'failed', {'error': str(exc)}, user_id=user_id, project_id=project_id)
 
-def emit_task_update(task_id: str, status: str, data: Any):
-    """Emit task update via Socket.IO"""
-    try:
-        from app import socketio
-        socketio.emit('task_update', {
-            'task_id': task_id,
-            'status': status,
-            'data': data
-        }, namespace='/tasks')
-    except:
-        pass  # Socket.IO might not be available in worker context
+def emit_task_update(task_id: str, status: str, data: Any,
+                     user_id: Optional[int] = None, project_id: Optional[int] = None):
+    """
+    Emit task update via Socket.IO to the user's room (or the project's).
+    Goes through the Redis message queue, so it reaches browsers connected
+    to any web process, from workers too. Updates are batched; a later
+    update of the same task within the window replaces an earlier one.
+    """
+    from realtime import task_room
+    from progress_broadcaster import broadcast
+    
+    # Without a room there is nobody to address; never broadcast one user's update to everyone
+    broadcast('task_update', {
+        'task_id': task_id,
+        'status': status,
+        'project_id': project_id,
+        'data': data
+    }, room=task_room(user_id, project_id), key=f"task:{task_id}")
 
 @celery_app.task(base=CallbackTask, bind=True)
 def execute_agent_async(self, agent_id: int, prompt: str, 
@@ -62,13 +144,15 @@ def execute_agent_async(self, agent_id: int, prompt: str,
     start_time = time.time()
     
     # Import here to avoid circular imports
-    from app import create_app
     from database import db, Agent, Task, AgentExecution, Project
     from ai_providers import AIProviderFactory
+    from task_leases import (new_lease_owner, acquire_lease, finish_lease,
+                             successful_execution, LeaseHeartbeat)
     
-    app = create_app()
+    lease_owner = new_lease_owner()
+    leased = False
     
-    with app.app_context():
+    with task_app_context('execute_agent_async'):
         try:
             # Update task status to processing
             self.update_state(state='PROCESSING', meta={'status': 'Loading agent...'})
@@ -78,26 +162,53 @@ def execute_agent_async(self, agent_id: int, prompt: str,
             if not agent:
                 raise ValueError(f"Agent {agent_id} not found")
             
+            # Lease the task if provided; a task another worker runs, or one
+            # that already completed, is never executed a second time
+            if task_id and db.session.get(Task, task_id) is not None:
+                leased = acquire_lease(task_id, lease_owner, claimed=False)
+                execution = successful_execution(task_id)
+                if not leased and execution is None:
+                    print(f"⏭️ Task {task_id} is leased by another worker, skipping")
+                    return typed_result('agent_execution', {
+                        'success': False,
+                        'skipped': True,
+                        'error': 'Task is leased by another worker'
+                    })
+                if execution is not None:
+                    # Its model call already succeeded: hand back the stored output
+                    if leased:
+                        finish_lease(task_id, lease_owner, {
+                            'status': 'completed',
+                            'completed_at': execution.created_at or datetime.utcnow(),
+                            'error_message': None,
+                            'output_data': {'response': execution.output_response}
+                        })
+                        leased = False
+                    print(f"♻️ Task {task_id} already has execution {execution.id}, not calling the model again")
+                    result_ref = dict(agent_result_ref({
+                        'success': True,
+                        'execution_id': execution.id,
+                        'response': execution.output_response,
+                        'tokens_used': execution.tokens_used,
+                        'input_tokens': execution.input_tokens,
+                        'output_tokens': execution.output_tokens
+                    }), reused=True)
+                    emit_task_update(self.request.id, 'completed', result_ref, user_id=user_id, project_id=project_id)
+                    return result_ref
+            
             # Update agent status
             agent.status = 'running'
             db.session.commit()
             
-            # Update task if provided
-            if task_id:
-                task = db.session.get(Task, task_id)
-                if task:
-                    task.status = 'processing'
-                    task.started_at = datetime.utcnow()
-                    db.session.commit()
-            
             # Execute the agent
             self.update_state(state='PROCESSING', meta={'status': 'Calling AI provider...'})
-            result = AIProviderFactory.execute_agent(
-                agent=agent,
-                prompt=prompt,
-                project_id=project_id,
-                task_id=task_id
-            )
+            with LeaseHeartbeat(db.engine, task_id, lease_owner) if leased else nullcontext():
+                result = AIProviderFactory.execute_agent(
+                    agent=agent,
+                    prompt=prompt,
+                    project_id=project_id,
+                    task_id=task_id
+                )
             
             # Calculate duration
             duration_ms = int((time.time() - start_time) * 1000)
@@ -109,15 +220,22 @@ def execute_agent_async(self, agent_id: int, prompt: str,
                     execution.duration_ms = duration_ms
                     db.session.commit()
             
-            # Update task if provided and successful
-            if task_id and result['success']:
-                task = db.session.get(Task, task_id)
-                if task:
-                    task.status = 'completed'
-                    task.completed_at = datetime.utcnow()
-                    task.actual_duration = int(time.time() - start_time)
-                    task.output_data = {'response': result['response']}
-                    db.session.commit()
+            # Settle the task if provided, so it never stays 'processing'
+            if leased:
+                if result['success']:
+                    task_values = {
+                        'status': 'completed',
+                        'completed_at': datetime.utcnow(),
+                        'actual_duration': int(time.time() - start_time),
+                        'output_data': {'response': result['response']}
+                    }
+                else:
+                    task_values = {
+                        'status': 'failed',
+                        'error_message': str(result.get('error', 'Unknown error'))[:500]
+                    }
+                finish_lease(task_id, lease_owner, task_values)
+                leased = False
             
             # Update project completion percentage if applicable
             if project_id:
@@ -127,10 +245,11 @@ def execute_agent_async(self, agent_id: int, prompt: str,
             agent.status = 'idle'
             db.session.commit()
             
-            # Emit success via Socket.IO
-            emit_task_update(self.request.id, 'completed', result, user_id=user_id, project_id=project_id)
+            # Only a reference goes to Socket.IO and the result backend; the text stays in the DB
+            result_ref = agent_result_ref(result)
+            emit_task_update(self.request.id, 'completed', result_ref, user_id=user_id, project_id=project_id)
             
-            return result
+            return result_ref
             
         except Exception as e:
             # Reset agent status on error
@@ -140,12 +259,11 @@ def execute_agent_async(self, agent_id: int, prompt: str,
                     agent.status = 'error'
                     db.session.commit()
                 
-                if task_id:
-                    task = db.session.get(Task, task_id)
-                    if task:
-                        task.status = 'failed'
-                        task.error_message = str(e)[:500]  # Limit error message length
-                        db.session.commit()
+                if leased:
+                    finish_lease(task_id, lease_owner, {
+                        'status': 'failed',
+                        'error_message': str(e)[:500]  # Limit error message length
+                    })
             except:
                 pass
             
@@ -156,211 +274,80 @@ def process_project_pipeline(self, project_id: int, stage: int, user_id: int = N
     """
     Process a project through its pipeline stages
     """
-    from app import create_app
-    from database import db, Project, Agent, Task
-    
-    app = create_app()
+    from database import db, Project
+    from pipeline import run_pipeline
     
-    with app.app_context():
+    with task_app_context('process_project_pipeline'):
         project = db.session.get(Project, project_id)
         if not project:
             raise ValueError(f"Project {project_id} not found")
         
-        # Get existing tasks for this stage, or create new ones if none exist
-        existing_tasks = Task.query.filter_by(project_id=project_id, stage=stage).all()
-        
-        if existing_tasks:
-            # Use existing tasks
-            tasks_to_process = existing_tasks
-        else:
-            # Create new tasks for this stage
-            agents = Agent.query.filter_by(stage=stage, is_active=True).all()
-            tasks_to_process = []
-            for agent in agents:
-                task = Task(
-                    project_id=project_id,
-                    agent_id=agent.id,
-                    title=f"{agent.name} - Stage {stage}",
-                    description=f"Automated task for {agent.name}",
-                    stage=stage,
-                    status='pending'
-                )
-                db.session.add(task)
-                tasks_to_process.append(task)
-            db.session.commit()
-        
-        results = []
-        for task in tasks_to_process:
-            agent = task.assigned_agent
-            if not agent:
-                continue
-                
-            self.update_state(state='PROCESSING', 
-                            meta={'status': f'Running {agent.name}...'})
-            
-            # Skip if task is already completed
-            if task.status == 'completed':
-                continue
+        self.update_state(state='PROCESSING', meta={'status': f'Running stage {stage} agents...'})
+        return typed_result('pipeline_run', run_pipeline(project, stages=[stage], user_id=user_id))
 
-            # Emit a task update event
-            emit_task_update(task.id, 'processing', {
-                'id': task.id,
-                'title': task.title,
-                'status': 'processing',
-                'stage': task.stage,
-                'agent': {
-                    'icon': agent.icon,
-                    'name': agent.name
-                }
-            }, user_id=user_id, project_id=project_id)
-            
-            # Execute the agent directly (like artifact generation does)
-            try:
-                from ai_providers import AIProviderFactory
-                
-                # Update task status
-                task.status = 'processing'
-                task.started_at = datetime.utcnow()
-                db.session.commit()
-                
-                # Execute the agent directly
-                result = AIProviderFactory.execute_agent(
-                    agent=agent,
-                    prompt=project.idea_source,
-                    project_id=project_id,
-                    task_id=task.id
-                )
-                
-                # Update task with result
-                if result['success']:
-                    task.status = 'completed'
-                    task.completed_at = datetime.utcnow()
-                    results.append({
-                        'agent': agent.name,
-                        'status': 'completed',
-                        'execution_id': result.get('execution_id')
-                    })
-                    
-                    # Emit task completed event
-                    emit_task_update(task.id, 'completed', {
-                        'id': task.id,
-                        'title': task.title,
-                        'status': 'completed',
-                        'stage': task.stage,
-                        'agent': {
-                            'icon': agent.icon,
-                            'name': agent.name
-                        }
-                    }, user_id=user_id, project_id=project_id)
-                else:
-                    task.status = 'failed'
-                    task.error_message = result.get('error', 'Unknown error')
-                    results.append({
-                        'agent': agent.name,
-                        'status': 'failed',
-                        'error': result.get('error', 'Unknown error')
-                    })
-                    
-                    # Emit task failed event
-                    emit_task_update(task.id, 'failed', {
-                        'id': task.id,
-                        'title': task.title,
-                        'status': 'failed',
-                        'stage': task.stage,
-                        'agent': {
-                            'icon': agent.icon,
-                            'name': agent.name
-                        }
-                    }, user_id=user_id, project_id=project_id)
-                
-                db.session.commit()
-                
-            except Exception as e:
-                task.status = 'failed'
-                task.error_message = str(e)
-                db.session.commit()
-                
-                # Emit task failed event
-                emit_task_update(task.id, 'failed', {
-                    'id': task.id,
-                    'title': task.title,
-                    'status': 'failed',
-                    'stage': task.stage,
-                    'agent': {
-                        'icon': agent.icon,
-                        'name': agent.name
-                    }
-                }, user_id=user_id, project_id=project_id)
-                
-                results.append({
-                    'agent': agent.name,
-                    'error': str(e),
-                    'status': 'failed'
-                })
-        
-        # Update project stage
-        project.stage = stage
-        project.updated_at = datetime.utcnow()
-        
-        # Update status based on stage
-        stage_status_map = {
-            2: 'validating',
-            3: 'developing',
-            4: 'marketing',
-            5: 'operating',
-            6: 'scaling'
-        }
-        project.status = stage_status_map.get(stage, project.status)
-        db.session.commit()
-        
+@celery_app.task(ignore_result=True)
+def run_pipeline_node(task_id: int, run: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Execute one pipeline task for the Celery execution backend, then start
+    the tasks of the same run that it unblocked
+    """
+    from pipeline import PipelineEngine, PipelineRun, CeleryBackend, run_task_node
+    
+    with task_app_context('run_pipeline_node'):
+        result = run_task_node(task_id, run.get('user_id'))
+        PipelineEngine(CeleryBackend()).schedule(PipelineRun.from_dict(run))
         return {
-            'project_id': project_id,
-            'stage': stage,
-            'agents_triggered': len(results),
-            'results': results
+            'task_id': task_id,
+            'success': result['success'],
+            'execution_id': result.get('execution_id')
         }
 
-@celery_app.task
+@celery_app.task(ignore_result=True)
+def reap_task_leases() -> Dict[str, Any]:
+    """
+    Periodic (Celery beat): settle tasks whose lease expired because their
+    worker died, then resume the stages they belong to
+    """
+    from pipeline import resume_recovered_tasks
+    from task_leases import reap_expired_leases
+    
+    with task_app_context('reap_task_leases'):
+        reaped = reap_expired_leases()
+        reports = resume_recovered_tasks(reaped, backend='celery')
+        
+        summary = {outcome: [entry['task_id'] for entry in entries] for outcome, entries in reaped.items()}
+        summary['resumed_projects'] = [report['project_id'] for report in reports]
+        return summary
+
+@celery_app.task(ignore_result=True)
 def update_project_progress(project_id: int) -> float:
     """
     Update project completion percentage based on completed tasks
     """
-    from app import create_app
-    from database import db, Project, Task
-    
-    app = create_app()
+    from database import db, Project
+    from pipeline import project_completion
     
-    with app.app_context():
+    with task_app_context('update_project_progress'):
         project = db.session.get(Project, project_id)
         if not project:
             return 0
         
-        total_tasks = Task.query.filter_by(project_id=project_id).count()
-        completed_tasks = Task.query.filter_by(
-            project_id=project_id,
-            status='completed'
-        ).count()
-        
-        if total_tasks > 0:
-            completion = (completed_tasks / total_tasks) * 100
-            project.completion_percentage = round(completion, 2)
+        completion = project_completion(project_id)
+        if completion:
+            project.completion_percentage = completion
             db.session.commit()
-            return completion
-        
-        return 0
+        return completion
 
 @celery_app.task
 def generate_project_artifacts(project_id: int, artifact_type: str) -> Dict[str, Any]:
     """
     Generate project artifacts (code, documentation, etc.)
     """
-    from app import create_app
     from database import db, Project, ProjectArtifact, Agent
     from ai_providers import AIProviderFactory
+    from stage_summaries import project_context
     
-    app = create_app()
-    
-    with app.app_context():
+    with task_app_context('generate_project_artifacts'):
         project = db.session.get(Project, project_id)
         if not project:
             raise ValueError(f"Project {project_id} not found")
@@ -384,15 +371,16 @@ def generate_project_artifacts(project_id: int, artifact_type: str) -> Dict[str,
         Generate {artifact_type} for the following project:
         Name: {project.name}
         Description: {project.description}
-        Idea: {project.idea_source}
         
         Please provide a complete and production-ready {artifact_type}.
         """
         
+        # The idea goes in the shared context so the prompt budget can trim it
         result = AIProviderFactory.execute_agent(
             agent=agent,
             prompt=prompt,
-            project_id=project_id
+            project_id=project_id,
+            shared_context=project_context(project)
         )
         
         if result['success']:
@@ -408,179 +396,66 @@ def generate_project_artifacts(project_id: int, artifact_type: str) -> Dict[str,
             db.session.add(artifact)
             db.session.commit()
             
-            return {
+            return typed_result('artifact', {
                 'success': True,
                 'artifact_id': artifact.id,
-                'content_preview': result['response'][:500]
-            }
+                'execution_id': result.get('execution_id')
+            })
         
-        return {
+        return typed_result('artifact', {
             'success': False,
             'error': str(result.get('error', 'Unknown error'))
-        }
+        })
 
-@celery_app.task
+@celery_app.task(ignore_result=True)
 def auto_run_project(project_id: int, user_id: int) -> Dict[str, Any]:
     """
-    Auto-run a project through all stages with appropriate delays
+    Auto-run a project's next stage. When that stage completes, the worker
+    that finished it queues this task again for the following stage (see
+    queue_next_auto_run_stage), so no worker waits between stages.
     """
-    from app import create_app
-    from database import db, Project, Agent, Task
-    from ai_providers import AIProviderFactory
-    from datetime import datetime
-    import time
+    from database import db, Project
+    from pipeline import run_pipeline, complete_stage
     
-    app = create_app()
-    
-    with app.app_context():
+    with task_app_context('auto_run_project'):
         project = db.session.get(Project, project_id)
         if not project or project.user_id != user_id:
             return {'success': False, 'error': 'Project not found or access denied'}
         
-        results = []
+        stage = (project.stage or 0) + 1
+        if stage > 6:
+            return {'success': True, 'project_id': project_id, 'final_stage': project.stage}
         
-        # Process stages 1-6
-        for stage in range(1, 7):
-            if project.stage >= stage:
-                continue  # Skip if already at this stage or beyond
-            
-            try:
-                # Update project stage
-                project.stage = stage
-                db.session.commit()
-                
-                # Process this stage directly (avoid nested Celery tasks)
-                # Execute the pipeline logic directly without Celery
-                
-                # Get existing tasks for this stage, or create new ones if none exist
-                existing_tasks = Task.query.filter_by(project_id=project_id, stage=stage).all()
-                
-                if existing_tasks:
-                    # Use existing tasks
-                    tasks_to_process = existing_tasks
-                else:
-                    # Create new tasks for this stage
-                    agents = Agent.query.filter_by(stage=stage, is_active=True).all()
-                    tasks_to_process = []
-                    for agent in agents:
-                        task = Task(
-                            project_id=project_id,
-                            agent_id=agent.id,
-                            title=f"{agent.name} - Stage {stage}",
-                            description=f"Automated task for {agent.name}",
-                            stage=stage,
-                            status='pending'
-                        )
-                        db.session.add(task)
-                        tasks_to_process.append(task)
-                    db.session.commit()
-                
-                stage_results = []
-                for task in tasks_to_process:
-                    agent = task.assigned_agent
-                    if not agent:
-                        continue
-                        
-                    # Skip if task is already completed
-                    if task.status == 'completed':
-                        stage_results.append({
-                            'agent': agent.name,
-                            'status': 'completed',
-                            'execution_id': None
-                        })
-                        continue
-
-                    # Execute the agent directly
-                    try:
-                        
-                        # Update task status
-                        task.status = 'processing'
-                        task.started_at = datetime.utcnow()
-                        db.session.commit()
-                        
-                        # Execute the agent directly
-                        result = AIProviderFactory.execute_agent(
-                            agent=agent,
-                            prompt=project.idea_source,
-                            project_id=project_id,
-                            task_id=task.id
-                        )
-                        
-                        # Update task with result
-                        if result['success']:
-                            task.status = 'completed'
-                            task.completed_at = datetime.utcnow()
-                            stage_results.append({
-                                'agent': agent.name,
-                                'status': 'completed',
-                                'execution_id': result.get('execution_id')
-                            })
-                        else:
-                            task.status = 'failed'
-                            task.error_message = result.get('error', 'Unknown error')
-                            stage_results.append({
-                                'agent': agent.name,
-                                'status': 'failed',
-                                'error': result.get('error', 'Unknown error')
-                            })
-                        
-                        db.session.commit()
-                        
-                    except Exception as agent_error:
-                        task.status = 'failed'
-                        task.error_message = str(agent_error)
-                        db.session.commit()
-                        
-                        stage_results.append({
-                            'agent': agent.name,
-                            'error': str(agent_error),
-                            'status': 'failed'
-                        })
-
-                # Update project status based on stage
-                stage_status_map = {
-                    2: 'validating',
-                    3: 'developing', 
-                    4: 'marketing',
-                    5: 'operating',
-                    6: 'scaling'
-                }
-                project.status = stage_status_map.get(stage, project.status)
-                project.updated_at = datetime.utcnow()
-                db.session.commit()
-                
-                pipeline_result = {
-                    'project_id': project_id,
-                    'stage': stage,
-                    'agents_triggered': len(stage_results),
-                    'results': stage_results
-                }
-                
-                results.append({
-                    'stage': stage,
-                    'result': pipeline_result,
-                    'status': 'completed'
-                })
-                
-                # Wait between stages to allow AI processing to complete
-                # Extended delays for local models with slow responses
-                if stage < 6:  # Don't wait after the last stage
-                    time.sleep(600)  # 10 minute delay between stages
-                    
-            except Exception as e:
-                results.append({
-                    'stage': stage,
-                    'error': str(e),
-                    'status': 'failed'
-                })
-                break  # Stop auto-run on failure
+        try:
+            pipeline_result = run_pipeline(project, stages=[stage], user_id=user_id, auto_run=True)
+        except Exception as e:
+            # Stop auto-run on failure
+            return {'success': False, 'project_id': project_id, 'stage': stage, 'error': str(e)}
+        
+        if not pipeline_result['agents_triggered'] and complete_stage(project, stage):
+            # A stage without agents completes at once
+            queue_next_auto_run_stage(project_id, user_id, stage)
         
         return {
             'success': True,
             'project_id': project_id,
-            'final_stage': project.stage,
-            'results': results
+            'stage': stage,
+            'result': pipeline_result
         }
 
+def queue_next_auto_run_stage(project_id: int, user_id: Optional[int], completed_stage: int):
+    """Queue auto_run_project for the stage after completed_stage, after the configured gap"""
+    if completed_stage >= 6:
+        print(f"🏁 Auto-run of project {project_id} finished")
+        return
+    
+    print(f"⏭️ Auto-run of project {project_id}: stage {completed_stage} done, queueing stage {completed_stage + 1}")
+    auto_run_project.apply_async(
+        args=[project_id, user_id],
+        countdown=Config.AUTO_RUN_MIN_STAGE_GAP_SECONDS or None,
+        **task_route('auto_run')
+    )
+
 # Celery worker command (to be run separately):
-# celery -A celery_tasks.celery_app worker --loglevel=info
\ No newline at end of file
+# celery -A celery_tasks.celery_app worker -Q interactive,pipeline,bulk --loglevel=info
+# (or ./run_worker.sh for one pool per queue)
\ No newline at end of file
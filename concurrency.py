@@ -0,0 +1,243 @@
+"""
+Concurrency Limiter Module
+Bounds in-flight model calls per model and per Ollama backend across all
+web and worker processes (Redis-backed, with an in-process fallback)
+"""
+
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+from config import Config
+from ollama_pool import BackendNotContacted
+
+class ConcurrencyLimitTimeout(BackendNotContacted):
+    """Raised when no model slot frees up within the configured wait time"""
+    pass
+
+# Drop holders whose lease expired (crashed processes), then take a slot if
+# one is free. Runs atomically inside Redis.
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[4])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+class RedisSemaphore:
+    """Counting semaphore shared across processes via a Redis sorted set"""
+
+    def __init__(self, client, key: str, limit: int, lease_seconds: float):
+        self.client = client
+        self.key = key
+        self.limit = limit
+        self.lease_seconds = lease_seconds
+        self._acquire = client.register_script(_ACQUIRE_SCRIPT)
+
+    def try_acquire(self, token: str) -> bool:
+        now = time.time()
+        return bool(self._acquire(
+            keys=[self.key],
+            args=[self.limit, token, now, now - self.lease_seconds, int(self.lease_seconds) + 60]
+        ))
+
+    def release(self, token: str):
+        self.client.zrem(self.key, token)
+
+class LocalSemaphore:
+    """In-process fallback with the same interface as RedisSemaphore"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def try_acquire(self, token: str) -> bool:
+        return self._semaphore.acquire(blocking=False)
+
+    def release(self, token: str):
+        self._semaphore.release()
+
+class ConcurrencyLimiter:
+    """
+    Per-model and per-backend slot limiter for model calls.
+
+    Slots are held in Redis so the limit applies to every Celery worker and
+    Flask thread together. If Redis cannot be reached, the limiter falls back
+    to per-process semaphores with the same limits. Waiting longer than
+    wait_timeout raises ConcurrencyLimitTimeout instead of queueing forever.
+    """
+
+    POLL_INTERVAL = 0.1
+    REDIS_RETRY_SECONDS = 30  # How long to stay on the local fallback after a Redis error
+
+    def __init__(self, model_limits: Dict[str, int], default_model_limit: int,
+                 backend_limit: int, wait_timeout: float, lease_seconds: float,
+                 redis_url: Optional[str] = None):
+        self.model_limits = model_limits
+        self.default_model_limit = default_model_limit
+        self.backend_limit = backend_limit
+        self.wait_timeout = wait_timeout
+        self.lease_seconds = lease_seconds
+
+        self.client = None
+        if redis_url:
+            import redis
+            self.client = redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=1)
+
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+        self._redis_semaphores = {}
+        self._local_semaphores = {}
+        self._stats = {}
+
+    def limit_for(self, kind: str, name: str) -> int:
+        if kind == 'model':
+            return self.model_limits.get(name, self.default_model_limit)
+        return self.backend_limit
+
+    def capacity(self, backend_count: int, model: Optional[str] = None) -> Optional[int]:
+        """Calls that can hold slots at once across backend_count hosts (None = unlimited)"""
+        limits = [self.limit_for('model', model) if model else self.default_model_limit]
+        if self.backend_limit > 0:
+            limits.append(self.backend_limit * max(1, backend_count))
+        limits = [limit for limit in limits if limit > 0]
+        return min(limits) if limits else None
+
+    def _semaphores(self, key: str, limit: int):
+        with self._lock:
+            if key not in self._local_semaphores:
+                self._local_semaphores[key] = LocalSemaphore(limit)
+                if self.client is not None:
+                    self._redis_semaphores[key] = RedisSemaphore(
+                        self.client, f"bdc:model_slots:{key}", limit, self.lease_seconds)
+            return self._redis_semaphores.get(key), self._local_semaphores[key]
+
+    def _record(self, key: str, limit: int, wait_ms: float, acquired: bool,
+                mode: Optional[str]):
+        with self._lock:
+            stats = self._stats.setdefault(key, {
+                'limit': limit,
+                'acquired': 0,
+                'timeouts': 0,
+                'in_flight': 0,
+                'total_wait_ms': 0.0,
+                'max_wait_ms': 0.0,
+                'mode': None
+            })
+            if mode:
+                stats['mode'] = mode
+            stats['total_wait_ms'] += wait_ms
+            stats['max_wait_ms'] = max(stats['max_wait_ms'], wait_ms)
+            if acquired:
+                stats['acquired'] += 1
+                stats['in_flight'] += 1
+            else:
+                stats['timeouts'] += 1
+
+    def _released(self, key: str):
+        with self._lock:
+            self._stats[key]['in_flight'] -= 1
+
+    def _try_acquire(self, redis_semaphore, local_semaphore, token: str):
+        if redis_semaphore is not None and time.time() >= self._redis_down_until:
+            try:
+                return redis_semaphore if redis_semaphore.try_acquire(token) else None
+            except Exception:
+                # Redis unavailable: fall back to a per-process limit for a while
+                self._redis_down_until = time.time() + self.REDIS_RETRY_SECONDS
+        return local_semaphore if local_semaphore.try_acquire(token) else None
+
+    @contextmanager
+    def slot(self, kind: str, name: str,
+             wait_timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Hold one slot for a model ('model') or an Ollama host ('backend').
+        
+        wait_timeout overrides the configured wait (e.g. to respect a call
+        deadline, or 0 to take a slot only if one is free right now).
+        """
+        if wait_timeout is None:
+            wait_timeout = self.wait_timeout
+        limit = self.limit_for(kind, name)
+        if limit <= 0:
+            yield
+            return
+
+        key = f"{kind}:{name}"
+        redis_semaphore, local_semaphore = self._semaphores(key, limit)
+        token = uuid.uuid4().hex
+        start_time = time.time()
+        deadline = start_time + wait_timeout
+
+        while True:
+            holder = self._try_acquire(redis_semaphore, local_semaphore, token)
+            if holder is not None:
+                break
+            if time.time() >= deadline:
+                wait_ms = (time.time() - start_time) * 1000
+                self._record(key, limit, wait_ms, False, None)
+                raise ConcurrencyLimitTimeout(
+                    f"Timed out after {wait_timeout:g}s waiting for a {kind} slot "
+                    f"({name}, limit {limit})"
+                )
+            time.sleep(self.POLL_INTERVAL)
+
+        wait_ms = (time.time() - start_time) * 1000
+        self._record(key, limit, wait_ms, True,
+                     'redis' if holder is redis_semaphore else 'local')
+        try:
+            yield
+        finally:
+            try:
+                holder.release(token)
+            except Exception:
+                pass  # The Redis lease expires on its own
+            self._released(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                waits = stats['acquired'] + stats['timeouts']
+                result[key] = {
+                    **stats,
+                    'total_wait_ms': round(stats['total_wait_ms']),
+                    'max_wait_ms': round(stats['max_wait_ms']),
+                    'avg_wait_ms': round(stats['total_wait_ms'] / waits) if waits else 0
+                }
+            return result
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Parse 'model=limit,model=limit' into a dict"""
+    limits = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, value = item.rsplit('=', 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_concurrency_limiter() -> ConcurrencyLimiter:
+    """Get the process-wide limiter configured from Config"""
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = ConcurrencyLimiter(
+                    model_limits=parse_limits(Config.MODEL_CONCURRENCY_LIMITS),
+                    default_model_limit=Config.MODEL_MAX_CONCURRENCY,
+                    backend_limit=Config.BACKEND_MAX_CONCURRENCY,
+                    wait_timeout=Config.MODEL_SLOT_WAIT_TIMEOUT,
+                    lease_seconds=Config.MODEL_SLOT_LEASE_SECONDS,
+                    redis_url=Config.REDIS_URL if Config.MODEL_CONCURRENCY_BACKEND == 'redis' else None
+                )
+
+    return _limiter
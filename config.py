@@ -19,13 +19,115 @@ class Config:
     
     # AI Configuration - Using Ollama locally
     # No API keys needed for local Ollama instance
+    OLLAMA_STREAMING = os.environ.get('OLLAMA_STREAMING', 'true').lower() == 'true'
+    OLLAMA_STREAM_FLUSH_SECONDS = float(os.environ.get('OLLAMA_STREAM_FLUSH_SECONDS', 2.0))
+    OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')  # Keep the model resident between agents
+    OLLAMA_SHARED_PREFIX = os.environ.get('OLLAMA_SHARED_PREFIX', 'true').lower() == 'true'  # Project context first
+    
+    # Ollama backends (comma-separated; calls are balanced across healthy hosts)
+    OLLAMA_BACKENDS = [url.strip() for url in os.environ.get(
+        'OLLAMA_BACKENDS', 'http://localhost:11434').split(',') if url.strip()]
+    OLLAMA_HEALTH_CHECK_INTERVAL = float(os.environ.get('OLLAMA_HEALTH_CHECK_INTERVAL', 10))  # 0 disables probes
+    OLLAMA_HEALTH_CHECK_TIMEOUT = float(os.environ.get('OLLAMA_HEALTH_CHECK_TIMEOUT', 5))
+    OLLAMA_BACKEND_FAILURE_THRESHOLD = int(os.environ.get('OLLAMA_BACKEND_FAILURE_THRESHOLD', 3))
+    OLLAMA_BACKEND_EJECT_SECONDS = float(os.environ.get('OLLAMA_BACKEND_EJECT_SECONDS', 30))
+    
+    # Ollama HTTP transport (shared keep-alive connection pool)
+    OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 5))
+    OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 600))  # 10 minutes for local models
+    OLLAMA_POOL_CONNECTIONS = int(os.environ.get('OLLAMA_POOL_CONNECTIONS', 4))  # Number of hosts kept pooled
+    OLLAMA_POOL_MAXSIZE = int(os.environ.get('OLLAMA_POOL_MAXSIZE', 16))  # Connections per host
+    OLLAMA_POOL_BLOCK = os.environ.get('OLLAMA_POOL_BLOCK', 'true').lower() == 'true'
+    
+    # Model concurrency limits (shared through Redis by all web and worker processes)
+    MODEL_CONCURRENCY_BACKEND = os.environ.get('MODEL_CONCURRENCY_BACKEND', 'redis')  # redis or local
+    MODEL_MAX_CONCURRENCY = int(os.environ.get('MODEL_MAX_CONCURRENCY', 4))  # Per model, 0 = unlimited
+    MODEL_CONCURRENCY_LIMITS = os.environ.get('MODEL_CONCURRENCY_LIMITS', '')  # e.g. "gpt-oss:20b=2"
+    BACKEND_MAX_CONCURRENCY = int(os.environ.get('BACKEND_MAX_CONCURRENCY', 2))  # Per Ollama host, 0 = unlimited
+    MODEL_SLOT_WAIT_TIMEOUT = float(os.environ.get('MODEL_SLOT_WAIT_TIMEOUT', 120))
+    MODEL_SLOT_LEASE_SECONDS = float(os.environ.get('MODEL_SLOT_LEASE_SECONDS', 900))  # Frees slots of crashed holders
+    AGENT_BATCH_CONCURRENCY = int(os.environ.get('AGENT_BATCH_CONCURRENCY', 4))  # Parallel calls per execute_agents_batch
+    
+    # Single-flight (identical model requests, tasks and double-clicked actions run once and share the result)
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_BACKEND = os.environ.get('SINGLE_FLIGHT_BACKEND', 'redis')  # redis or local
+    SINGLE_FLIGHT_LOCK_SECONDS = float(os.environ.get('SINGLE_FLIGHT_LOCK_SECONDS', 30))  # Renewed while the leader runs
+    SINGLE_FLIGHT_WAIT_SECONDS = float(os.environ.get('SINGLE_FLIGHT_WAIT_SECONDS', 600))  # Then followers run it themselves
+    SINGLE_FLIGHT_RESULT_TTL_SECONDS = float(os.environ.get('SINGLE_FLIGHT_RESULT_TTL_SECONDS', 10))  # Late joiners share too
+    
+    # Resilience (agents override retries and deadline with retry_attempts / timeout_seconds)
+    OLLAMA_RETRY_ATTEMPTS = int(os.environ.get('OLLAMA_RETRY_ATTEMPTS', 2))  # Retries after the first attempt
+    OLLAMA_RETRY_BACKOFF_SECONDS = float(os.environ.get('OLLAMA_RETRY_BACKOFF_SECONDS', 1.0))
+    OLLAMA_RETRY_BACKOFF_MAX_SECONDS = float(os.environ.get('OLLAMA_RETRY_BACKOFF_MAX_SECONDS', 30))
+    OLLAMA_HEDGE_ENABLED = os.environ.get('OLLAMA_HEDGE_ENABLED', 'false').lower() == 'true'
+    OLLAMA_HEDGE_PERCENTILE = float(os.environ.get('OLLAMA_HEDGE_PERCENTILE', 95))  # Hedge calls slower than this
+    OLLAMA_HEDGE_MIN_SAMPLES = int(os.environ.get('OLLAMA_HEDGE_MIN_SAMPLES', 20))
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5))  # 0 = disabled
+    CIRCUIT_BREAKER_RESET_SECONDS = float(os.environ.get('CIRCUIT_BREAKER_RESET_SECONDS', 30))
+    
+    # Prompt budget (prompts are trimmed to fit OLLAMA_NUM_CTX minus the agent's max_tokens)
+    OLLAMA_NUM_CTX = int(os.environ.get('OLLAMA_NUM_CTX', 8192))  # Context window requested from Ollama
+    PROMPT_TRUNCATION_STRATEGY = os.environ.get('PROMPT_TRUNCATION_STRATEGY', 'priority')  # priority, tail, head, middle, summarize
+    PROMPT_CHARS_PER_TOKEN = float(os.environ.get('PROMPT_CHARS_PER_TOKEN', 3.5))
+    PROMPT_OVERHEAD_TOKENS = int(os.environ.get('PROMPT_OVERHEAD_TOKENS', 64))  # Chat template and headers
+    
+    # Stage summaries (earlier stages' outputs condensed once and shared downstream)
+    STAGE_SUMMARIES_ENABLED = os.environ.get('STAGE_SUMMARIES_ENABLED', 'true').lower() == 'true'
+    STAGE_SUMMARY_MAX_TOKENS = int(os.environ.get('STAGE_SUMMARY_MAX_TOKENS', 512))
+    
+    # Semantic cache (near-duplicate prompts matched by Ollama embeddings)
+    SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+    SEMANTIC_CACHE_MODE = os.environ.get('SEMANTIC_CACHE_MODE', 'serve')  # serve or offer
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.92))  # Cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', 1000))  # Per agent
+    SEMANTIC_CACHE_STAGES = os.environ.get('SEMANTIC_CACHE_STAGES', '1,2')
+    SEMANTIC_CACHE_EMBED_MODEL = os.environ.get('SEMANTIC_CACHE_EMBED_MODEL', 'nomic-embed-text')
+    
+    # Cassettes (record real Ollama traffic, replay it offline)
+    OLLAMA_CASSETTE_MODE = os.environ.get('OLLAMA_CASSETTE_MODE', '')  # '', record or replay
+    OLLAMA_CASSETTE_PATH = os.environ.get('OLLAMA_CASSETTE_PATH', 'cassettes/ollama.jsonl')
+    OLLAMA_CASSETTE_REPLAY_SPEED = float(os.environ.get('OLLAMA_CASSETTE_REPLAY_SPEED', 1.0))  # 0 = as fast as possible
+    
+    # Response cache (identical agent requests are served without calling the model)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'redis')  # redis or memory
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 7 * 24 * 3600))
+    RESPONSE_CACHE_MEMORY_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MEMORY_ENTRIES', 256))
+    RESPONSE_CACHE_REDIS_ENTRIES = int(os.environ.get('RESPONSE_CACHE_REDIS_ENTRIES', 10000))
     
     # Redis Configuration (for task queue)
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
+    # Socket.IO message queue: lets workers and several web processes reach every client ('' = single process)
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', REDIS_URL)
+    REALTIME_BATCH_WINDOW_MS = int(os.environ.get('REALTIME_BATCH_WINDOW_MS', 250))  # Progress events batched per room, 0 = send each at once
+    REALTIME_MAX_MESSAGES_PER_SECOND = float(os.environ.get('REALTIME_MAX_MESSAGES_PER_SECOND', 2))  # Per room and process
+    REALTIME_MAX_BATCH_EVENTS = int(os.environ.get('REALTIME_MAX_BATCH_EVENTS', 100))
+    
     # Celery Configuration
     CELERY_BROKER_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    CELERY_RESULT_EXPIRES_SECONDS = int(os.environ.get('CELERY_RESULT_EXPIRES_SECONDS', 3600))
+    CELERY_COMPRESSION = os.environ.get('CELERY_COMPRESSION', 'zlib')  # For large task arguments, '' = off
+    CELERY_COMPRESSION_MIN_BYTES = int(os.environ.get('CELERY_COMPRESSION_MIN_BYTES', 4096))
+    RESULT_MEMORY_REPORT_MAX_KEYS = int(os.environ.get('RESULT_MEMORY_REPORT_MAX_KEYS', 1000))  # Keys scanned per report
+    QUEUE_PROMOTE_PRIORITY = int(os.environ.get('QUEUE_PROMOTE_PRIORITY', 9))  # Task.priority that moves work one queue up
+    AUTO_RUN_MIN_STAGE_GAP_SECONDS = float(os.environ.get('AUTO_RUN_MIN_STAGE_GAP_SECONDS', 0))  # Optional pause before the next auto-run stage
+    
+    # Pipeline engine (pipeline.py)
+    PIPELINE_EXECUTION_BACKEND = os.environ.get('PIPELINE_EXECUTION_BACKEND', 'thread')  # thread, inline or celery
+    PIPELINE_MAX_WORKERS = int(os.environ.get('PIPELINE_MAX_WORKERS', 4))  # Concurrent tasks for the thread backend
+    
+    # Task leases (task_leases.py): running tasks of dead workers are recovered
+    TASK_LEASE_SECONDS = float(os.environ.get('TASK_LEASE_SECONDS', 60))  # Expiry without a heartbeat
+    TASK_LEASE_HEARTBEAT_SECONDS = float(os.environ.get('TASK_LEASE_HEARTBEAT_SECONDS', 15))
+    TASK_LEASE_QUEUE_SECONDS = float(os.environ.get('TASK_LEASE_QUEUE_SECONDS', 3600))  # Claimed but not yet picked up
+    TASK_LEASE_REAP_INTERVAL_SECONDS = float(os.environ.get('TASK_LEASE_REAP_INTERVAL_SECONDS', 30))  # Celery beat
+    TASK_LEASE_MAX_RECOVERIES = int(os.environ.get('TASK_LEASE_MAX_RECOVERIES', 3))  # Then the task fails
+    
+    # Celery worker bootstrap (worker_bootstrap.py)
+    WORKER_DB_WARM_CONNECTIONS = int(os.environ.get('WORKER_DB_WARM_CONNECTIONS', 2))  # Opened when a worker process starts
+    PROMPT_CATALOG_TTL_SECONDS = float(os.environ.get('PROMPT_CATALOG_TTL_SECONDS', 60))  # System prompt cache, 0 = off
     
     # Application Settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
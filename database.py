@@ -72,6 +72,7 @@ class Project(db.Model):
     tasks = db.relationship('Task', backref='project', lazy='dynamic', cascade='all, delete-orphan')
     executions = db.relationship('AgentExecution', backref='project', lazy='dynamic')
     artifacts = db.relationship('ProjectArtifact', backref='project', lazy='dynamic', cascade='all, delete-orphan')
+    stage_summaries = db.relationship('StageSummary', backref='project', lazy='dynamic', cascade='all, delete-orphan')
 
 class Agent(db.Model):
     __tablename__ = 'agents'
@@ -103,6 +104,8 @@ class Agent(db.Model):
     auto_execute = db.Column(db.Boolean, default=False)
     retry_attempts = db.Column(db.Integer, default=3)
     timeout_seconds = db.Column(db.Integer, default=300)
+    use_response_cache = db.Column(db.Boolean, default=True)  # Serve identical requests from cache
+    depends_on = db.Column(db.JSON)  # Agent names whose tasks must finish first; None = previous stage
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -156,6 +159,11 @@ class Task(db.Model):
     error_message = db.Column(db.Text)
     retry_count = db.Column(db.Integer, default=0)
     
+    # Execution lease (task_leases.py): who runs the task and until when
+    lease_owner = db.Column(db.String(255))  # host:pid:token of the executing worker
+    lease_expires_at = db.Column(db.DateTime, index=True)
+    heartbeat_at = db.Column(db.DateTime)
+    
     # Self-referential relationship for subtasks
     subtasks = db.relationship('Task', backref=db.backref('parent', remote_side=[id]), lazy='dynamic')
 
@@ -171,6 +179,11 @@ class AgentExecution(db.Model):
     output_response = db.Column(db.Text)
     
     tokens_used = db.Column(db.Integer)
+    input_tokens = db.Column(db.Integer)  # prompt_eval_count reported by Ollama
+    output_tokens = db.Column(db.Integer)  # eval_count reported by Ollama
+    load_duration_ms = db.Column(db.Integer)  # Model load time (cold start when large)
+    prefill_duration_ms = db.Column(db.Integer)  # Prompt evaluation time
+    decode_tokens_per_sec = db.Column(db.Float)
     cost = db.Column(db.Float)
     duration_ms = db.Column(db.Integer)
     
@@ -178,6 +191,7 @@ class AgentExecution(db.Model):
     error_message = db.Column(db.Text)
     
     execution_metadata = db.Column(db.JSON)  # Additional execution details
+    cached = db.Column(db.Boolean, default=False)  # Served from the response cache
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -199,6 +213,25 @@ class ProjectArtifact(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by_agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'))
 
+class StageSummary(db.Model):
+    __tablename__ = 'stage_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    stage = db.Column(db.Integer, nullable=False)
+    
+    summary = db.Column(db.Text)
+    source_fingerprint = db.Column(db.String(64))  # Hash of the executions summarized
+    execution_ids = db.Column(db.JSON)
+    
+    input_tokens = db.Column(db.Integer)
+    output_tokens = db.Column(db.Integer)
+    duration_ms = db.Column(db.Integer)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('project_id', 'stage', name='uq_stage_summary'),)
+
 class APIKey(db.Model):
     __tablename__ = 'api_keys'
     
@@ -227,4 +260,37 @@ class SystemMetrics(db.Model):
     agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'))
     
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    metrics_metadata = db.Column(db.JSON)
\ No newline at end of file
+    metrics_metadata = db.Column(db.JSON)
+
+def upgrade_schema():
+    """
+    Add columns introduced after a table was first created.
+    
+    db.create_all() only creates missing tables, so existing databases would
+    otherwise lack newer columns. Added columns are nullable with no server
+    default; model defaults apply to rows written afterwards. Indexes on
+    added columns (e.g. ix_tasks_lease_expires_at) are created with them.
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {col['name'] for col in inspector.get_columns(table.name)}
+            added_columns = set()
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                ))
+                added_columns.add(column.name)
+            
+            for index in table.indexes:
+                if added_columns.intersection(column.name for column in index.columns):
+                    index.create(conn, checkfirst=True)
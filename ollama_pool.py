@@ -0,0 +1,268 @@
+"""
+Ollama Backend Pool
+Routes model calls across several Ollama hosts with least-outstanding-requests
+balancing, model residency awareness and background health checks
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Iterator
+
+from config import Config
+
+class BackendNotContacted(Exception):
+    """Raised inside a lease when the call was abandoned before reaching the backend"""
+    pass
+
+class OllamaBackend:
+    """Routing state and latency statistics for a single Ollama host"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.resident_models = set()
+
+        self.total_requests = 0
+        self.failed_requests = 0
+        self.latency_ewma_ms = None
+        self.probe_latency_ms = None
+        self.last_probe_at = None
+
+    def is_available(self, now: float) -> bool:
+        return self.healthy or now >= self.ejected_until
+
+    def record_latency(self, latency_ms: float):
+        if self.latency_ewma_ms is None:
+            self.latency_ewma_ms = latency_ms
+        else:
+            self.latency_ewma_ms = 0.8 * self.latency_ewma_ms + 0.2 * latency_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'total_requests': self.total_requests,
+            'failed_requests': self.failed_requests,
+            'consecutive_failures': self.consecutive_failures,
+            'latency_ewma_ms': round(self.latency_ewma_ms) if self.latency_ewma_ms is not None else None,
+            'probe_latency_ms': self.probe_latency_ms,
+            'resident_models': sorted(self.resident_models)
+        }
+
+class OllamaBackendPool:
+    """
+    Pool of Ollama backends.
+
+    Each call leases the available backend with the fewest outstanding
+    requests, preferring hosts that already have the model loaded. Backends
+    are ejected after failure_threshold consecutive failures (from calls or
+    health probes) and re-admitted by the first successful probe or once the
+    ejection period ends. If every backend is ejected the pool fails open and
+    routes to all of them rather than rejecting the call.
+
+    Calls that share an affinity key (one project) stick to the same backend
+    while it is not much busier than the alternatives, keeping the project's
+    shared prompt prefix warm in that backend's cache.
+    """
+
+    AFFINITY_SLACK = 1
+    MAX_AFFINITY_KEYS = 1024
+
+    def __init__(self, urls: List[str], health_check_interval: float = 10.0,
+                 failure_threshold: int = 3, eject_seconds: float = 30.0):
+        if not urls:
+            raise ValueError("At least one Ollama backend URL is required")
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.health_check_interval = health_check_interval
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self._affinity = OrderedDict()  # affinity key -> backend, most recent last
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._health_pid = None
+        self._stop_event = threading.Event()
+
+    def _select(self, model: Optional[str], affinity_key: Optional[str],
+                exclude: Optional[str] = None) -> OllamaBackend:
+        now = time.time()
+        candidates = [b for b in self.backends if b.is_available(now)] or self.backends
+        if exclude:
+            candidates = [b for b in candidates if b.url != exclude] or candidates
+
+        def score(backend: OllamaBackend):
+            # A resident model is worth one outstanding request: it skips the load
+            resident_bonus = 1 if model and model in backend.resident_models else 0
+            return (backend.outstanding - resident_bonus, backend.latency_ewma_ms or 0)
+
+        best = min(candidates, key=score)
+
+        # Stay on the backend that holds this key's prompt cache unless it is
+        # more than AFFINITY_SLACK requests busier than the best choice
+        preferred = self._affinity.get(affinity_key) if affinity_key else None
+        if preferred in candidates and \
+                preferred.outstanding <= best.outstanding + self.AFFINITY_SLACK:
+            best = preferred
+
+        if affinity_key:
+            self._affinity[affinity_key] = best
+            self._affinity.move_to_end(affinity_key)
+            while len(self._affinity) > self.MAX_AFFINITY_KEYS:
+                self._affinity.popitem(last=False)
+
+        return best
+
+    def acquire(self, model: Optional[str] = None,
+                affinity_key: Optional[str] = None,
+                exclude: Optional[str] = None) -> OllamaBackend:
+        """Pick a backend (other than exclude, if possible) and count the call on it"""
+        self.ensure_health_checks()
+        with self._lock:
+            backend = self._select(model, affinity_key, exclude)
+            backend.outstanding += 1
+            backend.total_requests += 1
+        return backend
+
+    def release(self, backend: OllamaBackend, latency_ms: float, success: Optional[bool],
+                model: Optional[str] = None):
+        """Return a leased backend and record the call outcome (None = not contacted)"""
+        with self._lock:
+            backend.outstanding -= 1
+            if success is None:
+                return
+            if success:
+                backend.record_latency(latency_ms)
+                self._mark_success(backend)
+                if model:
+                    backend.resident_models.add(model)
+            else:
+                backend.failed_requests += 1
+                self._mark_failure(backend)
+
+    @contextmanager
+    def lease(self, model: Optional[str] = None,
+              affinity_key: Optional[str] = None,
+              exclude: Optional[str] = None) -> Iterator[OllamaBackend]:
+        """
+        Context manager around acquire/release. Transport errors and errors
+        marked transient count as backend failures; an error with
+        transient=False (a 4xx such as an unknown model or an oversized
+        prompt) is the caller's fault and leaves the backend's health alone.
+        """
+        backend = self.acquire(model, affinity_key, exclude)
+        start_time = time.time()
+        success = False
+        try:
+            yield backend
+            success = True
+        except GeneratorExit:
+            success = True  # The consumer stopped reading a stream early
+            raise
+        except BackendNotContacted:
+            success = None
+            raise
+        except Exception as e:
+            if getattr(e, 'transient', True) is False:
+                success = None  # The backend answered; the request was bad
+            raise
+        finally:
+            self.release(backend, (time.time() - start_time) * 1000, success, model)
+
+    def _mark_success(self, backend: OllamaBackend):
+        backend.consecutive_failures = 0
+        if not backend.healthy:
+            print(f"✅ Ollama backend {backend.url} re-admitted")
+        backend.healthy = True
+        backend.ejected_until = 0.0
+
+    def _mark_failure(self, backend: OllamaBackend):
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.failure_threshold:
+            if backend.healthy:
+                print(f"⚠️ Ollama backend {backend.url} ejected after "
+                      f"{backend.consecutive_failures} consecutive failures")
+            backend.healthy = False
+            backend.ejected_until = time.time() + self.eject_seconds
+
+    def probe(self, backend: OllamaBackend):
+        """Health-check one backend and refresh its resident model list"""
+        from ai_providers import OllamaSessionPool
+
+        start_time = time.time()
+        try:
+            response = OllamaSessionPool.get_session().get(
+                f"{backend.url}/api/ps",
+                timeout=(Config.OLLAMA_CONNECT_TIMEOUT, Config.OLLAMA_HEALTH_CHECK_TIMEOUT)
+            )
+            if response.status_code != 200:
+                raise Exception(f"status {response.status_code}")
+            models = response.json().get('models', [])
+        except Exception:
+            with self._lock:
+                self._mark_failure(backend)
+            return
+
+        with self._lock:
+            backend.probe_latency_ms = int((time.time() - start_time) * 1000)
+            backend.last_probe_at = time.time()
+            backend.resident_models = {m.get('name') or m.get('model') for m in models}
+            self._mark_success(backend)
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_check_interval):
+            self.probe_all()
+
+    def ensure_health_checks(self):
+        """Start the probe thread in this process (threads do not survive fork)"""
+        if self.health_check_interval <= 0:
+            return
+        pid = os.getpid()
+        if self._health_pid == pid and self._health_thread and self._health_thread.is_alive():
+            return
+        with self._lock:
+            if self._health_pid == pid and self._health_thread and self._health_thread.is_alive():
+                return
+            self._stop_event = threading.Event()
+            self._health_thread = threading.Thread(
+                target=self._health_loop,
+                name='ollama-health-check',
+                daemon=True
+            )
+            self._health_pid = pid
+            self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop_event.set()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.to_dict() for backend in self.backends]
+
+_backend_pool = None
+_backend_pool_lock = threading.Lock()
+
+def get_backend_pool() -> OllamaBackendPool:
+    """Get the process-wide backend pool built from Config.OLLAMA_BACKENDS"""
+    global _backend_pool
+
+    if _backend_pool is None:
+        with _backend_pool_lock:
+            if _backend_pool is None:
+                _backend_pool = OllamaBackendPool(
+                    urls=Config.OLLAMA_BACKENDS,
+                    health_check_interval=Config.OLLAMA_HEALTH_CHECK_INTERVAL,
+                    failure_threshold=Config.OLLAMA_BACKEND_FAILURE_THRESHOLD,
+                    eject_seconds=Config.OLLAMA_BACKEND_EJECT_SECONDS
+                )
+
+    return _backend_pool
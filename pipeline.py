@@ -0,0 +1,549 @@
+"""
+Pipeline Engine
+Runs a project's agent tasks as a dependency graph: every task starts as soon
+as the tasks it depends on have finished, on an inline, thread-pool or Celery
+execution backend
+"""
+
+import queue
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, List, Iterable
+
+from config import Config
+
+STAGE_STATUS_MAP = {
+    2: 'validating',
+    3: 'developing',
+    4: 'marketing',
+    5: 'operating',
+    6: 'scaling'
+}
+
+# A task in one of these states no longer blocks the tasks that depend on it
+SETTLED_STATUSES = ('completed', 'failed', 'cancelled')
+
+def stage_tasks(project_id: int, stage: int) -> List[Any]:
+    """Existing tasks of a stage, or new pending tasks for its active agents"""
+    from database import db, Agent, Task
+
+    existing_tasks = Task.query.filter_by(project_id=project_id, stage=stage).all()
+    if existing_tasks:
+        return existing_tasks
+
+    tasks = []
+    for agent in Agent.query.filter_by(stage=stage, is_active=True).all():
+        task = Task(
+            project_id=project_id,
+            agent_id=agent.id,
+            title=f"{agent.name} - Stage {stage}",
+            description=f"Automated task for {agent.name}",
+            stage=stage,
+            status='pending'
+        )
+        db.session.add(task)
+        tasks.append(task)
+    db.session.commit()
+    return tasks
+
+def task_dependencies(tasks: List[Any]) -> Dict[int, List[int]]:
+    """
+    Map each task id to the ids of the tasks it waits for.
+
+    An agent's depends_on lists agent names; a task depends on every task of
+    the project assigned to one of those agents. Agents without depends_on
+    wait for all tasks of the closest earlier stage, as a stage barrier.
+    """
+    by_agent = {}
+    by_stage = {}
+    for task in tasks:
+        if task.assigned_agent:
+            by_agent.setdefault(task.assigned_agent.name, []).append(task.id)
+        by_stage.setdefault(task.stage or 0, []).append(task.id)
+
+    dependencies = {}
+    for task in tasks:
+        agent = task.assigned_agent
+        if agent is not None and agent.depends_on is not None:
+            dependencies[task.id] = [dep_id for name in agent.depends_on
+                                     for dep_id in by_agent.get(name, [])]
+        else:
+            earlier = [stage for stage in by_stage if stage < (task.stage or 0)]
+            dependencies[task.id] = list(by_stage[max(earlier)]) if earlier else []
+    return dependencies
+
+def project_completion(project_id: int) -> float:
+    """Percentage of a project's tasks that are completed"""
+    from database import Task
+
+    total_tasks = Task.query.filter_by(project_id=project_id).count()
+    if not total_tasks:
+        return 0
+    completed_tasks = Task.query.filter_by(project_id=project_id, status='completed').count()
+    return round(completed_tasks / total_tasks * 100, 2)
+
+def complete_stage(project, stage: int) -> bool:
+    """
+    Stage-completion callback: advance the project's stage, status and
+    progress. The update only applies while the project is behind the
+    stage, so when several workers see a stage finish at once exactly one
+    of them gets True back.
+    """
+    from database import db, Project
+
+    advanced = Project.query.filter(
+        Project.id == project.id,
+        db.or_(Project.stage.is_(None), Project.stage < stage)
+    ).update({
+        'stage': stage,
+        'status': STAGE_STATUS_MAP.get(stage, Project.status),
+        'updated_at': datetime.utcnow(),
+        'completion_percentage': project_completion(project.id)
+    }, synchronize_session=False)
+    db.session.commit()
+    db.session.refresh(project)
+    return advanced == 1
+
+def task_event(task, status: str) -> Dict[str, Any]:
+    """Socket.IO payload describing a task"""
+    agent = task.assigned_agent
+    return {
+        'id': task.id,
+        'title': task.title,
+        'status': status,
+        'stage': task.stage,
+        'agent': {
+            'icon': agent.icon if agent else None,
+            'name': agent.name if agent else None
+        }
+    }
+
+def run_task_node(task_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Execute one claimed task (see _execute_task_node). Concurrent calls for
+    the same task - duplicate messages, overlapping manual and auto-run
+    triggers - are coalesced: callers arriving while it runs wait for and
+    share its outcome instead of being turned away. Only a success is
+    shared, and only with callers that arrived during the run; a caller
+    whose task was claimed again meanwhile (a retry) still runs it.
+    """
+    from database import db, Task
+    from single_flight import get_single_flight
+
+    result, shared = get_single_flight().do(
+        f"task:{task_id}",
+        lambda: _execute_task_node(task_id, user_id),
+        shareable=lambda result: bool(result.get('success')) and not result.get('skipped'),
+        encode=lambda result: {key: result.get(key) for key in ('success', 'execution_id', 'error')},
+        result_ttl=0
+    )
+    if shared:
+        task = db.session.get(Task, task_id)
+        db.session.refresh(task)
+        if task.status == 'processing' and task.lease_owner is None:
+            return _execute_task_node(task_id, user_id)
+    return result
+
+def _execute_task_node(task_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Execute one claimed task under a lease: call its agent, then mark the
+    task completed or failed. A task whose model call already succeeded
+    (its worker died before recording it) is completed without calling the
+    model again, and a task leased to someone else is skipped. Errors only
+    fail this task. Must run inside an app context.
+    """
+    from database import db, Task
+    from ai_providers import AIProviderFactory, project_task_prompt
+    from stage_summaries import project_context
+    from celery_tasks import emit_task_update
+    from task_leases import (new_lease_owner, acquire_lease, finish_lease,
+                             successful_execution, LeaseHeartbeat)
+
+    owner = new_lease_owner()
+    if not acquire_lease(task_id, owner):
+        print(f"⏭️ Task {task_id} is not claimable (already leased or settled), skipping")
+        return {'success': False, 'skipped': True, 'error': 'Task is leased by another worker'}
+
+    task = db.session.get(Task, task_id)
+    agent = task.assigned_agent
+    project = task.project
+
+    execution = successful_execution(task_id)
+    if execution:
+        print(f"♻️ {agent.name} already succeeded for Stage {task.stage}, reusing execution {execution.id}")
+        result = {'success': True, 'execution_id': execution.id, 'response': execution.output_response,
+                  'reused': True}
+    else:
+        print(f"🔥 Executing {agent.name} for Stage {task.stage}")
+        try:
+            with LeaseHeartbeat(db.engine, task_id, owner):
+                result = AIProviderFactory.execute_agent(
+                    agent=agent,
+                    prompt=project_task_prompt(task.title),
+                    shared_context=project_context(project, task.stage),
+                    project_id=project.id,
+                    task_id=task.id
+                )
+        except Exception as e:
+            db.session.rollback()
+            result = {'success': False, 'error': str(e)}
+
+    task = db.session.get(Task, task_id)
+    now = datetime.utcnow()
+    if result['success']:
+        values = {'status': 'completed', 'completed_at': now, 'error_message': None}
+        if task.started_at:
+            values['actual_duration'] = int((now - task.started_at).total_seconds())
+    else:
+        values = {'status': 'failed', 'error_message': str(result.get('error', 'Unknown error'))[:500]}
+
+    if not finish_lease(task_id, owner, values):
+        print(f"⚠️ Lost the lease of task {task_id} before it finished; leaving it to its new owner")
+        return dict(result, lease_lost=True)
+
+    db.session.refresh(task)
+    if result['success']:
+        print(f"✅ {agent.name} completed")
+    else:
+        print(f"❌ {agent.name} failed: {task.error_message}")
+
+    emit_task_update(task.id, task.status, task_event(task, task.status),
+                     user_id=user_id, project_id=project.id)
+    return result
+
+@dataclass
+class PipelineRun:
+    """The set of tasks one pipeline invocation is responsible for"""
+    project_id: int
+    task_ids: List[int]
+    user_id: Optional[int] = None
+    advance_stage: bool = True
+    auto_run: bool = False  # Queue the next auto-run stage when the run's last stage completes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PipelineRun':
+        return cls(**data)
+
+class ExecutionBackend:
+    """
+    Where claimed tasks run.
+
+    Blocking backends run tasks on behalf of the caller: submit() starts a
+    task and wait() returns the id of the next one that finished. Non-
+    blocking backends hand tasks off; whoever finishes a task calls
+    PipelineEngine.schedule() to start the tasks that became ready.
+    """
+
+    name = 'base'
+    blocking = True
+
+    def __init__(self):
+        self.outstanding = 0
+
+    def submit(self, task_id: int, run: PipelineRun):
+        raise NotImplementedError
+
+    def wait(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class InlineBackend(ExecutionBackend):
+    """Runs each task in the calling thread, one after another"""
+
+    name = 'inline'
+
+    def __init__(self):
+        super().__init__()
+        self._finished = []
+
+    def submit(self, task_id: int, run: PipelineRun):
+        self.outstanding += 1
+        try:
+            run_task_node(task_id, run.user_id)
+        finally:
+            self._finished.append(task_id)
+
+    def wait(self) -> int:
+        self.outstanding -= 1
+        return self._finished.pop(0)
+
+class ThreadPoolBackend(ExecutionBackend):
+    """Runs up to max_workers tasks at once, each with its own app context and session"""
+
+    name = 'thread'
+
+    def __init__(self, max_workers: int):
+        super().__init__()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix='pipeline')
+        self._finished = queue.Queue()
+
+    def submit(self, task_id: int, run: PipelineRun):
+        from flask import current_app
+
+        app = current_app._get_current_object()
+        self.outstanding += 1
+        self._executor.submit(self._run, app, task_id, run.user_id)
+
+    def _run(self, app, task_id: int, user_id: Optional[int]):
+        try:
+            with app.app_context():
+                run_task_node(task_id, user_id)
+        except Exception as e:
+            print(f"❌ Pipeline task {task_id} crashed: {e}")
+        finally:
+            self._finished.put(task_id)
+
+    def wait(self) -> int:
+        task_id = self._finished.get()
+        self.outstanding -= 1
+        return task_id
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+class CeleryBackend(ExecutionBackend):
+    """Sends each task to a Celery worker; the worker schedules what follows it"""
+
+    name = 'celery'
+    blocking = False
+
+    def submit(self, task_id: int, run: PipelineRun):
+        from database import db, Task
+        from celery_tasks import run_pipeline_node, task_route
+
+        task = db.session.get(Task, task_id)
+        run_pipeline_node.apply_async(
+            args=[task_id, run.to_dict()],
+            **task_route('auto_run' if run.auto_run else 'pipeline_node', task.priority)
+        )
+
+def pipeline_fan_out() -> int:
+    """
+    Tasks the thread backend runs at once: PIPELINE_MAX_WORKERS, capped at
+    the model slots available. More would only queue for a slot and risk
+    MODEL_SLOT_WAIT_TIMEOUT while other tasks generate.
+    """
+    from concurrency import get_concurrency_limiter
+
+    capacity = get_concurrency_limiter().capacity(len(Config.OLLAMA_BACKENDS))
+    return min(Config.PIPELINE_MAX_WORKERS, capacity) if capacity else Config.PIPELINE_MAX_WORKERS
+
+def get_execution_backend(name: Optional[str] = None) -> ExecutionBackend:
+    """Backend by name, Config.PIPELINE_EXECUTION_BACKEND by default"""
+    name = name or Config.PIPELINE_EXECUTION_BACKEND
+    if name == 'inline':
+        return InlineBackend()
+    if name == 'thread':
+        return ThreadPoolBackend(pipeline_fan_out())
+    if name == 'celery':
+        return CeleryBackend()
+    raise ValueError(f"Unknown pipeline execution backend: {name}")
+
+def local_backend_name() -> str:
+    """Configured backend, or the thread pool when that is Celery (for no-broker fallbacks)"""
+    if Config.PIPELINE_EXECUTION_BACKEND == 'celery':
+        return 'thread'
+    return Config.PIPELINE_EXECUTION_BACKEND
+
+class PipelineEngine:
+    """
+    Dependency-driven scheduler for a project's tasks.
+
+    Each scheduling pass reloads the run's tasks, claims every pending task
+    whose dependencies have settled (completed or failed, or outside the
+    run) and submits it to the backend. Claiming is a conditional UPDATE
+    from 'pending' to 'processing', so concurrent schedulers (Celery
+    workers finishing at the same moment) never start a task twice; the
+    worker that runs it then takes a lease (task_leases.py). Tasks
+    of different stages overlap freely; a stage is only marked complete
+    once it and every earlier stage of the run have settled.
+    """
+
+    def __init__(self, backend: ExecutionBackend):
+        self.backend = backend
+        self._submitted = set()
+
+    def start(self, project, stages: Optional[Iterable[int]] = None,
+              task_ids: Optional[List[int]] = None, user_id: Optional[int] = None,
+              retry_failed: bool = True, advance_stage: bool = True,
+              auto_run: bool = False) -> Dict[str, Any]:
+        """
+        Run the tasks of the given stages (created if missing), or exactly
+        the given task ids. Blocking backends return once every task has
+        settled; the Celery backend returns after dispatching the first wave.
+        """
+        from database import db, Task
+        from task_leases import reap_expired_leases
+
+        # Tasks stranded by a dead worker would otherwise block the run forever
+        reap_expired_leases(project_id=project.id)
+
+        if task_ids is None:
+            tasks = [task for stage in sorted(stages or []) for task in stage_tasks(project.id, stage)]
+        else:
+            tasks = Task.query.filter(Task.id.in_(task_ids)).all()
+        tasks = [task for task in tasks if task.assigned_agent]
+
+        if retry_failed:
+            for task in tasks:
+                if task.status == 'failed':
+                    task.status = 'pending'
+                    task.error_message = None
+        db.session.commit()
+
+        run = PipelineRun(project_id=project.id, task_ids=[task.id for task in tasks],
+                          user_id=user_id, advance_stage=advance_stage, auto_run=auto_run)
+        self.schedule(run)
+        if self.backend.blocking:
+            while self.backend.outstanding:
+                self.backend.wait()
+                self.schedule(run)
+        return self.report(run)
+
+    def _claim(self, task) -> bool:
+        from database import Task
+        from task_leases import claim_values
+
+        claimed = Task.query.filter_by(id=task.id, status='pending').update(
+            claim_values(), synchronize_session=False)
+        return claimed == 1
+
+    def schedule(self, run: PipelineRun) -> int:
+        """One scheduling pass; returns how many tasks were started"""
+        from database import db, Project, Task
+        from celery_tasks import emit_task_update
+
+        project_tasks = Task.query.filter_by(project_id=run.project_id).populate_existing().all()
+        dependencies = task_dependencies(project_tasks)
+        run_task_ids = set(run.task_ids)
+        in_run = {task.id: task for task in project_tasks if task.id in run_task_ids}
+
+        def settled(task_id: int) -> bool:
+            task = in_run.get(task_id)
+            return task is None or task.status in SETTLED_STATUSES
+
+        ready = [task for task in in_run.values()
+                 if task.status == 'pending' and all(settled(dep) for dep in dependencies[task.id])]
+        ready.sort(key=lambda task: (task.stage or 0, -(task.priority or 0), task.id))
+        claimed = [task for task in ready if self._claim(task)]
+        db.session.commit()
+
+        if not claimed and not any(task.status == 'processing' for task in in_run.values()):
+            # Nothing running and nothing ready: what is left waits on a cycle
+            for task in in_run.values():
+                if task.status == 'pending':
+                    task.status = 'failed'
+                    task.error_message = 'Dependencies could not be resolved'
+            db.session.commit()
+
+        if run.advance_stage:
+            project = db.session.get(Project, run.project_id)
+            run_stages = sorted({task.stage or 0 for task in in_run.values()})
+            max_stage = run_stages[-1] if run_stages else None
+            for stage in run_stages:
+                if not all(task.status in SETTLED_STATUSES
+                           for task in in_run.values() if (task.stage or 0) == stage):
+                    break
+                if complete_stage(project, stage) and run.auto_run and stage == max_stage:
+                    from celery_tasks import queue_next_auto_run_stage
+                    queue_next_auto_run_stage(run.project_id, run.user_id, stage)
+
+        for task in claimed:
+            db.session.refresh(task)
+            emit_task_update(task.id, 'processing', task_event(task, 'processing'),
+                             user_id=run.user_id, project_id=run.project_id)
+            self._submitted.add(task.id)
+            try:
+                self.backend.submit(task.id, run)
+            except Exception as e:
+                task.status = 'failed'
+                task.error_message = f"Could not start task: {e}"[:500]
+                db.session.commit()
+
+        if self.backend.blocking:
+            # Tasks of the run that another caller is already running: join
+            # that run's flight (run_task_node) rather than report them unfinished
+            for task in in_run.values():
+                if task.status == 'processing' and task.id not in self._submitted:
+                    self._submitted.add(task.id)
+                    self.backend.submit(task.id, run)
+        return len(claimed)
+
+    def report(self, run: PipelineRun) -> Dict[str, Any]:
+        """Per-task outcome of a run, in stage order"""
+        from database import db, Project, Task, AgentExecution
+
+        project = db.session.get(Project, run.project_id)
+        project.completion_percentage = project_completion(run.project_id)
+        db.session.commit()
+
+        tasks = Task.query.filter(Task.id.in_(run.task_ids)).order_by(Task.stage, Task.id).all()
+        results = []
+        for task in tasks:
+            result = {'agent': task.assigned_agent.name, 'stage': task.stage, 'status': task.status}
+            if task.status == 'completed':
+                execution = AgentExecution.query.filter_by(task_id=task.id, success=True).order_by(
+                    AgentExecution.id.desc()).first()
+                result['execution_id'] = execution.id if execution else None
+            elif task.status == 'failed':
+                result['error'] = task.error_message
+            results.append(result)
+
+        return {
+            'project_id': run.project_id,
+            'stage': project.stage,
+            'backend': self.backend.name,
+            'agents_triggered': len(results),
+            'completed': sum(1 for r in results if r['status'] == 'completed'),
+            'failed': sum(1 for r in results if r['status'] == 'failed'),
+            'results': results
+        }
+
+def run_pipeline(project, stages: Optional[Iterable[int]] = None,
+                 task_ids: Optional[List[int]] = None, user_id: Optional[int] = None,
+                 backend: Optional[str] = None, retry_failed: bool = True,
+                 advance_stage: bool = True, auto_run: bool = False) -> Dict[str, Any]:
+    """Run tasks of a project on a fresh backend (Config.PIPELINE_EXECUTION_BACKEND by default)"""
+    execution_backend = get_execution_backend(backend)
+    try:
+        return PipelineEngine(execution_backend).start(
+            project, stages=stages, task_ids=task_ids, user_id=user_id,
+            retry_failed=retry_failed, advance_stage=advance_stage, auto_run=auto_run
+        )
+    finally:
+        execution_backend.close()
+
+def resume_recovered_tasks(reaped: Dict[str, List[Dict[str, Any]]],
+                           backend: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Restart the pipeline around tasks settled by reap_expired_leases: the
+    stages they belong to run again, which re-runs the recovered tasks,
+    starts their waiting dependents and completes the stage (chaining
+    auto-run projects on). Finished tasks of those stages are not re-run.
+    """
+    from database import db, Project, Task
+
+    stages_by_project = {}
+    for entries in reaped.values():
+        for entry in entries:
+            stages_by_project.setdefault(entry['project_id'], set()).add(entry['stage'])
+
+    reports = []
+    for project_id, stages in sorted(stages_by_project.items()):
+        project = db.session.get(Project, project_id)
+        if not project:
+            continue
+        task_ids = [task.id for task in Task.query.filter(
+            Task.project_id == project_id, Task.stage.in_(stages)).all()]
+        print(f"♻️ Resuming project {project_id} stage(s) {sorted(stages)} after lease recovery")
+        reports.append(run_pipeline(project, task_ids=task_ids, user_id=project.user_id,
+                                    backend=backend, retry_failed=False,
+                                    auto_run=bool(project.auto_run)))
+    return reports
@@ -0,0 +1,205 @@
+"""
+Progress Broadcaster Module
+Coalesces real-time progress events: events are batched per room over a
+short window, superseded states of the same task are merged, Socket.IO
+messages per room are rate-limited, and only fields that changed since the
+last message are sent
+"""
+
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from config import Config
+
+BATCH_EVENT = 'progress'
+
+# States after which nothing more is sent for a key, so its delta base can go
+TERMINAL_STATUSES = {'completed', 'failed', 'cancelled'}
+
+def delta(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields of current that differ from previous (nested dicts are diffed too)"""
+    if previous is None:
+        return dict(current)
+    changed = {}
+    for field, value in current.items():
+        before = previous.get(field)
+        if isinstance(value, dict) and isinstance(before, dict):
+            nested = delta(before, value)
+            if nested:
+                changed[field] = nested
+        elif field not in previous or before != value:
+            changed[field] = value
+    return changed
+
+def merge(previous: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """previous with update applied (nested dicts are merged too)"""
+    merged = dict(previous)
+    for field, value in update.items():
+        if isinstance(value, dict) and isinstance(merged.get(field), dict):
+            merged[field] = merge(merged[field], value)
+        else:
+            merged[field] = value
+    return merged
+
+class _Room:
+    """Pending events of one room and its send budget"""
+
+    def __init__(self, rate: float):
+        self.pending: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.tokens = rate
+        self.refilled_at = time.time()
+
+class ProgressBroadcaster:
+    """
+    Sends progress events as one 'progress' message per room and window.
+
+    publish() only queues: a background thread flushes every window
+    seconds. Events with the same key (e.g. task:<id>) replace each other
+    until flushed, so a task going processing -> completed within a window
+    costs one entry. Each room may receive at most max_per_second messages;
+    over budget, events keep merging until the next send. Keyed events
+    carry only the fields that changed since the key was last sent to the
+    room (identity fields always), which the browser merges back. With
+    window 0 every event is sent at once, unbatched.
+    """
+
+    IDENTITY_FIELDS = ('task_id', 'project_id', 'status')  # Sent even when unchanged
+    MAX_SENT_KEYS = 5000  # Delta bases kept (oldest dropped; they then resend in full)
+
+    def __init__(self, window_seconds: float, max_per_second: float, max_batch_events: int):
+        self.window = window_seconds
+        self.max_per_second = max_per_second
+        self.max_batch_events = max_batch_events
+        self._lock = threading.Lock()
+        self._rooms: Dict[str, _Room] = {}
+        self._sent: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()  # (room, key) -> last full state
+        self._sequence = 0
+        self._thread = None
+        self._stats = {'published': 0, 'coalesced': 0, 'messages': 0, 'events_sent': 0,
+                       'rate_limited': 0}
+
+    def publish(self, event: str, data: Dict[str, Any], room: str, key: Optional[str] = None):
+        """Queue an event for a room; key identifies state that later events of the same key supersede"""
+        if self.window <= 0:
+            from realtime import emit
+            emit(event, data, room=room)
+            return
+
+        with self._lock:
+            self._stats['published'] += 1
+            state = self._rooms.get(room)
+            if state is None:
+                state = self._rooms[room] = _Room(self.max_per_second)
+            if key is None:
+                self._sequence += 1
+                state.pending[f"#{self._sequence}"] = {'event': event, 'data': data}
+            elif f"{event}:{key}" in state.pending:
+                self._stats['coalesced'] += 1
+                pending = state.pending[f"{event}:{key}"]
+                pending['data'] = merge(pending['data'], data)
+            else:
+                state.pending[f"{event}:{key}"] = {'event': event, 'key': key, 'data': data}
+            self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        """Start the flush thread (again after a fork; caller holds the lock)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name='progress-broadcaster')
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Progress broadcast failed: {e}")
+
+    def flush(self, force: bool = False):
+        """Send every room's pending events its budget allows (all of them with force)"""
+        self._flush_once(force)
+        while force and self.stats()['pending']:
+            self._flush_once(force)
+
+    def _flush_once(self, force: bool):
+        from realtime import emit
+
+        batches = []
+        now = time.time()
+        with self._lock:
+            for room, state in list(self._rooms.items()):
+                if not state.pending:
+                    del self._rooms[room]
+                    continue
+                state.tokens = min(self.max_per_second,
+                                   state.tokens + (now - state.refilled_at) * self.max_per_second)
+                state.refilled_at = now
+                if state.tokens < 1 and not force:
+                    self._stats['rate_limited'] += 1
+                    continue
+                state.tokens -= 1
+
+                events = []
+                while state.pending and len(events) < self.max_batch_events:
+                    _, item = state.pending.popitem(last=False)
+                    events.append(self._compact(room, item))
+                batches.append((room, events))
+                self._stats['messages'] += 1
+                self._stats['events_sent'] += len(events)
+
+        for room, events in batches:
+            emit(BATCH_EVENT, {'events': events}, room=room)
+
+    def _compact(self, room: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        """The event as sent: keyed events carry a delta against the room's last state (caller holds the lock)"""
+        key = item.get('key')
+        if key is None:
+            return item
+
+        sent_key = (room, key)
+        previous = self._sent.pop(sent_key, None)
+        current = item['data'] if previous is None else merge(previous, item['data'])
+        changes = delta(previous, current)
+        changes.update({field: current[field] for field in self.IDENTITY_FIELDS if field in current})
+
+        if current.get('status') not in TERMINAL_STATUSES:
+            self._sent[sent_key] = current
+            while len(self._sent) > self.MAX_SENT_KEYS:
+                self._sent.popitem(last=False)
+        return {'event': item['event'], 'key': key, 'data': changes}
+
+    def stats(self) -> Dict[str, Any]:
+        """Events published and Socket.IO messages sent by this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = sum(len(state.pending) for state in self._rooms.values())
+        stats['events_per_message'] = round(stats['events_sent'] / stats['messages'], 2) if stats['messages'] else 0
+        return {'window_ms': int(self.window * 1000), 'max_per_second': self.max_per_second, **stats}
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+def get_broadcaster() -> ProgressBroadcaster:
+    """Get the process-wide progress broadcaster"""
+    global _broadcaster
+
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                _broadcaster = ProgressBroadcaster(
+                    window_seconds=Config.REALTIME_BATCH_WINDOW_MS / 1000,
+                    max_per_second=Config.REALTIME_MAX_MESSAGES_PER_SECOND,
+                    max_batch_events=Config.REALTIME_MAX_BATCH_EVENTS
+                )
+                # Don't lose the last window when a short-lived process exits
+                atexit.register(_broadcaster.flush, force=True)
+
+    return _broadcaster
+
+def broadcast(event: str, data: Dict[str, Any], room: Optional[str], key: Optional[str] = None):
+    """Publish a progress event to a room (nothing is sent without one)"""
+    if room is not None:
+        get_broadcaster().publish(event, data, room, key)
@@ -0,0 +1,169 @@
+"""
+Prompt Budget Module
+Keeps agent prompts inside the model's context window by estimating token
+counts and trimming or summarizing sections before the call
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Callable
+
+from config import Config
+
+STRATEGIES = ('priority', 'tail', 'head', 'middle', 'summarize')
+
+def estimate_tokens(text: Optional[str], chars_per_token: Optional[float] = None) -> int:
+    """Rough token count from character length (no tokenizer is bundled)"""
+    if not text:
+        return 0
+    chars_per_token = chars_per_token or Config.PROMPT_CHARS_PER_TOKEN
+    return int(len(text) / chars_per_token) + 1
+
+@dataclass
+class PromptSection:
+    """One part of a prompt; higher priority sections are trimmed last"""
+    name: str
+    text: Optional[str]
+    priority: int = 1
+    trimmable: bool = True
+
+class PromptBudget:
+    """
+    Fits prompt sections into num_ctx minus the room reserved for the reply.
+
+    Strategies:
+      priority  - trim the lowest-priority sections first, cutting their tail
+      tail/head/middle - cut every trimmable section in proportion to its
+                  size, dropping its end, its start, or its middle
+      summarize - ask the model to condense the lowest-priority sections,
+                  falling back to 'priority' if summarizing fails
+    """
+
+    MARKER = "\n[... {tokens} tokens truncated ...]\n"
+
+    def __init__(self, num_ctx: int, overhead_tokens: int = 64,
+                 strategy: str = 'priority', chars_per_token: Optional[float] = None,
+                 summarize: Optional[Callable[[str, int], Optional[str]]] = None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown prompt truncation strategy: {strategy}")
+        self.num_ctx = num_ctx
+        self.overhead_tokens = overhead_tokens
+        self.strategy = strategy
+        self.chars_per_token = chars_per_token or Config.PROMPT_CHARS_PER_TOKEN
+        self.summarize = summarize
+
+    def available(self, max_output_tokens: int) -> int:
+        """Prompt tokens left after reserving the reply (at least a quarter of the window)"""
+        budget = self.num_ctx - max_output_tokens - self.overhead_tokens
+        return max(budget, self.num_ctx // 4)
+
+    def _tokens(self, text: Optional[str]) -> int:
+        return estimate_tokens(text, self.chars_per_token)
+
+    def _cut(self, text: str, keep_tokens: int, method: str) -> str:
+        """Cut text down to about keep_tokens, on a whitespace boundary"""
+        removed = self._tokens(text) - keep_tokens
+        marker = self.MARKER.format(tokens=removed)
+        # The marker counts against what is kept
+        keep_chars = max(0, int(keep_tokens * self.chars_per_token) - len(marker))
+
+        if method == 'head':
+            kept = text[len(text) - keep_chars:] if keep_chars else ''
+            space = kept.find(' ')
+            if 0 <= space < 80:
+                kept = kept[space + 1:]
+            return marker.lstrip('\n') + kept
+        if method == 'middle':
+            head = text[:keep_chars // 2].rsplit(' ', 1)[0]
+            tail = text[len(text) - keep_chars // 2:] if keep_chars else ''
+            return head + marker + tail
+        kept = text[:keep_chars]
+        if ' ' in kept[-80:]:
+            kept = kept.rsplit(' ', 1)[0]
+        return kept + marker.rstrip('\n')
+
+    def fit(self, sections: List[PromptSection],
+            max_output_tokens: int) -> Dict[str, Any]:
+        """
+        Trim sections in place so their total fits the budget.
+
+        Returns a report with the estimate before and after, and one entry
+        per section that was cut; 'cuts' is empty when nothing changed.
+        """
+        budget = self.available(max_output_tokens)
+        sizes = {s.name: self._tokens(s.text) for s in sections}
+        total = sum(sizes.values())
+        report = {
+            'num_ctx': self.num_ctx,
+            'budget_tokens': budget,
+            'estimated_tokens': total,
+            'strategy': self.strategy,
+            'cuts': []
+        }
+        overflow = total - budget
+        if overflow <= 0:
+            return report
+
+        trimmable = [s for s in sections if s.trimmable and s.text]
+        strategy = self.strategy
+
+        if strategy == 'summarize':
+            overflow = self._summarize(trimmable, sizes, overflow, report)
+            strategy = 'priority'
+
+        if overflow > 0 and strategy == 'priority':
+            for section in sorted(trimmable, key=lambda s: s.priority):
+                if overflow <= 0:
+                    break
+                keep = max(0, sizes[section.name] - overflow)
+                overflow -= self._apply(section, sizes, keep, 'tail', report)
+        elif overflow > 0:
+            trimmable_total = sum(sizes[s.name] for s in trimmable) or 1
+            for section in trimmable:
+                share = -(-overflow * sizes[section.name] // trimmable_total)  # Ceiling
+                self._apply(section, sizes, max(0, sizes[section.name] - share), strategy, report)
+
+        report['final_tokens'] = sum(sizes.values())
+        return report
+
+    def _apply(self, section: PromptSection, sizes: Dict[str, int], keep: int,
+               method: str, report: Dict[str, Any]) -> int:
+        original = sizes[section.name]
+        if keep >= original:
+            return 0
+        section.text = self._cut(section.text, keep, method)
+        sizes[section.name] = self._tokens(section.text)
+        report['cuts'].append({
+            'section': section.name,
+            'method': method,
+            'original_tokens': original,
+            'kept_tokens': sizes[section.name]
+        })
+        return original - sizes[section.name]
+
+    def _summarize(self, trimmable: List[PromptSection], sizes: Dict[str, int],
+                   overflow: int, report: Dict[str, Any]) -> int:
+        if self.summarize is None:
+            return overflow
+        for section in sorted(trimmable, key=lambda s: s.priority):
+            if overflow <= 0:
+                break
+            original = sizes[section.name]
+            target = max(64, original - overflow)
+            # The text to summarize must itself fit in the window
+            source = section.text
+            limit = self.available(target) - self.overhead_tokens
+            if original > limit:
+                source = self._cut(source, limit, 'middle')
+            summary = self.summarize(source, target)
+            if not summary or self._tokens(summary) >= original:
+                continue
+            section.text = summary
+            sizes[section.name] = self._tokens(summary)
+            overflow -= original - sizes[section.name]
+            report['cuts'].append({
+                'section': section.name,
+                'method': 'summarize',
+                'original_tokens': original,
+                'kept_tokens': sizes[section.name]
+            })
+        return overflow
@@ -0,0 +1,89 @@
+"""
+Realtime Module
+Socket.IO fan-out through a Redis message queue: any web process or Celery
+worker can emit to the user_<id> and project_<id> rooms of browsers
+connected to any web process
+"""
+
+import threading
+from typing import Any, Optional
+
+from config import Config
+
+NAMESPACE = '/tasks'
+
+_queue_url = None
+_queue_checked = False
+_emitter = None
+_local_server = None
+_lock = threading.Lock()
+
+def message_queue_url() -> Optional[str]:
+    """
+    Config.SOCKETIO_MESSAGE_QUEUE if it answers, else None. Without a queue
+    only the web process's own clients can be reached (single-process mode).
+    Checked once per process.
+    """
+    global _queue_url, _queue_checked
+
+    if not _queue_checked:
+        with _lock:
+            if not _queue_checked:
+                url = Config.SOCKETIO_MESSAGE_QUEUE
+                if url:
+                    try:
+                        import redis
+                        redis.from_url(url, socket_connect_timeout=1, socket_timeout=1).ping()
+                        _queue_url = url
+                    except Exception as e:
+                        print(f"⚠️ Socket.IO message queue unavailable, real-time updates stay in-process: {e}")
+                _queue_checked = True
+
+    return _queue_url
+
+def register_local_server(socketio):
+    """Remember the Socket.IO server of this process (used when there is no message queue)"""
+    global _local_server
+
+    if _local_server is None:
+        _local_server = socketio
+
+def get_emitter():
+    """
+    Write-only Socket.IO client publishing to the message queue. It does not
+    import the Flask app, so Celery workers can emit cheaply. None without a
+    message queue.
+    """
+    global _emitter
+
+    if _emitter is None and message_queue_url():
+        with _lock:
+            if _emitter is None:
+                from flask_socketio import SocketIO
+                _emitter = SocketIO(message_queue=_queue_url)
+
+    return _emitter
+
+def emit(event: str, data: Any, room: Optional[str] = None, namespace: str = NAMESPACE) -> bool:
+    """
+    Emit an event to a room through the message queue, or through this
+    process's own server when there is none. Returns False if nothing could
+    send it; real-time updates never fail the caller.
+    """
+    emitter = get_emitter() or _local_server
+    if emitter is None:
+        return False
+    try:
+        emitter.emit(event, data, room=room, namespace=namespace)
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not emit {event}: {e}")
+        return False
+
+def task_room(user_id: Optional[int] = None, project_id: Optional[int] = None) -> Optional[str]:
+    """The room an update belongs to: its user's, else its project's"""
+    if user_id:
+        return f'user_{user_id}'
+    if project_id:
+        return f'project_{project_id}'
+    return None
@@ -0,0 +1,169 @@
+"""
+Resilience Module
+Retry backoff, circuit breaking and latency tracking for hedged requests
+on the Ollama call path
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+from config import Config
+from ollama_pool import BackendNotContacted
+
+class CircuitOpenError(BackendNotContacted):
+    """Raised instead of calling Ollama while the circuit breaker is open"""
+    pass
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Exponential backoff with full jitter for the given retry number (0-based)"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold transient failures in a row the circuit opens and
+    calls fail immediately for reset_seconds. It then half-opens: one trial
+    call is let through and its outcome closes or re-opens the circuit.
+    State is per process, like the backend pool's ejection state.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.rejected_calls = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go out now"""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+
+            self.rejected_calls += 1
+            retry_in = max(0.0, self.reset_seconds - (time.time() - self.opened_at))
+            raise CircuitOpenError(
+                f"Ollama circuit breaker is open after {self.consecutive_failures} "
+                f"consecutive failures; retrying in {retry_in:.0f}s"
+            )
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("✅ Ollama circuit breaker closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if self.state == self.HALF_OPEN or \
+                    (self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+                if self.state == self.CLOSED:
+                    print(f"⚠️ Ollama circuit breaker opened after "
+                          f"{self.consecutive_failures} consecutive failures")
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    def release_trial(self):
+        """Give up a half-open trial slot without an outcome (call never sent)"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected_calls
+            }
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per model, plus hedge counters"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            'retries': 0,
+            'hedges_launched': 0,
+            'hedges_won': 0
+        }
+
+    def record(self, model: str, latency_ms: float):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(latency_ms)
+
+    def percentile(self, model: str, percentile: float, min_samples: int) -> Optional[float]:
+        """Latency at the given percentile, or None until min_samples are recorded"""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = dict(self.counters)
+        result['p95_ms'] = {model: self.percentile(model, 95, 1) for model in list(self._samples)}
+        return result
+
+_circuit_breaker = None
+_latency_tracker = None
+_resilience_lock = threading.Lock()
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Get the process-wide Ollama circuit breaker"""
+    global _circuit_breaker
+
+    if _circuit_breaker is None:
+        with _resilience_lock:
+            if _circuit_breaker is None:
+                _circuit_breaker = CircuitBreaker(
+                    failure_threshold=Config.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                    reset_seconds=Config.CIRCUIT_BREAKER_RESET_SECONDS
+                )
+
+    return _circuit_breaker
+
+def get_latency_tracker() -> LatencyTracker:
+    """Get the process-wide latency tracker used to time hedged requests"""
+    global _latency_tracker
+
+    if _latency_tracker is None:
+        with _resilience_lock:
+            if _latency_tracker is None:
+                _latency_tracker = LatencyTracker()
+
+    return _latency_tracker
@@ -0,0 +1,214 @@
+"""
+Response Cache Module
+Content-addressed cache for agent responses with an in-process LRU tier
+and a shared Redis tier
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from config import Config
+
+def make_cache_key(model: str, system_prompt: Optional[str], prompt: str,
+                   temperature: float, max_tokens: int,
+                   context_prefix: Optional[str] = None) -> str:
+    """Canonical SHA-256 hash of everything that determines a model response"""
+    request = {
+        'model': model,
+        'system_prompt': system_prompt or '',
+        'prompt': prompt,
+        'temperature': float(temperature),
+        'max_tokens': int(max_tokens)
+    }
+    if context_prefix:
+        request['context_prefix'] = context_prefix
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class MemoryCacheTier:
+    """Thread-safe LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisCacheTier:
+    """
+    Redis-backed tier shared by web and worker processes.
+
+    Entries expire via Redis TTL; a sorted-set index ordered by insertion time
+    trims the oldest entries once max_entries is exceeded. Any Redis error is
+    treated as a miss so the cache never breaks an agent call.
+    """
+
+    def __init__(self, url: str, max_entries: int, ttl_seconds: int,
+                 prefix: str = 'bdc:response_cache:'):
+        import redis
+        self.client = redis.from_url(url, socket_connect_timeout=1, socket_timeout=1)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.index_key = f"{prefix}index"
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception:
+            self.errors += 1
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        try:
+            pipe = self.client.pipeline()
+            pipe.setex(self.prefix + key, self.ttl_seconds, json.dumps(value))
+            pipe.zadd(self.index_key, {key: now})
+            pipe.zremrangebyscore(self.index_key, 0, now - self.ttl_seconds)
+            pipe.zcard(self.index_key)
+            size = pipe.execute()[-1]
+
+            overflow = size - self.max_entries
+            if overflow > 0:
+                oldest = self.client.zrange(self.index_key, 0, overflow - 1)
+                if oldest:
+                    pipe = self.client.pipeline()
+                    pipe.delete(*[self.prefix + k.decode() for k in oldest])
+                    pipe.zrem(self.index_key, *oldest)
+                    pipe.execute()
+        except Exception:
+            self.errors += 1
+
+    def clear(self):
+        try:
+            keys = self.client.zrange(self.index_key, 0, -1)
+            if keys:
+                self.client.delete(*[self.prefix + k.decode() for k in keys])
+            self.client.delete(self.index_key)
+        except Exception:
+            self.errors += 1
+
+class ResponseCache:
+    """Two-tier response cache with hit/miss counters"""
+
+    def __init__(self, memory_tier: MemoryCacheTier,
+                 remote_tier: Optional[RedisCacheTier] = None):
+        self.memory_tier = memory_tier
+        self.remote_tier = remote_tier
+        self._lock = threading.Lock()
+        self.counters = {
+            'memory_hits': 0,
+            'remote_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'bypasses': 0
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a response, promoting remote hits into memory"""
+        value = self.memory_tier.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+
+        if self.remote_tier is not None:
+            value = self.remote_tier.get(key)
+            if value is not None:
+                self.memory_tier.set(key, value)
+                self._count('remote_hits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a response in every tier"""
+        self.memory_tier.set(key, value)
+        if self.remote_tier is not None:
+            self.remote_tier.set(key, value)
+        self._count('stores')
+
+    def record_bypass(self):
+        self._count('bypasses')
+
+    def clear(self):
+        self.memory_tier.clear()
+        if self.remote_tier is not None:
+            self.remote_tier.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        hits = counters['memory_hits'] + counters['remote_hits']
+        lookups = hits + counters['misses']
+        counters['hit_rate'] = round(hits / lookups * 100, 2) if lookups else 0
+        counters['memory_entries'] = len(self.memory_tier)
+        counters['backend'] = 'redis' if self.remote_tier is not None else 'memory'
+        if self.remote_tier is not None:
+            counters['remote_errors'] = self.remote_tier.errors
+        return counters
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache, or None when caching is disabled"""
+    global _response_cache
+
+    if not Config.RESPONSE_CACHE_ENABLED:
+        return None
+
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                memory_tier = MemoryCacheTier(
+                    max_entries=Config.RESPONSE_CACHE_MEMORY_ENTRIES,
+                    ttl_seconds=Config.RESPONSE_CACHE_TTL
+                )
+                remote_tier = None
+                if Config.RESPONSE_CACHE_BACKEND == 'redis':
+                    remote_tier = RedisCacheTier(
+                        url=Config.REDIS_URL,
+                        max_entries=Config.RESPONSE_CACHE_REDIS_ENTRIES,
+                        ttl_seconds=Config.RESPONSE_CACHE_TTL
+                    )
+                _response_cache = ResponseCache(memory_tier, remote_tier)
+
+    return _response_cache
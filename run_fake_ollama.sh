@@ -0,0 +1,24 @@
+#!/bin/bash
+
+# Script to run the fake Ollama server for benchmarks and load tests (no GPU needed)
+
+echo "Starting fake Ollama for Billion Dollar Company..."
+echo "=============================================="
+echo ""
+
+# Activate virtual environment if it exists
+if [ -d "venv" ]; then
+    source venv/bin/activate
+    echo "✓ Virtual environment activated"
+fi
+
+PORT=${FAKE_OLLAMA_PORT:-11435}
+
+echo ""
+echo "Point Flask and Celery at it in every shell (or in .env):"
+echo "   export OLLAMA_BACKENDS=http://127.0.0.1:$PORT"
+echo "Press Ctrl+C to stop"
+echo ""
+
+# Extra arguments tune the latency model, e.g. --ttft-ms 300 --tokens-per-sec 20 --error-rate 0.05
+python benchmarks/fake_ollama.py --port "$PORT" "$@"
@@ -0,0 +1,44 @@
+#!/bin/bash
+
+# Script to run several web processes for Billion Dollar Company.
+# Real-time updates are fanned out through the Socket.IO message queue
+# (SOCKETIO_MESSAGE_QUEUE, Redis), so any process can reach any browser.
+
+echo "Starting web processes for Billion Dollar Company..."
+echo "=============================================="
+echo ""
+
+# Activate virtual environment if it exists
+if [ -d "venv" ]; then
+    source venv/bin/activate
+    echo "✓ Virtual environment activated"
+fi
+
+WEB_PROCESSES=${WEB_PROCESSES:-2}
+WEB_BASE_PORT=${WEB_BASE_PORT:-5001}
+
+# Several processes need the message queue to share Socket.IO rooms
+redis-cli ping > /dev/null 2>&1
+if [ $? -ne 0 ] && [ "$WEB_PROCESSES" -gt 1 ]; then
+    echo "❌ Redis is not running. Several web processes need it for real-time updates:"
+    echo "   start Redis, or run a single process with WEB_PROCESSES=1"
+    exit 1
+fi
+
+# Create tables and seed agents once, before the processes race to do it
+python -c "from app import init_database; init_database()"
+echo "✓ Database initialized"
+
+for i in $(seq 0 $((WEB_PROCESSES - 1))); do
+    port=$((WEB_BASE_PORT + i))
+    echo "✓ web process on port $port"
+    PORT=$port FLASK_DEBUG=false python app.py &
+done
+
+echo ""
+echo "Put a load balancer with sticky sessions in front (see README: Multi-Process Web Tier)"
+echo "Press Ctrl+C to stop"
+
+# Stop every process on Ctrl+C
+trap 'kill $(jobs -p) 2>/dev/null' INT TERM
+wait
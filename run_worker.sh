@@ -31,10 +31,41 @@ else
     fi
 fi
 
+# One worker pool per queue; set a pool's concurrency to 0 to skip it on this box.
+# <POOL>_QUEUES lets a pool also take other queues, e.g. BULK_QUEUES=bulk,pipeline
+INTERACTIVE_CONCURRENCY=${INTERACTIVE_CONCURRENCY:-2}
+PIPELINE_CONCURRENCY=${PIPELINE_CONCURRENCY:-4}
+BULK_CONCURRENCY=${BULK_CONCURRENCY:-2}
+INTERACTIVE_QUEUES=${INTERACTIVE_QUEUES:-interactive}
+PIPELINE_QUEUES=${PIPELINE_QUEUES:-pipeline}
+BULK_QUEUES=${BULK_QUEUES:-bulk}
+
 echo ""
-echo "Starting Celery worker..."
+echo "Starting Celery workers..."
 echo "Press Ctrl+C to stop"
 echo ""
 
-# Run Celery worker with info logging
-celery -A celery_tasks.celery_app worker --loglevel=info --concurrency=4
\ No newline at end of file
+start_pool() {
+    local name=$1 queues=$2 concurrency=$3
+    if [ "$concurrency" -gt 0 ]; then
+        echo "✓ $name pool: queues=$queues concurrency=$concurrency"
+        celery -A celery_tasks.celery_app worker --loglevel=info \
+            -Q "$queues" -n "$name@%h" --concurrency="$concurrency" &
+    fi
+}
+
+start_pool interactive "$INTERACTIVE_QUEUES" "$INTERACTIVE_CONCURRENCY"
+start_pool pipeline "$PIPELINE_QUEUES" "$PIPELINE_CONCURRENCY"
+start_pool bulk "$BULK_QUEUES" "$BULK_CONCURRENCY"
+
+# One beat scheduler per deployment: periodically recovers tasks of dead workers.
+# Set RUN_BEAT=false on all but one box
+if [ "${RUN_BEAT:-true}" = "true" ]; then
+    echo "✓ beat scheduler (task lease reaper every ${TASK_LEASE_REAP_INTERVAL_SECONDS:-30}s)"
+    celery -A celery_tasks.celery_app beat --loglevel=info \
+        --schedule="${TMPDIR:-/tmp}/bdc-celerybeat-schedule" &
+fi
+
+# Stop every pool on Ctrl+C
+trap 'kill $(jobs -p) 2>/dev/null' INT TERM
+wait
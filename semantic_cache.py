@@ -0,0 +1,206 @@
+"""
+Semantic Cache Module
+Near-duplicate response cache: prompts are embedded through Ollama and
+matched by cosine similarity against earlier prompts of the same agent
+"""
+
+import math
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+from config import Config
+
+try:
+    import numpy as np
+except ImportError:  # Optional: plain Python vectors are used instead
+    np = None
+
+class OllamaEmbedder:
+    """Embeds text with Ollama's /api/embeddings on the least busy backend"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def embed(self, text: str) -> List[float]:
+        from ai_providers import OllamaSessionPool
+        from ollama_pool import get_backend_pool
+
+        with get_backend_pool().lease(self.model) as backend:
+            response = OllamaSessionPool.get_session().post(
+                f"{backend.url}/api/embeddings",
+                json={"model": self.model, "prompt": text, "keep_alive": Config.OLLAMA_KEEP_ALIVE},
+                timeout=(Config.OLLAMA_CONNECT_TIMEOUT, Config.OLLAMA_HEALTH_CHECK_TIMEOUT * 6)
+            )
+            if response.status_code != 200:
+                raise Exception(f"Ollama embeddings returned status {response.status_code}: {response.text}")
+            embedding = response.json().get("embedding")
+            if not embedding:
+                raise Exception("Ollama returned an empty embedding")
+            return embedding
+
+class VectorIndex:
+    """
+    Bounded cosine-similarity index.
+
+    Vectors are normalized on insert and kept in one NumPy matrix (a list of
+    lists without NumPy), so a lookup is a single matrix-vector product. When
+    full, the least recently matched entry is evicted.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors = None
+        self._payloads = []
+        self._last_used = []
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: List[float]):
+        if np is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else vector
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else list(vector)
+
+    def _similarities(self, vector) -> List[float]:
+        if np is not None:
+            return (self._vectors @ vector).tolist()
+        return [sum(a * b for a, b in zip(row, vector)) for row in self._vectors]
+
+    def search(self, vector: List[float]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Best match as (similarity, payload), or None when empty or dimensions differ"""
+        vector = self._normalize(vector)
+        with self._lock:
+            if not self._payloads or len(vector) != len(self._vectors[0]):
+                return None
+            similarities = self._similarities(vector)
+            best = max(range(len(similarities)), key=similarities.__getitem__)
+            self._clock += 1
+            self._last_used[best] = self._clock
+            return similarities[best], self._payloads[best]
+
+    def add(self, vector: List[float], payload: Dict[str, Any]):
+        vector = self._normalize(vector)
+        with self._lock:
+            if self._payloads and len(vector) != len(self._vectors[0]):
+                # Embedding model changed: start over with the new dimension
+                self._vectors, self._payloads, self._last_used = None, [], []
+            self._clock += 1
+
+            if len(self._payloads) >= self.max_entries:
+                oldest = min(range(len(self._last_used)), key=self._last_used.__getitem__)
+                self._payloads[oldest] = payload
+                self._last_used[oldest] = self._clock
+                self._vectors[oldest] = vector
+                return
+
+            self._payloads.append(payload)
+            self._last_used.append(self._clock)
+            if np is not None:
+                row = vector[np.newaxis, :]
+                self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            else:
+                self._vectors = (self._vectors or []) + [vector]
+
+    def __len__(self):
+        return len(self._payloads)
+
+class SemanticCache:
+    """
+    Per-agent semantic response cache.
+
+    Each (agent, request scope) pair has its own index, where the scope is a
+    hash of everything except the prompt text (model, system prompt,
+    temperature, max_tokens), so only truly comparable requests can match.
+    In 'serve' mode a match above the threshold is returned instead of
+    calling the model; in 'offer' mode the model is still called and the
+    match is only reported. The index lives in process memory.
+    """
+
+    def __init__(self, embedder: OllamaEmbedder, threshold: float, max_entries: int,
+                 mode: str = 'serve'):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.mode = mode
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'errors': 0
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _index(self, agent_id: int, scope: str) -> VectorIndex:
+        with self._lock:
+            key = (agent_id, scope)
+            if key not in self._indexes:
+                self._indexes[key] = VectorIndex(self.max_entries)
+            return self._indexes[key]
+
+    def embed(self, text: str) -> Optional[List[float]]:
+        """Embedding for text, or None if Ollama could not produce one"""
+        try:
+            return self.embedder.embed(text)
+        except Exception as e:
+            self._count('errors')
+            print(f"⚠️ Semantic cache embedding failed: {e}")
+            return None
+
+    def lookup(self, agent_id: int, scope: str,
+               vector: List[float]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """(similarity, entry) of the closest earlier request above the threshold"""
+        match = self._index(agent_id, scope).search(vector)
+        if match is None or match[0] < self.threshold:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return match
+
+    def store(self, agent_id: int, scope: str, vector: List[float], entry: Dict[str, Any]):
+        self._index(agent_id, scope).add(vector, entry)
+        self._count('stores')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            entries = sum(len(index) for index in self._indexes.values())
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups * 100, 2) if lookups else 0
+        counters['entries'] = entries
+        counters['mode'] = self.mode
+        counters['threshold'] = self.threshold
+        counters['vector_backend'] = 'numpy' if np is not None else 'python'
+        return counters
+
+def semantic_cache_stages() -> List[int]:
+    return [int(stage) for stage in Config.SEMANTIC_CACHE_STAGES.split(',') if stage.strip()]
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Get the process-wide semantic cache, or None when it is disabled"""
+    global _semantic_cache
+
+    if not Config.SEMANTIC_CACHE_ENABLED:
+        return None
+
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    embedder=OllamaEmbedder(Config.SEMANTIC_CACHE_EMBED_MODEL),
+                    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+                    max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES,
+                    mode=Config.SEMANTIC_CACHE_MODE
+                )
+
+    return _semantic_cache
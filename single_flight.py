@@ -0,0 +1,252 @@
+"""
+Single-Flight Module
+Coalesces concurrent identical work (the same model request, the same task,
+a double-clicked action): the first caller runs it and everyone arriving
+meanwhile waits for and shares its result, across all web and worker
+processes (Redis-backed, with an in-process fallback)
+"""
+
+import json
+import time
+import uuid
+import threading
+from typing import Callable, Dict, Any, Optional, Tuple
+
+from config import Config
+
+# Delete the lock only if this leader still holds it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Extend the lock only if this leader still holds it
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class _LocalFlight:
+    """A flight led by a thread of this process"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload = None  # Encoded result, set when it may be shared
+        self.expires_at = None
+
+class SingleFlight:
+    """
+    Runs fn once per key among concurrent callers.
+
+    Callers in this process join the leader's flight directly. Across
+    processes the leader holds a Redis lock (renewed while fn runs, so a
+    crashed leader frees it within lock_seconds) and publishes the result
+    for result_ttl seconds; followers poll for it. Results are shared only
+    when shareable(result) is true - otherwise, or when the wait exceeds
+    wait_timeout, followers run fn themselves. Without Redis, only callers
+    of the same process are coalesced.
+    """
+
+    LOCK_PREFIX = 'bdc:flight:'
+    RESULT_PREFIX = 'bdc:flight_result:'
+    STATS_KEY = 'bdc:single_flight'
+    POLL_INTERVAL = 0.25
+    REDIS_RETRY_SECONDS = 30  # How long to stay on the local fallback after a Redis error
+
+    def __init__(self, lock_seconds: float, wait_timeout: float, result_ttl: float,
+                 redis_url: Optional[str] = None, enabled: bool = True):
+        self.lock_seconds = lock_seconds
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.enabled = enabled
+        self.client = None
+        if redis_url:
+            import redis
+            self.client = redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=2)
+            self._release = self.client.register_script(_RELEASE_SCRIPT)
+            self._renew = self.client.register_script(_RENEW_SCRIPT)
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _LocalFlight] = {}
+        self._stats = {}
+
+    def do(self, key: str, fn: Callable[[], Any],
+           shareable: Callable[[Any], bool] = lambda result: True,
+           encode: Callable[[Any], Any] = lambda result: result,
+           decode: Callable[[Any], Any] = lambda payload: payload,
+           result_ttl: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run fn, or share the result of an identical call in flight. Returns
+        (result, shared). encode/decode convert results to and from JSON-
+        compatible values; every follower gets its own decoded copy.
+        result_ttl overrides how long a finished result stays joinable; with
+        0 only callers that arrived while fn ran share it (across processes
+        they then run fn themselves, after the leader).
+        """
+        if not self.enabled:
+            return fn(), False
+
+        result_ttl = self.result_ttl if result_ttl is None else result_ttl
+
+        kind = key.split(':', 1)[0]
+        now = time.time()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.done.is_set() and (flight.payload is None or now >= flight.expires_at):
+                flight = None
+            leader = flight is None
+            if leader:
+                self._prune(now)
+                flight = self._flights[key] = _LocalFlight()
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout) and flight.payload is not None:
+                self._count(kind, 'shared', flight.payload['duration_ms'])
+                return decode(json.loads(flight.payload['value'])), True
+            self._count(kind, 'fallthrough')
+            return fn(), False
+
+        try:
+            result, shared, payload = self._run_across_processes(key, kind, fn, shareable, encode, result_ttl)
+            if payload is not None:
+                flight.payload = payload
+                result = decode(json.loads(payload['value'])) if shared else result
+            return result, shared
+        finally:
+            flight.expires_at = time.time() + result_ttl
+            flight.done.set()
+
+    def _run_across_processes(self, key: str, kind: str, fn: Callable[[], Any],
+                              shareable: Callable[[Any], bool],
+                              encode: Callable[[Any], Any],
+                              result_ttl: float) -> Tuple[Any, bool, Optional[Dict[str, Any]]]:
+        """Lead or follow the flight for key among all processes"""
+        if self.client is None or time.time() < self._redis_down_until:
+            return self._lead(kind, fn, shareable, encode)
+
+        token = uuid.uuid4().hex
+        lock_key = self.LOCK_PREFIX + key
+        result_key = self.RESULT_PREFIX + key
+        deadline = time.time() + self.wait_timeout
+        try:
+            while True:
+                published = self.client.get(result_key)
+                if published is not None:
+                    payload = json.loads(published)
+                    self._count(kind, 'shared', payload['duration_ms'])
+                    return None, True, payload
+                if self.client.set(lock_key, token, nx=True, px=int(self.lock_seconds * 1000)):
+                    break
+                if time.time() >= deadline:
+                    self._count(kind, 'fallthrough')
+                    return fn(), False, None
+                time.sleep(self.POLL_INTERVAL)
+        except Exception as e:
+            self._redis_down_until = time.time() + self.REDIS_RETRY_SECONDS
+            print(f"⚠️ Single-flight Redis unavailable, coalescing in-process only: {e}")
+            return self._lead(kind, fn, shareable, encode)
+
+        stop_renewing = threading.Event()
+
+        def renew():
+            while not stop_renewing.wait(self.lock_seconds / 3):
+                try:
+                    self._renew(keys=[lock_key], args=[token, int(self.lock_seconds * 1000)])
+                except Exception:
+                    pass  # The lock expires on its own
+
+        renewer = threading.Thread(target=renew, daemon=True, name=f"single-flight-{kind}")
+        renewer.start()
+        try:
+            result, shared, payload = self._lead(kind, fn, shareable, encode)
+            if payload is not None and result_ttl > 0:
+                try:
+                    self.client.set(result_key, json.dumps(payload), px=int(result_ttl * 1000))
+                except Exception:
+                    pass  # Followers time out or take the lock after us
+            return result, shared, payload
+        finally:
+            stop_renewing.set()
+            try:
+                self._release(keys=[lock_key], args=[token])
+            except Exception:
+                pass
+
+    def _lead(self, kind: str, fn: Callable[[], Any], shareable: Callable[[Any], bool],
+              encode: Callable[[Any], Any]) -> Tuple[Any, bool, Optional[Dict[str, Any]]]:
+        start_time = time.time()
+        result = fn()
+        duration_ms = int((time.time() - start_time) * 1000)
+        self._count(kind, 'leader')
+        if not shareable(result):
+            return result, False, None
+        return result, False, {'value': json.dumps(encode(result)), 'duration_ms': duration_ms}
+
+    def _prune(self, now: float):
+        """Drop finished flights past their result TTL (caller holds the lock)"""
+        for key in [key for key, flight in self._flights.items()
+                    if flight.done.is_set() and (flight.payload is None or now >= flight.expires_at)]:
+            del self._flights[key]
+
+    def _count(self, kind: str, metric: str, saved_ms: int = 0):
+        with self._lock:
+            stats = self._stats.setdefault(kind, {'leader': 0, 'shared': 0, 'fallthrough': 0, 'saved_ms': 0})
+            stats[metric] += 1
+            stats['saved_ms'] += saved_ms
+
+        if self.client is None or time.time() < self._redis_down_until:
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.hincrby(self.STATS_KEY, f"{kind}:{metric}", 1)
+            if saved_ms:
+                pipe.hincrby(self.STATS_KEY, f"{kind}:saved_ms", saved_ms)
+            pipe.execute()
+        except Exception:
+            self._redis_down_until = time.time() + self.REDIS_RETRY_SECONDS
+
+    def stats(self) -> Dict[str, Any]:
+        """Dedup hits per key kind (all processes via Redis, or this process's own)"""
+        source = 'process'
+        with self._lock:
+            raw = {kind: dict(stats) for kind, stats in self._stats.items()}
+
+        if self.client is not None and time.time() >= self._redis_down_until:
+            try:
+                raw = {}
+                for field, value in self.client.hgetall(self.STATS_KEY).items():
+                    kind, metric = field.decode().rsplit(':', 1)
+                    raw.setdefault(kind, {'leader': 0, 'shared': 0, 'fallthrough': 0, 'saved_ms': 0})[metric] = int(value)
+                source = 'redis'
+            except Exception:
+                self._redis_down_until = time.time() + self.REDIS_RETRY_SECONDS
+
+        kinds = {}
+        for kind, stats in sorted(raw.items()):
+            calls = stats['leader'] + stats['shared'] + stats['fallthrough']
+            kinds[kind] = {**stats, 'hit_rate': round(stats['shared'] / calls * 100, 2) if calls else 0}
+        return {'enabled': self.enabled, 'source': source, 'kinds': kinds}
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight() -> SingleFlight:
+    """Get the process-wide single-flight coordinator"""
+    global _single_flight
+
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(
+                    lock_seconds=Config.SINGLE_FLIGHT_LOCK_SECONDS,
+                    wait_timeout=Config.SINGLE_FLIGHT_WAIT_SECONDS,
+                    result_ttl=Config.SINGLE_FLIGHT_RESULT_TTL_SECONDS,
+                    redis_url=Config.REDIS_URL if Config.SINGLE_FLIGHT_BACKEND == 'redis' else None,
+                    enabled=Config.SINGLE_FLIGHT_ENABLED
+                )
+
+    return _single_flight
@@ -0,0 +1,160 @@
+"""
+Stage Summary Module
+Distills each completed stage's agent outputs into a bounded summary that is
+computed once and shared as context with every downstream agent
+"""
+
+import time
+import hashlib
+import threading
+from typing import Optional, List, Tuple
+
+from config import Config
+from database import db, Task, AgentExecution, StageSummary
+from prompt_budget import PromptBudget, PromptSection, estimate_tokens
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You summarize the work of one stage of a startup-building pipeline for the "
+    "agents of later stages. Keep decisions, names, numbers, requirements and open "
+    "questions; drop filler. Use short bullet points grouped by agent."
+)
+
+# Striped locks so concurrent callers in one process summarize a stage once
+_stage_locks = [threading.Lock() for _ in range(32)]
+
+def _stage_lock(project_id: int, stage: int) -> threading.Lock:
+    return _stage_locks[hash((project_id, stage)) % len(_stage_locks)]
+
+def stage_outputs(project_id: int, stage: int) -> List[Tuple[Task, AgentExecution]]:
+    """Latest successful execution of every completed task in a stage"""
+    tasks = Task.query.filter_by(
+        project_id=project_id,
+        stage=stage,
+        status='completed'
+    ).order_by(Task.id).all()
+
+    outputs = []
+    for task in tasks:
+        execution = AgentExecution.query.filter_by(
+            task_id=task.id,
+            success=True
+        ).order_by(AgentExecution.id.desc()).first()
+        if execution and execution.output_response:
+            outputs.append((task, execution))
+    return outputs
+
+def outputs_fingerprint(outputs: List[Tuple[Task, AgentExecution]]) -> str:
+    """Changes whenever a task of the stage is re-run (new latest execution)"""
+    source = ','.join(f"{task.id}:{execution.id}" for task, execution in outputs)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+def _output_sections(outputs: List[Tuple[Task, AgentExecution]]) -> List[PromptSection]:
+    return [
+        PromptSection(task.assigned_agent.name if task.assigned_agent else task.title,
+                      execution.output_response)
+        for task, execution in outputs
+    ]
+
+def extract_summary(outputs: List[Tuple[Task, AgentExecution]]) -> str:
+    """Model-free fallback: the opening of each output, within the summary size"""
+    sections = _output_sections(outputs)
+    PromptBudget(num_ctx=Config.STAGE_SUMMARY_MAX_TOKENS, overhead_tokens=0,
+                 strategy='tail').fit(sections, 0)
+    return "\n\n".join(f"### {s.name}\n{s.text}" for s in sections)
+
+def summarize_stage(project_id: int, stage: int,
+                    outputs: List[Tuple[Task, AgentExecution]]):
+    """Ask the model for a stage summary; returns the AIResponse"""
+    from ai_providers import AIProviderFactory
+
+    # Outputs are trimmed (middle cut) so the request fits the context window
+    sections = _output_sections(outputs)
+    PromptBudget(
+        num_ctx=Config.OLLAMA_NUM_CTX,
+        overhead_tokens=Config.PROMPT_OVERHEAD_TOKENS + estimate_tokens(SUMMARY_SYSTEM_PROMPT),
+        strategy='middle'
+    ).fit(sections, Config.STAGE_SUMMARY_MAX_TOKENS)
+
+    prompt = f"Outputs of stage {stage}:\n\n"
+    prompt += "\n\n".join(f"### {s.name}\n{s.text}" for s in sections)
+    prompt += (f"\n\nSummarize these outputs in at most "
+               f"{int(Config.STAGE_SUMMARY_MAX_TOKENS * 0.75)} words.")
+
+    return AIProviderFactory.get_provider().generate(
+        prompt=prompt,
+        system_prompt=SUMMARY_SYSTEM_PROMPT,
+        temperature=0.2,
+        max_tokens=Config.STAGE_SUMMARY_MAX_TOKENS,
+        model='gpt-oss:20b',
+        affinity_key=f"project:{project_id}"
+    )
+
+def get_stage_summary(project_id: int, stage: int) -> Optional[str]:
+    """
+    Cached summary of a stage's completed work, or None if nothing completed.
+
+    The stored summary is reused until a task of the stage produces a new
+    successful execution. If the model call fails, an extractive summary is
+    returned without being stored, so the next caller retries.
+    """
+    outputs = stage_outputs(project_id, stage)
+    if not outputs:
+        return None
+    fingerprint = outputs_fingerprint(outputs)
+
+    summary = StageSummary.query.filter_by(project_id=project_id, stage=stage).first()
+    if summary and summary.source_fingerprint == fingerprint:
+        return summary.summary
+
+    with _stage_lock(project_id, stage):
+        # Another thread may have produced it while we waited
+        summary = StageSummary.query.filter_by(
+            project_id=project_id, stage=stage
+        ).populate_existing().first()
+        if summary and summary.source_fingerprint == fingerprint:
+            return summary.summary
+
+        start_time = time.time()
+        response = summarize_stage(project_id, stage, outputs)
+        if not response.success:
+            print(f"⚠️ Stage {stage} summary for project {project_id} failed: {response.error_message}")
+            return extract_summary(outputs)
+
+        if summary is None:
+            summary = StageSummary(project_id=project_id, stage=stage)
+            db.session.add(summary)
+        summary.summary = response.content
+        summary.source_fingerprint = fingerprint
+        summary.execution_ids = [execution.id for _, execution in outputs]
+        summary.input_tokens = response.input_tokens
+        summary.output_tokens = response.output_tokens
+        summary.duration_ms = int((time.time() - start_time) * 1000)
+
+        try:
+            db.session.commit()
+        except Exception:
+            # Another process stored the same stage first
+            db.session.rollback()
+
+        print(f"📝 Summarized stage {stage} of project {project_id} "
+              f"({len(outputs)} outputs, {response.output_tokens} tokens)")
+        return response.content
+
+def project_context(project, stage: Optional[int] = None) -> str:
+    """
+    Shared context for the agents of a stage: the project idea followed by
+    the summaries of every earlier stage (every summarized stage if stage is
+    None). All agents of a stage get identical text, so the prefix stays
+    reusable across them.
+    """
+    context = project.idea_source or f"Project: {project.name}"
+    if not Config.STAGE_SUMMARIES_ENABLED:
+        return context
+
+    last_stage = stage - 1 if stage else project.stage
+    parts = [context]
+    for earlier in range(1, (last_stage or 0) + 1):
+        summary = get_stage_summary(project.id, earlier)
+        if summary:
+            parts.append(f"## Stage {earlier} summary\n{summary}")
+    return "\n\n".join(parts)
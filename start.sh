@@ -91,7 +91,9 @@ fi
 redis-cli ping > /dev/null 2>&1
 if [ $? -eq 0 ]; then
     echo -e "${YELLOW}Starting Celery worker...${NC}"
-    celery -A celery_tasks.celery_app worker --loglevel=error --logfile=celery.log --detach
+    # -B also runs the beat scheduler (lease reaper) inside this single worker
+    celery -A celery_tasks.celery_app worker -Q interactive,pipeline,bulk -B \
+        --schedule="${TMPDIR:-/tmp}/bdc-celerybeat-schedule" --loglevel=error --logfile=celery.log --detach
     sleep 2
     echo -e "${GREEN}✓${NC} Celery worker started in background"
 fi
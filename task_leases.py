@@ -0,0 +1,189 @@
+"""
+Task Leases Module
+Time-limited ownership of running tasks: the executing worker renews its
+lease with heartbeats, and a reaper hands tasks of dead workers back to the
+pipeline without repeating model calls that already succeeded
+"""
+
+import os
+import uuid
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List
+
+from config import Config
+
+def worker_id() -> str:
+    """Identifies this process in Task.lease_owner (host:pid)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def new_lease_owner() -> str:
+    """Unique owner for one execution; several threads of a process may each hold a lease"""
+    return f"{worker_id()}:{uuid.uuid4().hex[:8]}"
+
+def claim_values(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Columns set when a scheduler claims a task. Nobody owns it yet; the
+    queue lease covers the time until a worker picks it up.
+    """
+    now = now or datetime.utcnow()
+    return {
+        'status': 'processing',
+        'started_at': now,
+        'lease_owner': None,
+        'lease_expires_at': now + timedelta(seconds=Config.TASK_LEASE_QUEUE_SECONDS),
+        'heartbeat_at': None
+    }
+
+def acquire_lease(task_id: int, owner: str, claimed: bool = True) -> bool:
+    """
+    Take the lease of a task. A claimed task must be 'processing' with no
+    owner yet (so a redelivered or duplicated message cannot run it twice);
+    with claimed=False a 'pending' task is claimed and leased in one step.
+    """
+    from database import db, Task
+
+    now = datetime.utcnow()
+    query = Task.query.filter(Task.id == task_id)
+    if claimed:
+        query = query.filter(Task.status == 'processing', Task.lease_owner.is_(None))
+    else:
+        query = query.filter(Task.status.in_(['pending', 'failed']))
+
+    acquired = query.update({
+        'status': 'processing',
+        'started_at': now,
+        'lease_owner': owner,
+        'lease_expires_at': now + timedelta(seconds=Config.TASK_LEASE_SECONDS),
+        'heartbeat_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+    return acquired == 1
+
+def finish_lease(task_id: int, owner: str, values: Dict[str, Any]) -> bool:
+    """
+    Write a task's final state, only while owner still holds its lease.
+    Returns False if the lease was lost (reaped and handed to another
+    worker); the caller must then leave the task alone.
+    """
+    from database import db, Task
+
+    values = dict(values, lease_expires_at=None, heartbeat_at=None)
+    finished = Task.query.filter_by(id=task_id, lease_owner=owner).update(
+        values, synchronize_session=False)
+    db.session.commit()
+    return finished == 1
+
+class LeaseHeartbeat:
+    """
+    Renews a task lease from a background thread while the task runs.
+
+    Renewals go through the engine directly (not the scoped session), so
+    they never interfere with the task's own transaction. Stops on its own
+    once the lease is no longer held.
+    """
+
+    def __init__(self, engine, task_id: int, owner: str,
+                 interval: Optional[float] = None, lease_seconds: Optional[float] = None):
+        self.engine = engine
+        self.task_id = task_id
+        self.owner = owner
+        self.interval = interval or Config.TASK_LEASE_HEARTBEAT_SECONDS
+        self.lease_seconds = lease_seconds or Config.TASK_LEASE_SECONDS
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True,
+                                        name=f"lease-heartbeat-{task_id}")
+
+    def beat(self) -> bool:
+        from database import Task
+
+        now = datetime.utcnow()
+        table = Task.__table__
+        with self.engine.begin() as conn:
+            renewed = conn.execute(
+                table.update()
+                .where(table.c.id == self.task_id, table.c.lease_owner == self.owner,
+                       table.c.status == 'processing')
+                .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        heartbeat_at=now)
+            ).rowcount
+        return renewed == 1
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.beat():
+                    self.lost = True
+                    print(f"⚠️ Lost the lease of task {self.task_id}")
+                    return
+            except Exception as e:
+                print(f"⚠️ Lease heartbeat for task {self.task_id} failed: {e}")
+
+    def __enter__(self) -> 'LeaseHeartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        return False
+
+def successful_execution(task_id: int):
+    """Latest successful AgentExecution of a task, if its model call already finished"""
+    from database import AgentExecution
+
+    return AgentExecution.query.filter_by(task_id=task_id, success=True).order_by(
+        AgentExecution.id.desc()).first()
+
+def reap_expired_leases(project_id: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Settle 'processing' tasks whose lease expired (their worker died or
+    hung). Tasks whose model call already succeeded become completed;
+    others go back to pending, or fail after TASK_LEASE_MAX_RECOVERIES.
+    Rows from before leases existed count as expired once the queue lease
+    has passed since they started.
+
+    Every update re-checks the expiry, so a heartbeat arriving meanwhile
+    wins, and several reapers may run at once.
+    """
+    from database import db, Task
+
+    now = datetime.utcnow()
+    expired = db.or_(
+        Task.lease_expires_at < now,
+        db.and_(Task.lease_expires_at.is_(None),
+                db.or_(Task.started_at.is_(None),
+                       Task.started_at < now - timedelta(seconds=Config.TASK_LEASE_QUEUE_SECONDS)))
+    )
+    query = Task.query.filter(Task.status == 'processing', expired)
+    if project_id is not None:
+        query = query.filter(Task.project_id == project_id)
+
+    reaped = {'completed': [], 'pending': [], 'failed': []}
+    for task in query.all():
+        execution = successful_execution(task.id)
+        owner = task.lease_owner or 'an unknown worker'
+        if execution:
+            outcome = 'completed'
+            values = {'status': 'completed', 'completed_at': execution.created_at or now,
+                      'error_message': None}
+        elif (task.retry_count or 0) >= Config.TASK_LEASE_MAX_RECOVERIES:
+            outcome = 'failed'
+            values = {'status': 'failed',
+                      'error_message': f"Lease expired {task.retry_count + 1} times (last held by {owner})"}
+        else:
+            outcome = 'pending'
+            values = {'status': 'pending', 'retry_count': (task.retry_count or 0) + 1,
+                      'error_message': f"Recovered after the lease of {owner} expired"}
+
+        values.update(lease_owner=None, lease_expires_at=None, heartbeat_at=None)
+        settled = Task.query.filter(Task.id == task.id, Task.status == 'processing', expired).update(
+            values, synchronize_session=False)
+        db.session.commit()
+        if settled:
+            print(f"♻️ Task {task.id} ({task.title}): lease of {owner} expired, now {outcome}")
+            reaped[outcome].append({'task_id': task.id, 'project_id': task.project_id, 'stage': task.stage})
+
+    return reaped
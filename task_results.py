@@ -0,0 +1,138 @@
+"""
+Task Results Module
+Keeps Celery payloads small: tasks return references to database rows
+instead of model output, large task arguments are compressed, and the Redis
+memory held by stored results is reported per result type
+"""
+
+import re
+import json
+import time
+from typing import Dict, Any, Optional, Sequence
+
+from config import Config
+
+RESULT_KEY_PATTERN = 'celery-task-meta-*'
+
+# Results carry their type first, so a short prefix of the stored JSON names it
+_RESULT_TYPE_RE = re.compile(rb'"result_type":\s*"([^"]+)"')
+_RESULT_PREFIX_BYTES = 256
+
+REDIS_RETRY_SECONDS = 30  # Skip the report this long after Redis could not be reached
+_redis_down_until = 0.0
+
+def typed_result(result_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """A task result tagged with its type (used by the memory report)"""
+    return {'result_type': result_type, **result}
+
+def agent_result_ref(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reference to an agent execution: status, execution ID and token counts.
+    The response text and raw Ollama metadata stay in AgentExecution.
+    """
+    return typed_result('agent_execution', {
+        'success': result.get('success', False),
+        'execution_id': result.get('execution_id'),
+        'tokens_used': result.get('tokens_used'),
+        'input_tokens': result.get('input_tokens'),
+        'output_tokens': result.get('output_tokens'),
+        'response_chars': len(result.get('response') or ''),
+        'error': result.get('error')
+    })
+
+def expand_result(result: Any, user_id: Optional[int] = None) -> Any:
+    """
+    Add the text a result refers to, loaded from the database: the response
+    of an agent execution or the content of an artifact. Rows of projects
+    owned by another user are left out.
+    """
+    from database import db, AgentExecution, ProjectArtifact
+
+    if not isinstance(result, dict):
+        return result
+
+    def visible(row) -> bool:
+        return row is not None and (row.project is None or user_id is None or row.project.user_id == user_id)
+
+    expanded = dict(result)
+    if result.get('execution_id'):
+        execution = db.session.get(AgentExecution, result['execution_id'])
+        if visible(execution):
+            expanded['response'] = execution.output_response
+    if result.get('artifact_id'):
+        artifact = db.session.get(ProjectArtifact, result['artifact_id'])
+        if visible(artifact):
+            expanded['content'] = artifact.content
+    return expanded
+
+def message_compression(args: Optional[Sequence] = None,
+                        kwargs: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Compression for a task message, or None. Only messages whose arguments
+    serialize to CELERY_COMPRESSION_MIN_BYTES or more are compressed; below
+    that the compressed, base64-encoded body would be larger.
+    """
+    if not Config.CELERY_COMPRESSION:
+        return None
+    try:
+        size = len(json.dumps([args or [], kwargs or {}], default=str))
+    except (TypeError, ValueError):
+        return None
+    return Config.CELERY_COMPRESSION if size >= Config.CELERY_COMPRESSION_MIN_BYTES else None
+
+def result_memory_report(redis_url: Optional[str] = None,
+                         max_keys: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Redis memory used by stored Celery results, per result type (results
+    from before typing, or of untyped tasks, count as 'untyped'). Scans at
+    most max_keys result keys; None when Redis cannot be reached.
+    """
+    import redis
+    global _redis_down_until
+
+    if time.time() < _redis_down_until:
+        return None
+
+    max_keys = max_keys or Config.RESULT_MEMORY_REPORT_MAX_KEYS
+    try:
+        client = redis.from_url(redis_url or Config.CELERY_RESULT_BACKEND,
+                                socket_connect_timeout=1, socket_timeout=2)
+        keys = []
+        for key in client.scan_iter(match=RESULT_KEY_PATTERN, count=500):
+            keys.append(key)
+            if len(keys) >= max_keys:
+                break
+
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+            pipe.getrange(key, 0, _RESULT_PREFIX_BYTES)
+            pipe.ttl(key)
+        replies = pipe.execute()
+        used_memory = client.info('memory').get('used_memory')
+    except Exception:
+        _redis_down_until = time.time() + REDIS_RETRY_SECONDS
+        return None
+
+    by_type = {}
+    for index in range(len(keys)):
+        size, prefix, ttl = replies[index * 3:index * 3 + 3]
+        match = _RESULT_TYPE_RE.search(prefix or b'')
+        result_type = match.group(1).decode() if match else 'untyped'
+        stats = by_type.setdefault(result_type, {'count': 0, 'bytes': 0, 'max_bytes': 0, 'no_expiry': 0})
+        stats['count'] += 1
+        stats['bytes'] += size or 0
+        stats['max_bytes'] = max(stats['max_bytes'], size or 0)
+        stats['no_expiry'] += 1 if ttl == -1 else 0
+
+    for stats in by_type.values():
+        stats['avg_bytes'] = round(stats['bytes'] / stats['count'])
+
+    return {
+        'keys': len(keys),
+        'truncated': len(keys) >= max_keys,
+        'bytes': sum(stats['bytes'] for stats in by_type.values()),
+        'redis_used_memory': used_memory,
+        'result_expires_seconds': Config.CELERY_RESULT_EXPIRES_SECONDS,
+        'types': dict(sorted(by_type.items()))
+    }
@@ -0,0 +1,100 @@
+"""
+Hedged Call Tests
+The losing call of a hedged pair must give back its slots as soon as the winner answers
+"""
+
+import os
+import json
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('SINGLE_FLIGHT_BACKEND', 'local')
+
+from ai_providers import OllamaProvider
+from concurrency import ConcurrencyLimiter
+from ollama_pool import OllamaBackendPool
+from resilience import CircuitBreaker
+
+class StallFirstHandler(BaseHTTPRequestHandler):
+    """Streams a short answer; the first chat request across all servers stalls until released"""
+    protocol_version = 'HTTP/1.1'
+    lock = threading.Lock()
+    requests_seen = 0
+    release = threading.Event()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        with StallFirstHandler.lock:
+            StallFirstHandler.requests_seen += 1
+            stall = StallFirstHandler.requests_seen == 1
+        if stall:
+            StallFirstHandler.release.wait(10)
+
+        lines = [
+            {'message': {'role': 'assistant', 'content': 'slow' if stall else 'fa'}, 'done': False},
+            {'message': {'role': 'assistant', 'content': '' if stall else 'st'}, 'done': True,
+             'done_reason': 'stop', 'prompt_eval_count': 3, 'eval_count': 2}
+        ]
+        if not payload.get('stream', True):
+            content = ''.join(line['message']['content'] for line in lines)
+            lines = [dict(lines[-1], message={'role': 'assistant', 'content': content})]
+        body = b''.join(json.dumps(line).encode('utf-8') + b'\n' for line in lines)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # The client gave up on this call
+
+class HedgeReleaseTest(unittest.TestCase):
+
+    def setUp(self):
+        StallFirstHandler.requests_seen = 0
+        StallFirstHandler.release.clear()
+        self.servers = []
+        for _ in range(2):
+            httpd = ThreadingHTTPServer(('127.0.0.1', 0), StallFirstHandler)
+            httpd.daemon_threads = True
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            self.servers.append(httpd)
+        urls = [f"http://{host}:{port}" for host, port in
+                (httpd.server_address[:2] for httpd in self.servers)]
+        self.pool = OllamaBackendPool(urls, health_check_interval=0)
+        self.limiter = ConcurrencyLimiter({}, 2, 1, wait_timeout=1, lease_seconds=60)
+        self.provider = OllamaProvider(backend_pool=self.pool, limiter=self.limiter,
+                                       circuit_breaker=CircuitBreaker(failure_threshold=0))
+
+    def tearDown(self):
+        StallFirstHandler.release.set()
+        for httpd in self.servers:
+            httpd.shutdown()
+            httpd.server_close()
+
+    def test_loser_releases_slots_when_winner_returns(self):
+        payload = self.provider._build_payload("prompt", None, 0.7, 16, 'test:1b', stream=False)
+        start_time = time.time()
+        response_data, backend_url = self.provider._post_chat_hedged(
+            payload, 'test:1b', None, time.time() + 30, hedge_after_ms=100)
+
+        self.assertLess(time.time() - start_time, 5)
+        self.assertEqual(response_data['message']['content'], 'fast')
+        self.assertEqual(response_data['eval_count'], 2)
+        self.assertEqual(StallFirstHandler.requests_seen, 2)
+
+        # The stalled primary is still waiting on its server, but holds nothing
+        self.assertFalse(StallFirstHandler.release.is_set())
+        for key, stats in self.limiter.stats().items():
+            self.assertEqual(stats['in_flight'], 0, key)
+        for backend in self.pool.backends:
+            self.assertEqual(backend.outstanding, 0, backend.url)
+            self.assertTrue(backend.healthy, backend.url)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Ollama Backend Pool Tests
+Backend health must only react to failures of the backend itself
+"""
+
+import os
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('SINGLE_FLIGHT_BACKEND', 'local')
+
+from ai_providers import OllamaProvider, OllamaAPIError
+from concurrency import ConcurrencyLimiter
+from ollama_pool import OllamaBackendPool
+from resilience import CircuitBreaker
+
+class RejectingHandler(BaseHTTPRequestHandler):
+    """Answers every chat request with 404, as Ollama does for an unknown model"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({'error': "model 'missing:1b' not found"}).encode('utf-8')
+        self.send_response(404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class BackendHealthTest(unittest.TestCase):
+
+    def setUp(self):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), RejectingHandler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        host, port = self.httpd.server_address[:2]
+        self.pool = OllamaBackendPool([f"http://{host}:{port}"], health_check_interval=0,
+                                      failure_threshold=2, eject_seconds=60)
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def test_repeated_client_errors_do_not_eject_backend(self):
+        provider = OllamaProvider(
+            backend_pool=self.pool,
+            limiter=ConcurrencyLimiter({}, 0, 0, wait_timeout=1, lease_seconds=60),
+            circuit_breaker=CircuitBreaker(failure_threshold=0)
+        )
+        for attempt in range(5):
+            response = provider.generate(f"prompt {attempt}", model='missing:1b', retry_attempts=0)
+            self.assertFalse(response.success)
+            self.assertIn('404', response.error_message)
+
+        backend = self.pool.backends[0]
+        self.assertTrue(backend.healthy)
+        self.assertEqual(backend.consecutive_failures, 0)
+        self.assertEqual(backend.outstanding, 0)
+
+    def test_transient_errors_still_eject_backend(self):
+        for _ in range(2):
+            with self.assertRaises(OllamaAPIError):
+                with self.pool.lease('gpt-oss:20b'):
+                    raise OllamaAPIError("Ollama API returned status 503", 503)
+
+        backend = self.pool.backends[0]
+        self.assertFalse(backend.healthy)
+        self.assertEqual(backend.outstanding, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Worker Bootstrap Module
+Builds the Flask app, database pool and agent catalog once per Celery worker
+process and measures how much of each task is spent on setup
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
+
+from config import Config
+
+_worker_app = None
+_worker_app_lock = threading.Lock()
+
+def get_worker_app():
+    """
+    The Flask app shared by every task in this process.
+
+    Importing app already builds the module-level app (with Socket.IO and
+    the login manager), so tasks reuse it instead of building another one,
+    with its own engine and pool, on every run.
+    """
+    global _worker_app
+
+    if _worker_app is None:
+        with _worker_app_lock:
+            if _worker_app is None:
+                from app import app
+                _worker_app = app
+
+    return _worker_app
+
+class TaskSetupStats:
+    """
+    Per-task-name setup overhead (time until the task body can start).
+
+    Counters are kept in process memory and, when Redis is reachable,
+    added to a shared hash so the web process can report every worker's
+    numbers together.
+    """
+
+    REDIS_KEY = 'bdc:worker_setup'
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, redis_url: str = None):
+        self.client = None
+        if redis_url:
+            import redis
+            self.client = redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=1)
+        self._redis_down_until = 0.0
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, task_name: str, setup_ms: float):
+        with self._lock:
+            stats = self._stats.setdefault(task_name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['count'] += 1
+            stats['total_ms'] += setup_ms
+            stats['max_ms'] = max(stats['max_ms'], setup_ms)
+
+        if self.client is None or time.time() < self._redis_down_until:
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.hincrby(self.REDIS_KEY, f"{task_name}:count", 1)
+            pipe.hincrbyfloat(self.REDIS_KEY, f"{task_name}:total_ms", round(setup_ms, 3))
+            pipe.execute()
+        except Exception:
+            self._redis_down_until = time.time() + self.REDIS_RETRY_SECONDS
+
+    @staticmethod
+    def _summarize(raw: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+        summary = {}
+        for name, stats in sorted(raw.items()):
+            entry = {
+                'count': int(stats['count']),
+                'avg_ms': round(stats['total_ms'] / stats['count'], 2) if stats['count'] else 0
+            }
+            if 'max_ms' in stats:
+                entry['max_ms'] = round(stats['max_ms'], 2)
+            summary[name] = entry
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        """All workers' numbers from Redis, or this process's own"""
+        if self.client is not None and time.time() >= self._redis_down_until:
+            try:
+                raw = {}
+                for field, value in self.client.hgetall(self.REDIS_KEY).items():
+                    name, metric = field.decode().rsplit(':', 1)
+                    raw.setdefault(name, {'count': 0, 'total_ms': 0.0})[metric] = float(value)
+                return {'source': 'redis', 'tasks': self._summarize(raw)}
+            except Exception:
+                self._redis_down_until = time.time() + self.REDIS_RETRY_SECONDS
+
+        with self._lock:
+            raw = {name: dict(stats) for name, stats in self._stats.items()}
+        return {'source': 'process', 'tasks': self._summarize(raw)}
+
+_setup_stats = None
+_setup_stats_lock = threading.Lock()
+
+def get_task_setup_stats() -> TaskSetupStats:
+    """Get the process-wide task setup stats"""
+    global _setup_stats
+
+    if _setup_stats is None:
+        with _setup_stats_lock:
+            if _setup_stats is None:
+                _setup_stats = TaskSetupStats(redis_url=Config.REDIS_URL)
+
+    return _setup_stats
+
+@contextmanager
+def task_app_context(task_name: str) -> Iterator[Any]:
+    """App context for a Celery task body; the time to enter it is recorded as setup"""
+    start_time = time.perf_counter()
+    app = get_worker_app()
+    with app.app_context():
+        get_task_setup_stats().record(task_name, (time.perf_counter() - start_time) * 1000)
+        yield app
+
+def warm_worker_process() -> Dict[str, Any]:
+    """
+    Prepare a freshly forked worker process: build the app, replace database
+    connections inherited from the parent, open the pool's connections and
+    load the system prompt catalog and the Ollama provider.
+    """
+    from database import db
+    from ai_providers import AIProviderFactory, SystemPromptCatalog
+
+    start_time = time.perf_counter()
+    app = get_worker_app()
+
+    with app.app_context():
+        # Connections opened before the fork must not be shared with the parent
+        db.engine.dispose(close=False)
+
+        connections = []
+        try:
+            for _ in range(max(0, Config.WORKER_DB_WARM_CONNECTIONS)):
+                connections.append(db.engine.connect())
+                connections[-1].execute(db.text('SELECT 1'))
+        except Exception as e:
+            print(f"⚠️ Could not pre-open database connections: {e}")
+        finally:
+            for connection in connections:
+                connection.close()  # Back to the pool, still open
+
+        prompts = SystemPromptCatalog.load()
+        AIProviderFactory.get_provider()
+
+    elapsed_ms = round((time.perf_counter() - start_time) * 1000, 1)
+    print(f"🔥 Worker process warmed in {elapsed_ms}ms "
+          f"({len(connections)} DB connections, {prompts} system prompts)")
+    return {'elapsed_ms': elapsed_ms, 'db_connections': len(connections), 'system_prompts': prompts}